@@ -0,0 +1,3 @@
+# Scripts de benchmark do todo. Rode a partir da raiz do projeto, por exemplo:
+#   python -m benchmarks.harness --usuarios 5 --listas 20 --tarefas 500 --saida resultado.json
+#   python -m benchmarks.asgi_vs_wsgi --usuario admin
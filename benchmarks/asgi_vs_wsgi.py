@@ -0,0 +1,310 @@
+"""
+Compara requisições por segundo das views de leitura sob ASGI (views async de todo/assincrono.py)
+e sob WSGI (views sincronas), com um usuario logado.
+
+Modos:
+  servidor  sobe `uvicorn polls.asgi:application` e `gunicorn polls.wsgi:application` com o mesmo
+            numero de workers e mede por HTTP com keep-alive (precisa de uvicorn e gunicorn)
+  local     chama o ASGIHandler e o WSGIHandler direto, cada um num subprocesso, sem rede nem
+            servidor; mede só o custo do Django e do banco
+
+Exemplo:
+  python -m benchmarks.asgi_vs_wsgi --usuario admin --modo local --concorrencia 32 --segundos 10 \\
+      --caminho /todo/ --caminho "/todo/api/tarefas?campos=titulo"
+
+O login cria uma sessão no banco configurado em DJANGO_SETTINGS_MODULE (padrão: polls.settings).
+"""
+import argparse
+import asyncio
+import importlib.util
+import io
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HOST = '127.0.0.1'
+
+
+def configurar_django(assincrono=False):
+    """ Configura o Django com as views async ligadas ou não (TODO_ASYNC_VIEWS) """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'polls.settings')
+    os.environ['TODO_ASYNC_VIEWS'] = '1' if assincrono else ''
+    if RAIZ not in sys.path:
+        sys.path.insert(0, RAIZ)
+    import django
+    django.setup()
+
+
+def cookie_sessao(usuario):
+    """ Faz o login do usuario e retorna o cabeçalho Cookie da sessão, que fica no banco para todos os workers """
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.test import Client
+
+    cliente = Client()
+    cliente.force_login(User.objects.get(username=usuario))
+    return f'{settings.SESSION_COOKIE_NAME}={cliente.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+
+def resumo(interface, caminho, resultados, segundos):
+    """ Requisições por segundo e percentis de latencia em ms """
+    latencias = sorted(latencia for latencia, _ in resultados)
+    erros = sum(1 for _, status in resultados if status is None or status >= 400)
+
+    def percentil(p):
+        return round(latencias[min(len(latencias) - 1, int(len(latencias) * p))] * 1000, 2) if latencias else None
+
+    return {
+        'interface': interface,
+        'caminho': caminho,
+        'requisicoes': len(resultados),
+        'erros': erros,
+        'rps': round(len(resultados) / segundos, 1),
+        'p50_ms': percentil(0.50),
+        'p95_ms': percentil(0.95),
+        'media_ms': round(statistics.fmean(latencias) * 1000, 2) if latencias else None,
+    }
+
+
+# Modo local: os handlers do Django chamados direto
+
+def _scope(caminho, cookie):
+    path, _, query = caminho.partition('?')
+    return {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+        'headers': [(b'host', HOST.encode()), (b'cookie', cookie.encode())],
+        'client': (HOST, 0), 'server': (HOST, 80),
+    }
+
+
+async def _local_asgi(caminho, cookie, concorrencia, segundos):
+    from django.core.handlers.asgi import ASGIHandler
+
+    handler = ASGIHandler()
+    resultados = []
+
+    async def requisicao():
+        status = None
+        corpo_enviado = False
+
+        async def receive():
+            nonlocal corpo_enviado
+            if not corpo_enviado:
+                corpo_enviado = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            # Nunca desconecta; a tarefa que espera por isso é cancelada quando a resposta termina
+            await asyncio.Event().wait()
+
+        async def send(mensagem):
+            nonlocal status
+            if mensagem['type'] == 'http.response.start':
+                status = mensagem['status']
+
+        await handler(_scope(caminho, cookie), receive, send)
+        return status
+
+    async def cliente(fim):
+        while time.perf_counter() < fim:
+            inicio = time.perf_counter()
+            status = await requisicao()
+            resultados.append((time.perf_counter() - inicio, status))
+
+    await requisicao()  # aquecimento
+    fim = time.perf_counter() + segundos
+    await asyncio.gather(*(cliente(fim) for _ in range(concorrencia)))
+    return resultados
+
+
+def _local_wsgi(caminho, cookie, concorrencia, segundos):
+    from django.core.handlers.wsgi import WSGIHandler
+
+    handler = WSGIHandler()
+    resultados = []
+    trava = threading.Lock()
+    path, _, query = caminho.partition('?')
+
+    def requisicao():
+        status = []
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+            'SERVER_NAME': HOST, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': HOST,
+            'HTTP_COOKIE': cookie, 'REMOTE_ADDR': HOST, 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+            'wsgi.url_scheme': 'http', 'wsgi.version': (1, 0), 'wsgi.multithread': True,
+            'wsgi.multiprocess': False, 'wsgi.run_once': False,
+        }
+        resposta = handler(environ, lambda linha, cabecalhos, exc_info=None: status.append(int(linha[:3])))
+        try:
+            for _ in resposta:
+                pass
+        finally:
+            resposta.close()
+        return status[0] if status else None
+
+    def cliente(fim):
+        while time.perf_counter() < fim:
+            inicio = time.perf_counter()
+            status = requisicao()
+            with trava:
+                resultados.append((time.perf_counter() - inicio, status))
+
+    requisicao()  # aquecimento
+    fim = time.perf_counter() + segundos
+    with ThreadPoolExecutor(concorrencia) as executor:
+        for futuro in [executor.submit(cliente, fim) for _ in range(concorrencia)]:
+            futuro.result()
+    return resultados
+
+
+def executar_local(interface, args):
+    """ Roda dentro do subprocesso: mede uma interface e imprime o resultado em JSON """
+    configurar_django(assincrono=interface == 'asgi')
+    cookie = cookie_sessao(args.usuario)
+    saida = []
+    for caminho in args.caminho:
+        if interface == 'asgi':
+            resultados = asyncio.run(_local_asgi(caminho, cookie, args.concorrencia, args.segundos))
+        else:
+            resultados = _local_wsgi(caminho, cookie, args.concorrencia, args.segundos)
+        saida.append(resumo(interface, caminho, resultados, args.segundos))
+    print(json.dumps(saida))
+
+
+# Modo servidor: uvicorn e gunicorn medidos por HTTP
+
+async def _ler_resposta(leitor):
+    """ Le uma resposta HTTP/1.1 e retorna (status, fechar_conexao) """
+    cabecalho = await leitor.readuntil(b'\r\n\r\n')
+    linhas = cabecalho.decode('latin-1').split('\r\n')
+    status = int(linhas[0].split()[1])
+    campos = {}
+    for linha in linhas[1:]:
+        if ':' in linha:
+            nome, valor = linha.split(':', 1)
+            campos[nome.strip().lower()] = valor.strip().lower()
+    if campos.get('transfer-encoding') == 'chunked':
+        while True:
+            tamanho = int((await leitor.readuntil(b'\r\n')).split(b';')[0], 16)
+            await leitor.readexactly(tamanho + 2)
+            if tamanho == 0:
+                break
+    elif 'content-length' in campos:
+        await leitor.readexactly(int(campos['content-length']))
+    return status, campos.get('connection') == 'close'
+
+
+async def _carga_http(porta, caminho, cookie, concorrencia, segundos):
+    resultados = []
+    pedido = f'GET {caminho} HTTP/1.1\r\nHost: {HOST}:{porta}\r\nCookie: {cookie}\r\n\r\n'.encode()
+
+    async def cliente(fim):
+        leitor = escritor = None
+        while time.perf_counter() < fim:
+            if escritor is None:
+                leitor, escritor = await asyncio.open_connection(HOST, porta)
+            inicio = time.perf_counter()
+            try:
+                escritor.write(pedido)
+                await escritor.drain()
+                status, fechar = await _ler_resposta(leitor)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                status, fechar = None, True
+            resultados.append((time.perf_counter() - inicio, status))
+            if fechar:
+                escritor.close()
+                escritor = None
+        if escritor is not None:
+            escritor.close()
+
+    fim = time.perf_counter() + segundos
+    await asyncio.gather(*(cliente(fim) for _ in range(concorrencia)))
+    return resultados
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+
+def _esperar_porta(porta, processo, limite=30):
+    fim = time.time() + limite
+    while time.time() < fim:
+        if processo.poll() is not None:
+            raise SystemExit(f'O servidor terminou com codigo {processo.returncode}')
+        try:
+            socket.create_connection((HOST, porta), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f'O servidor não abriu a porta {porta} em {limite}s')
+
+
+def executar_servidor(args, cookie):
+    for modulo in ('uvicorn', 'gunicorn'):
+        if importlib.util.find_spec(modulo) is None:
+            raise SystemExit(f'O modo servidor precisa do {modulo} instalado; use --modo local para medir sem servidor')
+
+    servidores = {
+        'asgi': (['uvicorn', 'polls.asgi:application', '--workers', str(args.workers), '--host', HOST,
+                  '--log-level', 'warning', '--no-access-log', '--port'], '1'),
+        'wsgi': (['gunicorn', 'polls.wsgi:application', '--workers', str(args.workers), '--threads',
+                  str(args.threads), '--log-level', 'warning', '--bind'], ''),
+    }
+    saida = []
+    for interface, (comando, assincrono) in servidores.items():
+        porta = _porta_livre()
+        endereco = str(porta) if interface == 'asgi' else f'{HOST}:{porta}'
+        env = dict(os.environ, TODO_ASYNC_VIEWS=assincrono)
+        processo = subprocess.Popen([sys.executable, '-m', *comando, endereco], cwd=RAIZ, env=env)
+        try:
+            _esperar_porta(porta, processo)
+            for caminho in args.caminho:
+                asyncio.run(_carga_http(porta, caminho, cookie, args.concorrencia, 1))  # aquecimento
+                resultados = asyncio.run(_carga_http(porta, caminho, cookie, args.concorrencia, args.segundos))
+                saida.append(resumo(interface, caminho, resultados, args.segundos))
+        finally:
+            processo.terminate()
+            processo.wait()
+    return saida
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--usuario', required=True, help='Username usado nas requisições')
+    parser.add_argument('--modo', choices=['servidor', 'local'], default='servidor')
+    parser.add_argument('--caminho', action='append', help='Caminho medido (pode repetir), padrão: /todo/')
+    parser.add_argument('--concorrencia', type=int, default=32, help='Clientes simultaneos')
+    parser.add_argument('--segundos', type=float, default=10, help='Duração de cada medição')
+    parser.add_argument('--workers', type=int, default=4, help='Processos do uvicorn e do gunicorn')
+    parser.add_argument('--threads', type=int, default=8, help='Threads por worker do gunicorn')
+    parser.add_argument('--interno', choices=['asgi', 'wsgi'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.caminho = args.caminho or ['/todo/']
+
+    if args.interno:
+        executar_local(args.interno, args)
+        return
+
+    if args.modo == 'local':
+        saida = []
+        for interface in ('asgi', 'wsgi'):
+            comando = [sys.executable, '-m', 'benchmarks.asgi_vs_wsgi', '--interno', interface] + sys.argv[1:]
+            resultado = subprocess.run(comando, cwd=RAIZ, check=True, capture_output=True, text=True)
+            saida += json.loads(resultado.stdout.strip().splitlines()[-1])
+    else:
+        configurar_django()
+        saida = executar_servidor(args, cookie_sessao(args.usuario))
+
+    print(json.dumps(saida, indent=2))
+
+
+if __name__ == '__main__':
+    main()
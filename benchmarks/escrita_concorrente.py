@@ -0,0 +1,162 @@
+"""
+Mede a vazão de escrita com varios processos criando tarefas ao mesmo tempo (POST no set_task),
+com as configurações padrão (polls.settings) e com as de produção (polls.settings_producao:
+WAL, BEGIN IMMEDIATE, busy_timeout e conexões persistentes).
+
+Cada perfil usa um banco SQLite novo num diretorio temporario. Cada processo é um "worker"
+com o seu usuario e a sua lista, e as requisições passam pelo test client (todos os
+middlewares, sem rede). Uma requisição que termina em "database is locked" conta como erro.
+
+Exemplo:
+  python -m benchmarks.escrita_concorrente --processos 8 --segundos 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PERFIS = {
+    'padrao': 'polls.settings',
+    'producao': 'polls.settings_producao',
+}
+
+
+def configurar_django():
+    if RAIZ not in sys.path:
+        sys.path.insert(0, RAIZ)
+    import django
+    django.setup()
+
+
+def preparar(args):
+    """ Cria o banco do perfil com um usuario e uma lista por processo """
+    configurar_django()
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.utils import timezone
+    from todo.models import Lista
+
+    call_command('migrate', verbosity=0)
+    agora = timezone.now()
+    listas = []
+    for i in range(args.processos):
+        usuario = User.objects.create_user(username=f'escrita{i}', password='escrita')
+        listas.append(Lista.objects.create(usuario=usuario, titulo='Escrita', descricao='Benchmark',
+                                           data_criacao=agora, data_atualizacao=agora).pk)
+    print(json.dumps(listas))
+
+
+def trabalhador(args):
+    """ Um processo: cria tarefas pelo set_task até o fim da medição e imprime (latencia, status) """
+    import datetime
+    import logging
+
+    configurar_django()
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test import Client
+    from django.urls import reverse
+    from todo.db import pragmas_atuais
+
+    # Os erros 500 ("database is locked") são contados, não mostrados
+    logging.disable(logging.CRITICAL)
+    # localhost está no ALLOWED_HOSTS dos dois perfis
+    cliente = Client(raise_request_exception=False, HTTP_HOST='localhost')
+    cliente.force_login(User.objects.get(username=f'escrita{args.indice}'))
+    url = reverse('set_task') + f'?Enviar={args.lista}'
+    vencimento = datetime.date.today() + datetime.timedelta(days=1)
+    journal_mode = pragmas_atuais(connection, ['journal_mode'])['journal_mode']
+
+    resultados = []
+    time.sleep(max(0, args.inicio - time.time()))
+    fim = args.inicio + args.segundos
+    n = 0
+    while time.time() < fim:
+        inicio = time.perf_counter()
+        try:
+            status = cliente.post(url, {'titulo': f'Tarefa {n}', 'descricao': 'Benchmark', 'prioridade': 'media',
+                                        'dataVencimento': vencimento}).status_code
+        except Exception:
+            status = None
+        resultados.append((time.perf_counter() - inicio, status))
+        n += 1
+    print(json.dumps({'journal_mode': journal_mode, 'resultados': resultados}))
+
+
+def resumo(perfil, saidas, segundos):
+    resultados = [resultado for saida in saidas for resultado in saida['resultados']]
+    latencias = sorted(latencia for latencia, _ in resultados)
+    # set_task redireciona para a lista quando a tarefa é criada
+    criadas = sum(1 for _, status in resultados if status == 302)
+
+    def percentil(p):
+        return round(latencias[min(len(latencias) - 1, int(len(latencias) * p))] * 1000, 2) if latencias else None
+
+    return {
+        'perfil': perfil,
+        'journal_mode': saidas[0]['journal_mode'] if saidas else None,
+        'requisicoes': len(resultados),
+        'criadas': criadas,
+        'erros': len(resultados) - criadas,
+        'escritas_por_segundo': round(criadas / segundos, 1),
+        'p50_ms': percentil(0.50),
+        'p95_ms': percentil(0.95),
+        'p99_ms': percentil(0.99),
+        'media_ms': round(statistics.fmean(latencias) * 1000, 2) if latencias else None,
+    }
+
+
+def medir(perfil, args):
+    with tempfile.TemporaryDirectory() as diretorio:
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=PERFIS[perfil],
+                   TODO_DB_NAME=os.path.join(diretorio, 'db.sqlite3'),
+                   DJANGO_SECRET_KEY=os.environ.get('DJANGO_SECRET_KEY', 'benchmark'))
+        comando = [sys.executable, '-m', 'benchmarks.escrita_concorrente', '--processos', str(args.processos)]
+        preparo = subprocess.run(comando + ['--interno', 'preparar'], cwd=RAIZ, env=env,
+                                 check=True, capture_output=True, text=True)
+        listas = json.loads(preparo.stdout.strip().splitlines()[-1])
+
+        # Todos começam juntos, depois do tempo de subir o Django em cada processo
+        inicio = time.time() + 3
+        processos = [
+            subprocess.Popen(comando + ['--interno', 'trabalhador', '--indice', str(i), '--lista', str(lista),
+                                        '--inicio', str(inicio), '--segundos', str(args.segundos)],
+                             cwd=RAIZ, env=env, stdout=subprocess.PIPE, text=True)
+            for i, lista in enumerate(listas)
+        ]
+        saidas = []
+        for processo in processos:
+            saida, _ = processo.communicate()
+            if processo.returncode != 0:
+                raise SystemExit(f'Um worker terminou com codigo {processo.returncode}')
+            saidas.append(json.loads(saida.strip().splitlines()[-1]))
+    return resumo(perfil, saidas, args.segundos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processos', type=int, default=8, help='Processos escrevendo ao mesmo tempo')
+    parser.add_argument('--segundos', type=float, default=10, help='Duração da medição')
+    parser.add_argument('--perfil', action='append', choices=list(PERFIS), help='Perfis medidos (padrão: todos)')
+    parser.add_argument('--interno', choices=['preparar', 'trabalhador'], help=argparse.SUPPRESS)
+    parser.add_argument('--indice', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--lista', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--inicio', type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.interno == 'preparar':
+        preparar(args)
+    elif args.interno == 'trabalhador':
+        trabalhador(args)
+    else:
+        print(json.dumps([medir(perfil, args) for perfil in args.perfil or PERFIS], indent=2))
+
+
+if __name__ == '__main__':
+    main()
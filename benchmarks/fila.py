@@ -0,0 +1,117 @@
+"""
+Mede a vazão da fila de trabalhos (todo/fila.py): trabalhos enfileirados por segundo (um
+INSERT por trabalho, como nas views) e trabalhos executados por segundo pelo worker com
+1, 2, 4... threads.
+
+Dois tipos de trabalho: "vazio" (não faz nada, mede só o custo da fila: pegar o lote e marcar
+como concluido) e "io" (dorme --io-ms, como um envio de email, onde mais threads ajudam).
+
+Cada perfil (ver benchmarks/escrita_concorrente.py) usa um banco SQLite novo num diretorio
+temporario, medido num processo separado.
+
+Exemplo:
+  python -m benchmarks.fila --trabalhos 2000 --concorrencia 1 --concorrencia 4 --lote 20
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PERFIS = {
+    'padrao': 'polls.settings',
+    'producao': 'polls.settings_producao',
+}
+
+
+def medir_perfil(args):
+    """ Dentro do processo do perfil: cria o banco, enfileira e executa, e imprime os resultados """
+    import logging
+
+    if RAIZ not in sys.path:
+        sys.path.insert(0, RAIZ)
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from django.db import connection
+    from todo import fila
+    from todo.db import pragmas_atuais
+    from todo.models import Trabalho
+
+    # Os "database is locked" do perfil padrão são tentados de novo pelo worker, sem mostrar
+    logging.disable(logging.CRITICAL)
+    call_command('migrate', verbosity=0)
+
+    @fila.trabalho('benchmark_vazio')
+    def vazio(indice):
+        pass
+
+    @fila.trabalho('benchmark_io')
+    def io(indice):
+        time.sleep(args.io_ms / 1000)
+
+    inicio = time.perf_counter()
+    for i in range(args.trabalhos):
+        vazio.enfileirar(i)
+    enfileirados = args.trabalhos / (time.perf_counter() - inicio)
+    Trabalho.objects.all().delete()
+
+    resultados = []
+    for nome, funcao in (('vazio', vazio), ('io', io)):
+        quantidade = args.trabalhos if nome == 'vazio' else args.trabalhos_io
+        for concorrencia in args.concorrencia or [1, 2, 4]:
+            Trabalho.objects.bulk_create(
+                Trabalho(nome=funcao.nome_trabalho, argumentos=[i]) for i in range(quantidade))
+            inicio = time.perf_counter()
+            fila.trabalhar(concorrencia=concorrencia, lote=args.lote, intervalo=0.01, ate_esvaziar=True)
+            segundos = time.perf_counter() - inicio
+            concluidos = Trabalho.objects.filter(status='concluido').count()
+            resultados.append({
+                'trabalho': nome,
+                'concorrencia': concorrencia,
+                'trabalhos': quantidade,
+                'concluidos': concluidos,
+                'segundos': round(segundos, 2),
+                'trabalhos_por_segundo': round(concluidos / segundos, 1),
+            })
+            Trabalho.objects.all().delete()
+    print(json.dumps({
+        'journal_mode': pragmas_atuais(connection, ['journal_mode'])['journal_mode'],
+        'enfileirados_por_segundo': round(enfileirados, 1),
+        'execucao': resultados,
+    }))
+
+
+def medir(perfil, args):
+    with tempfile.TemporaryDirectory() as diretorio:
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=PERFIS[perfil],
+                   TODO_DB_NAME=os.path.join(diretorio, 'db.sqlite3'),
+                   DJANGO_SECRET_KEY=os.environ.get('DJANGO_SECRET_KEY', 'benchmark'))
+        processo = subprocess.run([sys.executable, '-m', 'benchmarks.fila', '--interno', *sys.argv[1:]],
+                                  cwd=RAIZ, env=env, check=True, capture_output=True, text=True)
+    return {'perfil': perfil, **json.loads(processo.stdout.strip().splitlines()[-1])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--trabalhos', type=int, default=2000, help='Trabalhos vazios por medição')
+    parser.add_argument('--trabalhos-io', type=int, default=400, help='Trabalhos com espera por medição')
+    parser.add_argument('--io-ms', type=float, default=5, help='Espera de cada trabalho "io", em ms')
+    parser.add_argument('--lote', type=int, default=10, help='Trabalhos pegos de uma vez por thread')
+    parser.add_argument('--concorrencia', type=int, action='append', help='Threads do worker (padrão: 1, 2 e 4)')
+    parser.add_argument('--perfil', action='append', choices=list(PERFIS), help='Perfis medidos (padrão: todos)')
+    parser.add_argument('--interno', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.interno:
+        medir_perfil(args)
+    else:
+        print(json.dumps([medir(perfil, args) for perfil in args.perfil or PERFIS], indent=2))
+
+
+if __name__ == '__main__':
+    main()
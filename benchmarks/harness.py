@@ -0,0 +1,358 @@
+"""
+Mede todas as rotas de todo/urls.py: latencia p50/p95/p99, consultas SQL por requisição e bytes
+da resposta. O resultado sai em JSON para comparar execuções (--comparar).
+
+Por padrão cria um banco de teste temporario e o popula com `manage.py gerar_dados` usando
+--semente, então duas execuções com os mesmos parametros medem a mesma base. Com --banco atual
+mede o banco configurado, logado como --usuario.
+
+As requisições passam pelo test client (todos os middlewares, sem rede). Com --http elas vão
+para um servidor wsgiref local numa thread, incluindo o custo do HTTP; nesse modo só as rotas
+GET são medidas.
+
+Exemplos:
+  python -m benchmarks.harness --usuarios 5 --listas 20 --tarefas 500 --saida antes.json
+  python -m benchmarks.harness --usuarios 5 --listas 20 --tarefas 500 --comparar antes.json
+  python -m benchmarks.harness --banco atual --usuario admin --http --cache frio
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from collections import namedtuple
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# nome: rotulo no relatorio; url: nome da url em todo/urls.py; argumentos(contexto) -> args do reverse;
+# query: parametros GET; metodo: 'get' ou 'post'; dados(contexto, n) -> corpo do POST (dict de
+# formulario, ou str enviada como JSON)
+Rota = namedtuple('Rota', ['nome', 'url', 'argumentos', 'query', 'metodo', 'dados'],
+                  defaults=[lambda c: [], None, 'get', None])
+
+ROTAS = [
+    Rota('index', 'index'),
+    Rota('login', 'login'),
+    Rota('register', 'register'),
+    Rota('mudarSenha', 'mudarSenha'),
+    Rota('logout', 'logout'),
+    Rota('user_info', 'user_info'),
+    Rota('set_list', 'set_list'),
+    Rota('get_list', 'get_list', lambda c: [c['lista']]),
+    Rota('get_list[fragmento]', 'get_list', lambda c: [c['lista']], {'fragmento': 1}),
+    Rota('set_task', 'set_task'),
+    Rota('importar_tarefas', 'importar_tarefas', lambda c: [c['lista']]),
+    Rota('exportar_tarefas[csv]', 'exportar_tarefas', lambda c: ['csv']),
+    Rota('exportar_lista[ics]', 'exportar_lista', lambda c: [c['lista'], 'ics']),
+    Rota('editar_lista', 'editar_lista', lambda c: [c['lista']]),
+    Rota('editar_tarefa', 'editar_tarefa', lambda c: [c['tarefa']]),
+    Rota('api_listas', 'api_listas'),
+    Rota('api_lista', 'api_lista', lambda c: [c['lista']]),
+    Rota('api_tarefas', 'api_tarefas', query={'status': 'pendente'}),
+    Rota('api_tarefas[ndjson]', 'api_tarefas', query={'formato': 'ndjson', 'campos': 'titulo,dataVencimento'}),
+    Rota('api_tarefa', 'api_tarefa', lambda c: [c['tarefa']]),
+    Rota('buscar', 'buscar', query={'q': 'tarefa'}),
+    Rota('api_busca', 'api_busca', query={'q': 'taref'}),
+    Rota('calendario', 'calendario'),
+    Rota('calendario_visao[semana]', 'calendario_visao', lambda c: ['semana']),
+    Rota('calendario_visao[agenda]', 'calendario_visao', lambda c: ['agenda']),
+    Rota('api_calendario', 'api_calendario',
+         query=lambda c: {'de': datetime.date.today().isoformat(), 'ate': c['vencimento']}),
+    Rota('estatisticas', 'estatisticas'),
+    Rota('estatisticas[tudo]', 'estatisticas', query={'periodo': 'tudo'}),
+    Rota('api_estatisticas', 'api_estatisticas', query={'agrupamento': 'semana'}),
+    # Só staff; com o usuario do harness mede o redirecionamento do staff_member_required
+    Rota('perfil', 'perfil'),
+    Rota('metricas', 'metricas'),
+    # Escritas, só com --escrita
+    Rota('set_list[post]', 'set_list', metodo='post',
+         dados=lambda c, n: {'titulo': f'Harness {n}', 'descricao': 'Lista criada pelo harness'}),
+    Rota('set_task[post]', 'set_task', query=lambda c: {'Enviar': c['lista']}, metodo='post',
+         dados=lambda c, n: {'titulo': f'Harness {n}', 'descricao': 'Tarefa criada pelo harness',
+                             'prioridade': 'media', 'dataVencimento': c['vencimento']}),
+    Rota('tarefas_lote[post]', 'tarefas_lote', metodo='post',
+         dados=lambda c, n: {'ids': [c['tarefa']], 'operacao': 'prioridade', 'valor': ('alta', 'baixa')[n % 2],
+                             'lista': c['lista']}),
+    Rota('api_tarefas_lote[post]', 'api_tarefas_lote', metodo='post',
+         dados=lambda c, n: json.dumps({'ids': [c['tarefa']], 'operacao': 'prioridade',
+                                        'valor': ('alta', 'baixa')[n % 2]})),
+    Rota('api_tarefa_posicao[post]', 'api_tarefa_posicao', lambda c: [c['tarefa']], metodo='post',
+         dados=lambda c, n: json.dumps({'depois_de': None})),
+    Rota('editar_tarefa[post]', 'editar_tarefa', lambda c: [c['tarefa']], metodo='post',
+         dados=lambda c, n: {'titulo': f'Harness editada {n}', 'descricao': 'Editada', 'prioridade': 'alta',
+                             'dataVencimento': c['vencimento'], 'status': 'em andamento'}),
+]
+
+
+def percentil(valores, p):
+    """ Percentil pelo metodo do rank mais proximo """
+    ordenados = sorted(valores)
+    if not ordenados:
+        return None
+    return ordenados[min(len(ordenados) - 1, max(0, int(round(p / 100 * len(ordenados))) - 1))]
+
+
+def resumir(amostras):
+    latencias = [a['ms'] for a in amostras]
+    consultas = [a['consultas'] for a in amostras]
+    return {
+        'requisicoes': len(amostras),
+        'status': sorted({a['status'] for a in amostras}),
+        'p50_ms': round(percentil(latencias, 50), 3),
+        'p95_ms': round(percentil(latencias, 95), 3),
+        'p99_ms': round(percentil(latencias, 99), 3),
+        'media_ms': round(sum(latencias) / len(latencias), 3),
+        'consultas': percentil(consultas, 50),
+        'consultas_max': max(consultas),
+        'bytes': percentil([a['bytes'] for a in amostras], 50),
+    }
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class ClienteTeste:
+    """ Faz as requisições pelo test client, contando as consultas na conexão desta thread """
+
+    def __init__(self, usuario):
+        from django.test import Client
+        self.usuario = usuario
+        self.cliente = Client(HTTP_HOST='127.0.0.1')
+        self.cliente.force_login(usuario)
+
+    def relogar(self):
+        self.cliente.force_login(self.usuario)
+
+    def requisitar(self, metodo, url, dados):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as contexto:
+            inicio = time.perf_counter()
+            if isinstance(dados, str):
+                resposta = getattr(self.cliente, metodo)(url, dados, content_type='application/json')
+            else:
+                resposta = getattr(self.cliente, metodo)(url, dados)
+            if resposta.streaming:
+                tamanho = sum(len(parte) for parte in resposta.streaming_content)
+            else:
+                tamanho = len(resposta.content)
+            ms = (time.perf_counter() - inicio) * 1000
+        return {'ms': ms, 'consultas': len(contexto), 'bytes': tamanho, 'status': resposta.status_code}
+
+
+class ClienteHttp:
+    """
+    Sobe um servidor wsgiref numa thread e faz as requisições por HTTP. As consultas são contadas
+    dentro do servidor e associadas à requisição pelo cabeçalho X-Harness-Id
+    """
+
+    def __init__(self, usuario):
+        from wsgiref.simple_server import WSGIRequestHandler, make_server
+        from django.conf import settings
+        from django.core.handlers.wsgi import WSGIHandler
+        from django.db import connection
+        from django.test import Client
+        from django.test.utils import CaptureQueriesContext
+
+        self.usuario = usuario
+        self.consultas = {}
+        self.contador = 0
+        handler = WSGIHandler()
+
+        def aplicacao(environ, start_response):
+            with CaptureQueriesContext(connection) as contexto:
+                corpo = b''.join(handler(environ, start_response))
+            self.consultas[environ.get('HTTP_X_HARNESS_ID')] = len(contexto)
+            return [corpo]
+
+        class Silencioso(WSGIRequestHandler):
+            def log_message(self, *args):
+                pass
+
+        self.servidor = make_server('127.0.0.1', 0, aplicacao, handler_class=Silencioso)
+        self.porta = self.servidor.server_port
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        self.nome_cookie = settings.SESSION_COOKIE_NAME
+        self.cliente = Client()
+        self.relogar()
+
+    def relogar(self):
+        self.cliente.force_login(self.usuario)
+        self.cookie = f'{self.nome_cookie}={self.cliente.cookies[self.nome_cookie].value}'
+
+    def requisitar(self, metodo, url, dados):
+        import http.client
+        from urllib.parse import urlencode
+
+        self.contador += 1
+        identificador = str(self.contador)
+        if dados:
+            url = f'{url}{"&" if "?" in url else "?"}{urlencode(dados)}'
+        conexao = http.client.HTTPConnection('127.0.0.1', self.porta)
+        inicio = time.perf_counter()
+        conexao.request(metodo.upper(), url, headers={'Cookie': self.cookie, 'X-Harness-Id': identificador})
+        resposta = conexao.getresponse()
+        tamanho = len(resposta.read())
+        ms = (time.perf_counter() - inicio) * 1000
+        conexao.close()
+        return {'ms': ms, 'consultas': self.consultas.pop(identificador, None) or 0, 'bytes': tamanho,
+                'status': resposta.status}
+
+    def fechar(self):
+        self.servidor.shutdown()
+
+
+def medir(args, usuario, contexto):
+    from django.core.cache import caches
+    from django.urls import reverse
+    from todo import urls as todo_urls
+
+    cliente = ClienteHttp(usuario) if args.http else ClienteTeste(usuario)
+    rotas = [rota for rota in ROTAS
+             if (rota.metodo == 'get' or (args.escrita and not args.http))
+             and (not args.rota or rota.nome in args.rota)]
+    resultados = {}
+    contador = 0
+    try:
+        for rota in rotas:
+            url = reverse(rota.url, args=rota.argumentos(contexto))
+            query = rota.query(contexto) if callable(rota.query) else rota.query
+            if query:
+                url = f'{url}?{"&".join(f"{chave}={valor}" for chave, valor in query.items())}'
+            amostras = []
+            for n in range(args.aquecimento + args.repeticoes):
+                contador += 1
+                if args.cache == 'frio':
+                    caches['default'].clear()
+                    cliente.relogar()
+                dados = rota.dados(contexto, contador) if rota.dados else None
+                amostra = cliente.requisitar(rota.metodo, url, dados)
+                if rota.url == 'logout':
+                    cliente.relogar()
+                if n >= args.aquecimento:
+                    amostras.append(amostra)
+            resultados[rota.nome] = resumir(amostras)
+            print(f'{rota.nome:28} p50 {resultados[rota.nome]["p50_ms"]:9.2f}ms  '
+                  f'p95 {resultados[rota.nome]["p95_ms"]:9.2f}ms  '
+                  f'consultas {resultados[rota.nome]["consultas"]:3}  bytes {resultados[rota.nome]["bytes"]}',
+                  file=sys.stderr)
+    finally:
+        if args.http:
+            cliente.fechar()
+
+    medidas = {rota.url for rota in ROTAS}
+    sem_medicao = sorted(padrao.name for padrao in todo_urls.urlpatterns if padrao.name not in medidas)
+    if sem_medicao:
+        print(f'Aviso: rotas sem medição no harness: {", ".join(sem_medicao)}', file=sys.stderr)
+    return resultados, sem_medicao
+
+
+def contexto_usuario(usuario):
+    """ Escolhe a lista com mais tarefas do usuario e uma das tarefas dela """
+    from django.db.models import Count
+    from todo.models import Lista, Tarefa
+
+    lista = Lista.objects.filter(usuario=usuario).annotate(total=Count('tarefa')).order_by('-total', 'pk').first()
+    if lista is None:
+        raise SystemExit(f'O usuario {usuario.username} não tem listas')
+    tarefa = Tarefa.objects.filter(lista=lista).order_by('pk').first()
+    if tarefa is None:
+        raise SystemExit(f'A lista {lista.pk} não tem tarefas')
+    return {'lista': lista.pk, 'tarefa': tarefa.pk, 'tarefas_na_lista': lista.total,
+            'vencimento': (datetime.date.today() + datetime.timedelta(days=30)).isoformat()}
+
+
+def comparar(atual, arquivo):
+    with open(arquivo, encoding='utf-8') as f:
+        anterior = json.load(f)['rotas']
+    print(f'\n{"rota":28} {"p95 antes":>10} {"p95 agora":>10} {"variação":>9} {"consultas":>12}', file=sys.stderr)
+    for nome, dados in atual.items():
+        if nome not in anterior:
+            continue
+        antes = anterior[nome]
+        variacao = (dados['p95_ms'] - antes['p95_ms']) / antes['p95_ms'] * 100 if antes['p95_ms'] else 0
+        print(f'{nome:28} {antes["p95_ms"]:10.2f} {dados["p95_ms"]:10.2f} {variacao:+8.1f}% '
+              f'{antes["consultas"]:>5} -> {dados["consultas"]:<4}', file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--banco', choices=['teste', 'atual'], default='teste',
+                        help='teste: banco temporario gerado com gerar_dados; atual: o banco configurado')
+    parser.add_argument('--usuario', help='Username medido (obrigatorio com --banco atual)')
+    parser.add_argument('--usuarios', type=int, default=3, help='gerar_dados --usuarios')
+    parser.add_argument('--listas', type=int, default=10, help='gerar_dados --listas')
+    parser.add_argument('--tarefas', type=int, default=200, help='gerar_dados --tarefas')
+    parser.add_argument('--semente', type=int, default=42, help='gerar_dados --semente')
+    parser.add_argument('--repeticoes', type=int, default=50, help='Requisições medidas por rota')
+    parser.add_argument('--aquecimento', type=int, default=3, help='Requisições descartadas antes de medir')
+    parser.add_argument('--cache', choices=['quente', 'frio'], default='quente',
+                        help='frio limpa o cache antes de cada requisição')
+    parser.add_argument('--escrita', action='store_true', help='Mede também as rotas de POST (só test client)')
+    parser.add_argument('--http', action='store_true', help='Faz as requisições por HTTP num servidor wsgiref')
+    parser.add_argument('--rota', action='append', help='Mede só esta rota (pode repetir)')
+    parser.add_argument('--saida', help='Arquivo JSON do resultado (padrão: saida padrão)')
+    parser.add_argument('--comparar', help='JSON de uma execução anterior para comparar')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'polls.settings')
+    if RAIZ not in sys.path:
+        sys.path.insert(0, RAIZ)
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.test.utils import setup_databases, teardown_databases
+
+    configuracao = None
+    if args.banco == 'teste':
+        configuracao = setup_databases(verbosity=0, interactive=False)
+        call_command('gerar_dados', usuarios=args.usuarios, listas=args.listas, tarefas=args.tarefas,
+                     semente=args.semente, stdout=sys.stderr)
+        args.usuario = 'bench0'
+    elif not args.usuario:
+        parser.error('--usuario é obrigatorio com --banco atual')
+
+    try:
+        usuario = User.objects.get(username=args.usuario)
+        contexto = contexto_usuario(usuario)
+        rotas, sem_medicao = medir(args, usuario, contexto)
+    finally:
+        if configuracao is not None:
+            teardown_databases(configuracao, verbosity=0)
+
+    resultado = {
+        'data': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'banco': settings.DATABASES['default']['ENGINE'],
+        'debug': settings.DEBUG,
+        'parametros': {chave: valor for chave, valor in vars(args).items() if chave not in ('saida', 'comparar')},
+        'contexto': contexto,
+        'rotas': rotas,
+        'sem_medicao': sem_medicao,
+    }
+    texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            f.write(texto + '\n')
+    else:
+        print(texto)
+    if args.comparar:
+        comparar(rotas, args.comparar)
+
+
+if __name__ == '__main__':
+    main()
@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'polls.settings')
+# Usa as views assincronas de leitura (todo/assincrono.py), que rodam direto no event loop
+os.environ.setdefault('TODO_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 from django.urls import reverse_lazy
 from pathlib import Path
+import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -42,12 +43,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'todo.middleware.MetricasMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
+    'todo.middleware.ReplicaMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'todo.middleware.PerfilMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
+    'todo.middleware.SessionTimeoutMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
@@ -55,7 +60,8 @@ ROOT_URLCONF = 'polls.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates que também mede o tempo de render nas requisições amostradas pelo perfil
+        'BACKEND': 'todo.perfil.TemplatesComPerfil',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -78,10 +84,61 @@ WSGI_APPLICATION = 'polls.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('TODO_DB_NAME', BASE_DIR / 'db.sqlite3'),
     }
 }
 
+# Replicas de leitura (todo/routers.py). TODO_REPLICA_NAME liga uma replica SQLite local,
+# mantida como copia do primario pelo comando replicar_sqlite
+
+if os.environ.get('TODO_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ['TODO_REPLICA_NAME'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+TODO_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+
+DATABASE_ROUTERS = ['todo.routers.ReplicaRouter']
+
+# Segundos que as leituras de um usuario ficam no primario depois de uma escrita
+
+TODO_REPLICA_FIXAR = 5
+
+# PRAGMA aplicados a cada conexão com o SQLite (todo/db.py). Vazio no desenvolvimento,
+# polls/settings_producao.py liga o WAL e os demais ajustes
+
+TODO_SQLITE_PRAGMAS = {}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# TODO_CACHE_BACKEND escolhe o backend: locmem (padrão), file ou redis (usa TODO_CACHE_URL)
+
+TODO_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'todo',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('TODO_CACHE_DIR', BASE_DIR / '.cache'),
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('TODO_CACHE_URL', 'redis://127.0.0.1:6379'),
+    },
+}
+
+CACHES = {
+    'default': TODO_CACHE_BACKENDS[os.environ.get('TODO_CACHE_BACKEND', 'locmem')],
+}
+
+# Tempo em segundos que as paginas e agregados do todo ficam no cache
+
+TODO_CACHE_TIMEOUT = 300
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -130,4 +187,105 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = reverse_lazy('login')
 
-CSRF_TRUSTED_ORIGINS = ['https://5ffc-2804-1690-613-4d0b-6cdc-26ab-ca4e-48e1.ngrok-free.app']
\ No newline at end of file
+CSRF_TRUSTED_ORIGINS = ['https://5ffc-2804-1690-613-4d0b-6cdc-26ab-ca4e-48e1.ngrok-free.app']
+
+# Tamanho dos lotes usados pelo bulk_create na importação de tarefas
+
+TODO_IMPORT_BATCH_SIZE = 500
+
+# Paginação das tarefas no get_list
+
+TODO_PAGE_SIZE = 50
+
+TODO_PAGE_SIZE_MAX = 200
+
+# Linhas lidas do banco por vez nas respostas NDJSON da API
+
+TODO_API_CHUNK_SIZE = 2000
+
+# Linhas lidas do banco por vez na exportação de tarefas em csv e ics
+
+TODO_EXPORT_CHUNK_SIZE = 2000
+
+# Sessões lidas do cache (com copia no banco) e tempo de login conferido pelo SessionTimeoutMiddleware
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+TODO_SESSION_TIMEOUT = 60 * 60
+
+# 'absoluto' (conta a partir do login) ou 'deslizante' (conta a partir da ultima requisição)
+
+TODO_SESSION_TIMEOUT_MODO = os.environ.get('TODO_SESSION_TIMEOUT_MODO', 'absoluto')
+
+# Views assincronas para index, get_list e os GET da API. O polls/asgi.py liga por padrão;
+# sob WSGI elas ficam desligadas, já que lá cada view async rodaria num event loop proprio
+
+TODO_ASYNC_VIEWS = os.environ.get('TODO_ASYNC_VIEWS', '') == '1'
+
+# Perfil por amostragem (todo/perfil.py): fração das requisições medidas e se o cProfile roda nelas
+
+TODO_PERFIL_AMOSTRA = float(os.environ.get('TODO_PERFIL_AMOSTRA', '0'))
+
+TODO_PERFIL_CPROFILE = os.environ.get('TODO_PERFIL_CPROFILE', '') == '1'
+
+# As medições do perfil vão para um arquivo rotativo, uma linha JSON por requisição
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'perfil': {'format': '%(asctime)s %(process)d %(message)s'},
+    },
+    'handlers': {
+        'perfil': {
+            'class': 'logging.handlers.RotatingFileHandler',
+            'filename': os.environ.get('TODO_PERFIL_ARQUIVO', str(BASE_DIR / 'perfil.log')),
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+            'formatter': 'perfil',
+        },
+    },
+    'loggers': {
+        'todo.perfil': {'handlers': ['perfil'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+# Metricas do /metrics (todo/metricas.py). Com varios workers, TODO_METRICAS_DIR aponta para um
+# diretorio compartilhado onde cada processo grava o seu snapshot
+
+TODO_METRICAS_DIR = os.environ.get('TODO_METRICAS_DIR') or None
+
+TODO_METRICAS_INTERVALO = 5
+
+TODO_METRICAS_TOKEN = os.environ.get('TODO_METRICAS_TOKEN') or None
+
+# Lembretes das tarefas que vencem em breve (comando enviar_lembretes). Localmente os emails
+# vão para o console; TODO_EMAIL_BACKEND=file grava em TODO_EMAIL_DIR e smtp usa EMAIL_HOST
+
+TODO_LEMBRETE_DIAS = 1
+
+EMAIL_BACKEND = 'django.core.mail.backends.%s.EmailBackend' % os.environ.get('TODO_EMAIL_BACKEND', 'console')
+
+EMAIL_FILE_PATH = os.environ.get('TODO_EMAIL_DIR', str(BASE_DIR / 'emails'))
+
+EMAIL_HOST = os.environ.get('EMAIL_HOST', 'localhost')
+
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'todo@localhost')
+
+# Fila de trabalhos em segundo plano (todo/fila.py, comando worker): tentativas por trabalho,
+# espera base em segundos entre tentativas (dobra a cada falha) e segundos até um trabalho em
+# executando ser considerado abandonado
+
+TODO_FILA_TENTATIVAS = 3
+
+TODO_FILA_ESPERA = 5
+
+TODO_FILA_EXPIRACAO = 300
+
+# Calendario (todo/calendario.py): tarefas mostradas por dia nas visões de mês e de semana (as
+# outras viram "+N") e dias de ocorrencias previstas depois da ultima pagina da agenda
+
+TODO_CALENDARIO_POR_DIA = {'mes': 3, 'semana': 20}
+
+TODO_CALENDARIO_AGENDA_DIAS = 30
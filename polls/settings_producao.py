@@ -0,0 +1,43 @@
+"""
+Configurações de produção, por cima de polls/settings.py:
+
+    DJANGO_SETTINGS_MODULE=polls.settings_producao gunicorn polls.wsgi:application --workers 4
+
+O SQLite continua sendo o banco, ajustado para varios workers escrevendo ao mesmo tempo:
+WAL, transações que já começam com o lock de escrita, espera pelo lock em vez de falhar na
+hora e conexões persistentes. A comparação com o padrão fica em benchmarks/escrita_concorrente.py.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES
+import os
+
+DEBUG = False
+
+SECRET_KEY = os.environ['DJANGO_SECRET_KEY']
+
+ALLOWED_HOSTS = [host for host in os.environ.get('DJANGO_ALLOWED_HOSTS', 'localhost').split(',') if host]
+
+for banco in DATABASES.values():
+    # Conexões reaproveitadas entre requisições por até 10 minutos, conferidas antes do uso
+    banco['CONN_MAX_AGE'] = int(os.environ.get('TODO_CONN_MAX_AGE', 600))
+    banco['CONN_HEALTH_CHECKS'] = True
+
+DATABASES['default'].update({
+    'OPTIONS': {
+        # BEGIN IMMEDIATE: a transação pega o lock de escrita no começo. Com o BEGIN padrão
+        # (DEFERRED) uma transação que leu e depois tenta escrever falha com "database is locked"
+        # sem esperar o busy_timeout, quando outra conexão já está escrevendo
+        'transaction_mode': 'IMMEDIATE',
+        # Espera do modulo sqlite3 pelo lock, em segundos (o mesmo que o busy_timeout abaixo)
+        'timeout': 20,
+    },
+})
+
+TODO_SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 20000,
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
+}
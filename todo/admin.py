@@ -1,6 +1,19 @@
 from django.contrib import admin
 
 from todo.models import Tarefa, Lista
-admin.site.register(Tarefa)
-admin.site.register(Lista)
 
+
+@admin.register(Tarefa)
+class TarefaAdmin(admin.ModelAdmin):
+    list_display = ('titulo', 'lista', 'user', 'status', 'prioridade', 'dataVencimento')
+    list_filter = ('status', 'prioridade')
+    # Tarefa.__str__ e as colunas usam o usuario e a lista, busca tudo no mesmo JOIN
+    list_select_related = ('lista', 'user')
+    raw_id_fields = ('lista', 'user')
+
+
+@admin.register(Lista)
+class ListaAdmin(admin.ModelAdmin):
+    list_display = ('titulo', 'usuario', 'data_atualizacao')
+    list_select_related = ('usuario',)
+    raw_id_fields = ('usuario',)
@@ -0,0 +1,324 @@
+import datetime
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.http import require_http_methods
+
+from . import busca, calendario as calendario_app, estatisticas as estatisticas_app, lote, posicoes
+from .cache import invalidar
+from .models import Lista, Tarefa
+from .paginacao import paginar
+
+# API JSON para scripts e para o cliente mobile. Usa a mesma sessão (e o mesmo CSRF) do site.
+#
+# Parametros das coleções (GET api/listas e GET api/tarefas):
+#   campos=titulo,status      retorna só os campos pedidos (o id sempre vem)
+#   cursor=... e tamanho=N    paginação por cursor, o proximo cursor vem em "proximo"
+#   formato=ndjson            exporta a coleção inteira em streaming, um objeto JSON por linha
+# Filtros de tarefas: lista, status, prioridade (aceitam varios valores separados por virgula),
+# vencimento_de, vencimento_ate (AAAA-MM-DD) e concluido (true/false).
+#
+# GET api/busca?q=...&tipo=tarefa|lista busca nos titulos e descrições (ver todo/busca.py).
+# GET api/calendario?de=...&ate=... conta as tarefas (total e abertas) por dia de vencimento,
+# para os mapas de calor (ver todo/calendario.py); no maximo DIAS_CALENDARIO dias por vez.
+# GET api/estatisticas?de=...&ate=...&agrupamento=dia|semana|mes traz as concluidas por periodo
+# e os totais do intervalo, das estatisticas diarias (ver todo/estatisticas.py).
+# POST api/tarefas/lote com {"ids": [...], "operacao": "...", "valor": ...} aplica uma operação
+# em varias tarefas de uma vez (ver todo/lote.py).
+# POST api/tarefas/<id>/posicao com {"depois_de": id ou null} muda a tarefa de lugar na ordem
+# manual da lista, logo depois da tarefa informada ou no topo (ver todo/posicoes.py).
+
+DIAS_CALENDARIO = 366
+# Dez anos; sem ?de=, os ultimos 30 dias.
+DIAS_ESTATISTICAS = 3660
+
+CAMPOS_LISTA = ('id', 'titulo', 'descricao', 'data_criacao', 'data_atualizacao')
+CAMPOS_TAREFA = ('id', 'titulo', 'descricao', 'dataCriacao', 'dataConclusao', 'concluido', 'status',
+                 'prioridade', 'dataVencimento', 'lista', 'posicao')
+
+
+class ErroApi(Exception):
+    """ Erro que vira uma resposta JSON com o status informado """
+
+    def __init__(self, mensagem, status=400):
+        super().__init__(mensagem)
+        self.mensagem = mensagem
+        self.status = status
+
+
+def api_view(*metodos):
+    """
+    Decorador das views da API: exige login (401 em vez de redirecionar), aceita só os
+    metodos informados e transforma ErroApi e ValidationError em respostas JSON
+    """
+    def decorador(view_func):
+        @require_http_methods(metodos)
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if not request.user.is_authenticated:
+                return JsonResponse({'erro': 'Autenticação necessária'}, status=401)
+            try:
+                return view_func(request, *args, **kwargs)
+            except ErroApi as e:
+                return JsonResponse({'erro': e.mensagem}, status=e.status)
+            except ValidationError as e:
+                erros = e.message_dict if hasattr(e, 'error_dict') else {'__all__': e.messages}
+                return JsonResponse({'erro': 'Dados inválidos', 'campos': erros}, status=400)
+        return wrapper
+    return decorador
+
+
+def _corpo(request):
+    """ Le o corpo JSON da requisição """
+    try:
+        dados = json.loads(request.body or b'{}')
+    except ValueError:
+        raise ErroApi('JSON inválido')
+    if not isinstance(dados, dict):
+        raise ErroApi('O corpo deve ser um objeto JSON')
+    return dados
+
+
+def _data(valor, campo):
+    """ Converte uma data AAAA-MM-DD, levantando ErroApi se ela for inválida """
+    if valor in (None, ''):
+        return None
+    try:
+        return models.DateField().to_python(valor)
+    except ValidationError:
+        raise ErroApi(f'Data inválida em {campo}')
+
+
+def _campos(request, permitidos):
+    """ Retorna os campos pedidos em ?campos=, sempre com o id """
+    pedidos = request.GET.get('campos')
+    if not pedidos:
+        return list(permitidos)
+    campos = ['id'] + [campo for campo in pedidos.split(',') if campo and campo != 'id']
+    invalidos = [campo for campo in campos if campo not in permitidos]
+    if invalidos:
+        raise ErroApi(f'Campos inválidos: {", ".join(invalidos)}')
+    return campos
+
+
+def _serializar(objeto, campos):
+    return {campo: getattr(objeto, 'lista_id' if campo == 'lista' else campo) for campo in campos}
+
+
+def _ndjson(queryset, campos):
+    """ Resposta em streaming que percorre o queryset com iterator(), sem carregar tudo na memoria """
+    tamanho = getattr(settings, 'TODO_API_CHUNK_SIZE', 2000)
+    linhas = (json.dumps(linha, cls=DjangoJSONEncoder) + '\n'
+              for linha in queryset.values(*campos).iterator(chunk_size=tamanho))
+    return StreamingHttpResponse(linhas, content_type='application/x-ndjson')
+
+
+def _colecao(request, queryset, campos, ordem):
+    """ Responde a coleção em NDJSON (formato=ndjson) ou em paginas por cursor """
+    if request.GET.get('formato') == 'ndjson':
+        return _ndjson(queryset.order_by(ordem, 'id'), campos)
+    carregar = [campo for campo in campos if campo != 'lista'] + (['lista_id'] if 'lista' in campos else [])
+    pagina = paginar(queryset.only(*carregar, ordem), ordem, request.GET.get('cursor'), request.GET.get('tamanho'))
+    return JsonResponse({
+        'resultados': [_serializar(objeto, campos) for objeto in pagina.itens],
+        'proximo': pagina.proximo,
+    }, encoder=DjangoJSONEncoder)
+
+
+def _tocar_lista(usuario_id, *lista_ids):
+    """ Atualiza data_atualizacao das listas alteradas e invalida o cache, como as views fazem """
+    Lista.objects.filter(pk__in=lista_ids).update(data_atualizacao=timezone.now())
+    invalidar(usuario_id, lista_ids)
+
+
+def _aplicar_status(tarefa, status):
+    """ Mantem concluido e dataConclusao de acordo com o status, como em editar_tarefa """
+    tarefa.status = status
+    tarefa.concluido = status == 'concluido'
+    if tarefa.concluido:
+        tarefa.dataConclusao = tarefa.dataConclusao or datetime.date.today()
+    else:
+        tarefa.dataConclusao = None
+
+
+def _lista_do_usuario(request, pk):
+    try:
+        return Lista.objects.get(pk=pk, usuario_id=request.user.pk)
+    except (Lista.DoesNotExist, ValueError, TypeError):
+        raise ErroApi('Lista não encontrada', status=404)
+
+
+def _tarefa_do_usuario(request, pk):
+    try:
+        return Tarefa.objects.get(pk=pk, user_id=request.user.pk)
+    except Tarefa.DoesNotExist:
+        raise ErroApi('Tarefa não encontrada', status=404)
+
+
+@api_view('GET', 'POST')
+def listas(request):
+    """ GET: lista as listas do usuario. POST: cria uma lista com titulo e descricao """
+    if request.method == 'GET':
+        campos = _campos(request, CAMPOS_LISTA)
+        return _colecao(request, Lista.objects.filter(usuario_id=request.user.pk), campos, 'id')
+
+    dados = _corpo(request)
+    agora = timezone.now()
+    lista = Lista(usuario=request.user, titulo=dados.get('titulo', ''), descricao=dados.get('descricao', ''),
+                  data_criacao=agora, data_atualizacao=agora)
+    lista.save()
+    return JsonResponse(_serializar(lista, CAMPOS_LISTA), status=201, encoder=DjangoJSONEncoder)
+
+
+@api_view('GET', 'PATCH', 'DELETE')
+def lista(request, pk):
+    """ GET: detalhes de uma lista. PATCH: altera titulo/descricao. DELETE: deleta a lista e suas tarefas """
+    objeto = _lista_do_usuario(request, pk)
+    if request.method == 'DELETE':
+        objeto.delete()
+        return HttpResponse(status=204)
+    if request.method == 'PATCH':
+        dados = _corpo(request)
+        for campo in ('titulo', 'descricao'):
+            if campo in dados:
+                setattr(objeto, campo, dados[campo])
+        objeto.data_atualizacao = timezone.now()
+        objeto.save()
+    return JsonResponse(_serializar(objeto, _campos(request, CAMPOS_LISTA)), encoder=DjangoJSONEncoder)
+
+
+def _filtrar_tarefas(request, queryset):
+    """ Aplica os filtros de ?lista=, ?status=, ?prioridade=, ?vencimento_de=, ?vencimento_ate= e ?concluido= """
+    for parametro, campo in (('lista', 'lista_id'), ('status', 'status'), ('prioridade', 'prioridade')):
+        valores = [valor for valor in request.GET.get(parametro, '').split(',') if valor]
+        if valores:
+            queryset = queryset.filter(**{f'{campo}__in': valores})
+    inicio = _data(request.GET.get('vencimento_de'), 'vencimento_de')
+    if inicio:
+        queryset = queryset.filter(dataVencimento__gte=inicio)
+    fim = _data(request.GET.get('vencimento_ate'), 'vencimento_ate')
+    if fim:
+        queryset = queryset.filter(dataVencimento__lte=fim)
+    concluido = request.GET.get('concluido')
+    if concluido in ('true', 'false'):
+        queryset = queryset.filter(concluido=concluido == 'true')
+    return queryset
+
+
+@api_view('GET', 'POST')
+def tarefas(request):
+    """ GET: lista as tarefas do usuario com filtros. POST: cria uma tarefa numa lista do usuario """
+    if request.method == 'GET':
+        campos = _campos(request, CAMPOS_TAREFA)
+        queryset = _filtrar_tarefas(request, Tarefa.objects.filter(user_id=request.user.pk))
+        return _colecao(request, queryset, campos, 'dataVencimento')
+
+    dados = _corpo(request)
+    lista = _lista_do_usuario(request, dados.get('lista'))
+    vencimento = _data(dados.get('dataVencimento'), 'dataVencimento')
+    if vencimento is None:
+        raise ErroApi('Informe a dataVencimento')
+    tarefa = Tarefa(lista=lista, user=request.user, titulo=dados.get('titulo', ''),
+                    descricao=dados.get('descricao'), prioridade=dados.get('prioridade'),
+                    dataVencimento=vencimento, dataCriacao=datetime.date.today())
+    _aplicar_status(tarefa, dados.get('status') or 'pendente')
+    # O save atualiza a lista (contadores e data_atualizacao) e invalida o cache pelos signals
+    tarefa.save()
+    return JsonResponse(_serializar(tarefa, CAMPOS_TAREFA), status=201, encoder=DjangoJSONEncoder)
+
+
+@api_view('GET', 'PATCH', 'DELETE')
+def tarefa(request, pk):
+    """ GET: detalhes de uma tarefa. PATCH: altera os campos enviados. DELETE: deleta a tarefa """
+    objeto = _tarefa_do_usuario(request, pk)
+    if request.method == 'DELETE':
+        objeto.delete()
+        return HttpResponse(status=204)
+    if request.method == 'PATCH':
+        dados = _corpo(request)
+        listas_alteradas = {objeto.lista_id}
+        for campo in ('titulo', 'descricao', 'prioridade'):
+            if campo in dados:
+                setattr(objeto, campo, dados[campo])
+        if 'dataVencimento' in dados:
+            objeto.dataVencimento = _data(dados['dataVencimento'], 'dataVencimento')
+            if objeto.dataVencimento is None:
+                raise ErroApi('Informe a dataVencimento')
+        if 'status' in dados:
+            _aplicar_status(objeto, dados['status'])
+        if 'lista' in dados:
+            objeto.lista = _lista_do_usuario(request, dados['lista'])
+            listas_alteradas.add(objeto.lista_id)
+        objeto.save()
+        _tocar_lista(request.user.pk, *listas_alteradas)
+    return JsonResponse(_serializar(objeto, _campos(request, CAMPOS_TAREFA)), encoder=DjangoJSONEncoder)
+
+
+@api_view('POST')
+def tarefas_lote(request):
+    """ POST: aplica uma operação (concluir, status, prioridade, mover, deletar) em varias tarefas """
+    dados = _corpo(request)
+    if not isinstance(dados.get('ids'), list):
+        raise ErroApi('Informe os ids das tarefas numa lista')
+    alteradas = lote.aplicar(request.user.pk, dados['ids'], dados.get('operacao'), dados.get('valor'))
+    return JsonResponse({'alteradas': alteradas})
+
+
+@api_view('POST')
+def posicao_tarefa(request, pk):
+    """ POST: coloca a tarefa logo depois da tarefa depois_de (null: no topo da lista) """
+    dados = _corpo(request)
+    if 'depois_de' not in dados:
+        raise ErroApi('Informe depois_de (o id da tarefa de cima ou null)')
+    chave = posicoes.mover(request.user.pk, pk, dados['depois_de'])
+    return JsonResponse({'id': pk, 'posicao': chave})
+
+
+@api_view('GET')
+def buscar(request):
+    """ GET: busca textual nas tarefas e listas do usuario, do resultado mais relevante para o menos """
+    tipo = request.GET.get('tipo') or None
+    if tipo not in (None, 'tarefa', 'lista'):
+        raise ErroApi('tipo deve ser tarefa ou lista')
+    try:
+        limite = min(int(request.GET.get('limite') or busca.LIMITE), 100)
+    except ValueError:
+        raise ErroApi('limite inválido')
+    resultados = busca.buscar(request.user.pk, request.GET.get('q', ''), tipo, limite)
+    return JsonResponse({'resultados': resultados})
+
+
+@api_view('GET')
+def calendario(request):
+    """ Total e abertas por dia de vencimento entre ?de= e ?ate=, num unico GROUP BY """
+    de = _data(request.GET.get('de'), 'de')
+    ate = _data(request.GET.get('ate'), 'ate')
+    if de is None or ate is None:
+        raise ErroApi('Informe de e ate')
+    if ate < de or (ate - de).days >= DIAS_CALENDARIO:
+        raise ErroApi(f'Intervalo inválido, use no maximo {DIAS_CALENDARIO} dias')
+    totais = calendario_app.contagens(request.user.pk, de, ate)
+    return JsonResponse({'dias': [{'data': dia, 'total': total, 'abertas': abertas}
+                                  for dia, (total, abertas) in sorted(totais.items())]}, encoder=DjangoJSONEncoder)
+
+
+@api_view('GET')
+def estatisticas(request):
+    """ Concluidas por periodo entre ?de= e ?ate= (padrão: os ultimos 30 dias), com os totais e a situação atual """
+    hoje = datetime.date.today()
+    ate = _data(request.GET.get('ate'), 'ate') or hoje
+    de = _data(request.GET.get('de'), 'de') or ate - datetime.timedelta(days=29)
+    if ate < de or (ate - de).days >= DIAS_ESTATISTICAS:
+        raise ErroApi(f'Intervalo inválido, use no maximo {DIAS_ESTATISTICAS} dias')
+    agrupamento = request.GET.get('agrupamento', 'dia')
+    if agrupamento not in estatisticas_app.AGRUPAMENTOS:
+        raise ErroApi('agrupamento inválido')
+    periodos, totais = estatisticas_app.serie(request.user.pk, de, ate, agrupamento)
+    return JsonResponse({'periodos': periodos, 'totais': totais,
+                         'situacao': estatisticas_app.situacao(request.user.pk, hoje)}, encoder=DjangoJSONEncoder)
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class TodoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'todo'
+
+    def ready(self):
+        # Registra os receivers de post_save/post_delete que invalidam o cache
+        from . import signals  # noqa: F401
+        # Registra as funções da fila de trabalhos em segundo plano
+        from . import trabalhos  # noqa: F401
@@ -0,0 +1,192 @@
+import datetime
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import redirect, render
+from django.contrib import messages
+from django.views.decorators.cache import cache_control
+
+from . import api
+from .cache import aobter, aversao, segredo_csrf
+from .condicional import acondicional_index, acondicional_lista
+from .models import Lista, Tarefa
+from .paginacao import apaginar
+from .sql import delete
+from .views import listas_com_progresso
+
+# Versões assincronas das views de leitura mais acessadas (index, get_list e os GET da API).
+# Sob ASGI elas rodam direto no event loop usando o ORM assincrono, sem ocupar uma thread por
+# requisição. Os caminhos de escrita (POST, PATCH, DELETE) continuam nas views sincronas,
+# chamadas com sync_to_async. As urls usam estas views quando settings.TODO_ASYNC_VIEWS é True,
+# o que o polls/asgi.py liga por padrão.
+
+
+def carregar_usuario(view_func):
+    """
+    Carrega request.user com request.auser() antes da view. Assim os templates, os context
+    processors e as views sincronas chamadas depois não precisam consultar o banco de novo
+    """
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        request.user = await request.auser()
+        return await view_func(request, *args, **kwargs)
+    return wrapper
+
+
+@carregar_usuario
+@cache_control(private=True, no_cache=True)
+@acondicional_index
+async def index(request):
+    """ Versão assincrona de views.index """
+    if request.method != 'GET':
+        return redirect('set_list')
+    if not request.user.is_authenticated:
+        return render(request, 'todo/index.html', {'user_in': False})
+
+    async def carregar():
+        return [lista async for lista in listas_com_progresso(request.user)]
+
+    versao_usuario = await aversao('usuario', request.user.pk)
+    listas = await aobter(f'index:{request.user.pk}:{versao_usuario}:{datetime.date.today()}', carregar)
+    context = {
+        'listas': listas,
+        'user_in': True,
+        'usuario': request.user.username,
+        'versao': versao_usuario,
+        'csrf': segredo_csrf(request)
+    }
+    return render(request, 'todo/index_login.html', context)
+
+
+@carregar_usuario
+@login_required
+@cache_control(private=True, no_cache=True)
+@acondicional_lista
+async def getList(request, pk):
+    """ Versão assincrona de views.getList """
+    if request.method != 'GET' and 'Deletar' in request.POST:
+        await sync_to_async(delete)(request, Lista)
+        return redirect('index')
+
+    async def carregar_lista():
+        try:
+            return await Lista.objects.aget(pk=pk)
+        except Lista.DoesNotExist:
+            return None
+
+    versao_lista = await aversao('lista', pk)
+    lista = await aobter(f'lista:{pk}:{versao_lista}', carregar_lista)
+    if lista is None:
+        raise Http404('Lista não encontrada')
+    if lista.usuario_id != request.user.pk:
+        messages.error(request, 'A lista que você está tentando acessar não pertence a você')
+        return render(request, 'todo/get_list.html', {'usuario': request.user})
+
+    cursor = request.GET.get('cursor', '')
+    tamanho = request.GET.get('tamanho', '')
+
+    async def carregar_pagina():
+        return await apaginar(Tarefa.objects.filter(lista=lista), 'posicao', cursor, tamanho)
+
+    pagina = await aobter(f'pagina:{pk}:{versao_lista}:{cursor}:{tamanho}', carregar_pagina)
+    context = {
+        'lista': lista,
+        'tarefas': pagina.itens,
+        'proximo': pagina.proximo,
+        'cursor': cursor,
+        'tamanho': tamanho,
+        'usuario': request.user,
+        'versao': versao_lista,
+        'csrf': segredo_csrf(request)
+    }
+    if request.GET.get('fragmento'):
+        response = render(request, 'todo/tarefas.html', context)
+        response['X-Proximo-Cursor'] = pagina.proximo or ''
+        return response
+    return render(request, 'todo/get_list.html', context)
+
+
+# API: os GET usam o ORM assincrono, os demais metodos vão para as views sincronas de api.py
+
+def api_leitura(view_sincrona):
+    """
+    Decorador das views async da API: confere o login como api.api_view e trata os erros da
+    mesma forma, mandando os metodos de escrita para view_sincrona
+    """
+    def decorador(view_func):
+        @carregar_usuario
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return await sync_to_async(view_sincrona)(request, *args, **kwargs)
+            if not request.user.is_authenticated:
+                return JsonResponse({'erro': 'Autenticação necessária'}, status=401)
+            try:
+                return await view_func(request, *args, **kwargs)
+            except api.ErroApi as e:
+                return JsonResponse({'erro': e.mensagem}, status=e.status)
+        return wrapper
+    return decorador
+
+
+def _ndjson(queryset, campos):
+    """ Resposta NDJSON em streaming com um iterador assincrono sobre o queryset """
+    tamanho = getattr(settings, 'TODO_API_CHUNK_SIZE', 2000)
+
+    async def linhas():
+        async for linha in queryset.values(*campos).aiterator(chunk_size=tamanho):
+            yield json.dumps(linha, cls=DjangoJSONEncoder) + '\n'
+    return StreamingHttpResponse(linhas(), content_type='application/x-ndjson')
+
+
+async def _colecao(request, queryset, campos, ordem):
+    """ Versão assincrona de api._colecao """
+    if request.GET.get('formato') == 'ndjson':
+        return _ndjson(queryset.order_by(ordem, 'id'), campos)
+    carregar = [campo for campo in campos if campo != 'lista'] + (['lista_id'] if 'lista' in campos else [])
+    pagina = await apaginar(queryset.only(*carregar, ordem), ordem, request.GET.get('cursor'),
+                            request.GET.get('tamanho'))
+    return JsonResponse({
+        'resultados': [api._serializar(objeto, campos) for objeto in pagina.itens],
+        'proximo': pagina.proximo,
+    }, encoder=DjangoJSONEncoder)
+
+
+@api_leitura(api.listas)
+async def listas(request):
+    """ GET api/listas assincrono """
+    campos = api._campos(request, api.CAMPOS_LISTA)
+    return await _colecao(request, Lista.objects.filter(usuario_id=request.user.pk), campos, 'id')
+
+
+@api_leitura(api.lista)
+async def lista(request, pk):
+    """ GET api/listas/<pk> assincrono """
+    try:
+        objeto = await Lista.objects.aget(pk=pk, usuario_id=request.user.pk)
+    except Lista.DoesNotExist:
+        raise api.ErroApi('Lista não encontrada', status=404)
+    return JsonResponse(api._serializar(objeto, api._campos(request, api.CAMPOS_LISTA)), encoder=DjangoJSONEncoder)
+
+
+@api_leitura(api.tarefas)
+async def tarefas(request):
+    """ GET api/tarefas assincrono """
+    campos = api._campos(request, api.CAMPOS_TAREFA)
+    queryset = api._filtrar_tarefas(request, Tarefa.objects.filter(user_id=request.user.pk))
+    return await _colecao(request, queryset, campos, 'dataVencimento')
+
+
+@api_leitura(api.tarefa)
+async def tarefa(request, pk):
+    """ GET api/tarefas/<pk> assincrono """
+    try:
+        objeto = await Tarefa.objects.aget(pk=pk, user_id=request.user.pk)
+    except Tarefa.DoesNotExist:
+        raise api.ErroApi('Tarefa não encontrada', status=404)
+    return JsonResponse(api._serializar(objeto, api._campos(request, api.CAMPOS_TAREFA)), encoder=DjangoJSONEncoder)
@@ -0,0 +1,254 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Lista, Tarefa
+
+# Busca textual nos titulos e descrições das tarefas e listas do usuario, com ranking,
+# busca por prefixo (cada palavra digitada casa com o começo das palavras indexadas) e destaque.
+#
+# SQLite: tabela virtual FTS5 todo_busca, criada pela migração 0005 e mantida por triggers.
+#   O rowid é id * 2 para tarefas e id * 2 + 1 para listas; a coluna dono ('u<usuario_id>') é
+#   indexada, então a busca de um usuario é a interseção do dono com os termos no proprio indice.
+#   Os prefixos de 2 a 8 letras também são indexados, sem isso um termo* percorre a lista de
+#   documentos inteira do termo (todas as tarefas de todos os usuarios que têm a palavra);
+#   palavras maiores são buscadas pelas 8 primeiras letras.
+#   O bm25 do FTS5 não é usado: ele conta em quantos documentos da tabela inteira cada termo
+#   aparece, o que custa dezenas de ms para palavras comuns com um milhão de tarefas. Ordenar
+#   todos os resultados do usuario por qualquer nota também percorre a lista inteira. Em vez
+#   disso entram no ranking os CANDIDATOS resultados mais recentes com todas as palavras no
+#   titulo (um MATCH só na coluna titulo) e os CANDIDATOS mais recentes no geral, duas consultas
+#   que param no LIMIT, e eles são ordenados aqui pela quantidade de ocorrências no titulo (peso
+#   maior) e na descrição, relativa ao tamanho do texto. Assim um resultado antigo com a palavra no
+#   titulo só fica de fora se houver mais de CANDIDATOS resultados mais novos também com ela no titulo.
+# PostgreSQL: SearchVector com indices GIN (também criados pela 0005), ts_rank e ts_headline.
+# Outros bancos: icontains, sem ranking.
+#
+# As palavras da busca são extraidas com \w+, então nenhuma sintaxe do FTS5 ou do tsquery
+# digitada pelo usuario chega ao banco. O destaque é feito com os caracteres de controle
+# INICIO/FIM, trocados por <mark> depois de escapar o texto.
+
+PALAVRAS_MAXIMO = 8
+
+LIMITE = 20
+
+INICIO, FIM = '\x02', '\x03'
+
+# Maior prefixo indexado na tabela FTS5 (opção prefix de SQLITE_TABELA)
+PREFIXO_MAXIMO = 8
+
+# Resultados mais recentes de cada consulta (no titulo e no geral) que entram no ranking feito no SQLite
+CANDIDATOS = 300
+
+# Peso das ocorrências no titulo e na descrição
+PESO_TITULO, PESO_DESCRICAO = 3.0, 1.0
+
+CONFIG_POSTGRES = 'portuguese'
+
+SQLITE_TABELA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS todo_busca USING fts5(
+        dono, titulo, descricao, lista UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4 5 6 7 8'
+    )""",
+]
+
+# Os triggers de UPDATE só disparam quando o texto, a lista ou o dono mudam, então os update()
+# de status e prioridade não mexem no indice
+SQLITE_GATILHOS = [
+    """CREATE TRIGGER IF NOT EXISTS todo_busca_tarefa_ai AFTER INSERT ON todo_tarefa BEGIN
+        INSERT INTO todo_busca (rowid, dono, titulo, descricao, lista)
+        VALUES (new.id * 2, 'u' || new.user_id, new.titulo, coalesce(new.descricao, ''), new.lista_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS todo_busca_tarefa_au
+    AFTER UPDATE OF titulo, descricao, lista_id, user_id ON todo_tarefa BEGIN
+        UPDATE todo_busca SET dono = 'u' || new.user_id, titulo = new.titulo,
+            descricao = coalesce(new.descricao, ''), lista = new.lista_id
+        WHERE rowid = old.id * 2;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS todo_busca_tarefa_ad AFTER DELETE ON todo_tarefa BEGIN
+        DELETE FROM todo_busca WHERE rowid = old.id * 2;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS todo_busca_lista_ai AFTER INSERT ON todo_lista BEGIN
+        INSERT INTO todo_busca (rowid, dono, titulo, descricao, lista)
+        VALUES (new.id * 2 + 1, 'u' || new.usuario_id, new.titulo, new.descricao, new.id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS todo_busca_lista_au
+    AFTER UPDATE OF titulo, descricao, usuario_id ON todo_lista BEGIN
+        UPDATE todo_busca SET dono = 'u' || new.usuario_id, titulo = new.titulo, descricao = new.descricao
+        WHERE rowid = old.id * 2 + 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS todo_busca_lista_ad AFTER DELETE ON todo_lista BEGIN
+        DELETE FROM todo_busca WHERE rowid = old.id * 2 + 1;
+    END""",
+]
+
+# Dados que já existiam antes do indice
+SQLITE_PREENCHER = [
+    """INSERT INTO todo_busca (rowid, dono, titulo, descricao, lista)
+        SELECT id * 2, 'u' || user_id, titulo, coalesce(descricao, ''), lista_id FROM todo_tarefa""",
+    """INSERT INTO todo_busca (rowid, dono, titulo, descricao, lista)
+        SELECT id * 2 + 1, 'u' || usuario_id, titulo, descricao, id FROM todo_lista""",
+]
+
+SQLITE_REMOVER = [
+    'DROP TRIGGER IF EXISTS todo_busca_tarefa_ai',
+    'DROP TRIGGER IF EXISTS todo_busca_tarefa_au',
+    'DROP TRIGGER IF EXISTS todo_busca_tarefa_ad',
+    'DROP TRIGGER IF EXISTS todo_busca_lista_ai',
+    'DROP TRIGGER IF EXISTS todo_busca_lista_au',
+    'DROP TRIGGER IF EXISTS todo_busca_lista_ad',
+    'DROP TABLE IF EXISTS todo_busca',
+]
+
+
+def garantir_gatilhos(conexao):
+    """
+    Recria os triggers do SQLite que estiverem faltando. Migrações que reconstroem todo_tarefa ou
+    todo_lista no SQLite (AddField/AlterField) apagam os triggers junto com a tabela antiga, então
+    isso roda depois de todo migrate (signal post_migrate).
+    """
+    if conexao.vendor != 'sqlite':
+        return
+    with conexao.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'todo_busca'")
+        if cursor.fetchone() is None:
+            return
+        for sql in SQLITE_GATILHOS:
+            cursor.execute(sql)
+
+
+def _vetor():
+    from django.contrib.postgres.search import SearchVector
+    return SearchVector('titulo', 'descricao', config=CONFIG_POSTGRES)
+
+
+def indices_postgres():
+    """ Indices GIN do PostgreSQL, com a mesma expressão usada em _buscar_postgres """
+    from django.contrib.postgres.indexes import GinIndex
+    return [
+        ('Tarefa', GinIndex(_vetor(), name='tarefa_busca_gin')),
+        ('Lista', GinIndex(_vetor(), name='lista_busca_gin')),
+    ]
+
+
+def palavras(termos):
+    """ Palavras da busca, sem nenhum operador """
+    return [palavra.lower() for palavra in re.findall(r'\w+', termos or '')][:PALAVRAS_MAXIMO]
+
+
+def _html(texto):
+    """ Escapa o texto e troca os marcadores do banco por <mark> """
+    return mark_safe(escape(texto or '').replace(INICIO, '<mark>').replace(FIM, '</mark>'))
+
+
+def _resultado(tipo, pk, lista, titulo, destaque, trecho, relevancia):
+    return {
+        'tipo': tipo,
+        'id': pk,
+        'lista': lista,
+        'titulo': titulo,
+        'destaque': _html(destaque),
+        'trecho': _html(trecho),
+        'relevancia': relevancia,
+    }
+
+
+def _relevancia(destaque, trecho):
+    """ Ocorrências destacadas no titulo e na descrição, relativas ao tamanho de cada um """
+    relevancia = 0.0
+    for texto, peso in ((destaque, PESO_TITULO), (trecho, PESO_DESCRICAO)):
+        ocorrencias = texto.count(INICIO)
+        if ocorrencias:
+            relevancia += peso * ocorrencias / len(texto.split()) ** 0.5
+    return round(relevancia, 4)
+
+
+def _buscar_sqlite(usuario_id, termos, tipo, limite):
+    # Uma letra só não tem indice de prefixo e casaria com boa parte do vocabulario, então vai exata.
+    # Palavras maiores que o maior prefixo indexado são cortadas nele, para continuar usando o indice
+    palavras_ = ' AND '.join(
+        f'"{palavra[:PREFIXO_MAXIMO]}"*' if len(palavra) > 1 else f'"{palavra}"' for palavra in termos)
+    dono = f'dono:u{int(usuario_id)}'
+    expressao, no_titulo = f'{dono} AND {palavras_}', f'{dono} AND titulo:({palavras_})'
+    sql = ('SELECT rowid, lista, titulo, highlight(todo_busca, 1, %s, %s), highlight(todo_busca, 2, %s, %s) '
+           'FROM todo_busca WHERE todo_busca MATCH %s')
+    filtro = []
+    if tipo is not None:
+        sql += ' AND (rowid & 1) = %s'
+        filtro.append(1 if tipo == 'lista' else 0)
+    sql += ' ORDER BY rowid DESC LIMIT %s'
+    # Duas consultas, cada uma para no LIMIT sem percorrer os outros resultados
+    linhas = {}
+    with connection.cursor() as cursor:
+        for consulta in (no_titulo, expressao):
+            cursor.execute(sql, [INICIO, FIM, INICIO, FIM, consulta, *filtro, CANDIDATOS])
+            for linha in cursor.fetchall():
+                linhas.setdefault(linha[0], linha)
+    linhas = sorted(linhas.values(), key=lambda linha: linha[0], reverse=True)
+    # sort é estavel: no empate ficam os mais recentes primeiro
+    linhas.sort(key=lambda linha: _relevancia(linha[3], linha[4]), reverse=True)
+    return [
+        _resultado('lista' if rowid & 1 else 'tarefa', rowid // 2, lista, titulo, destaque, trecho,
+                   _relevancia(destaque, trecho))
+        for rowid, lista, titulo, destaque, trecho in linhas[:limite]
+    ]
+
+
+def _buscar_postgres(usuario_id, termos, tipo, limite):
+    from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+    consulta = SearchQuery(' & '.join(f'{palavra}:*' for palavra in termos), search_type='raw',
+                           config=CONFIG_POSTGRES)
+    resultados = []
+    for nome, modelo, dono, lista in (('tarefa', Tarefa, 'user_id', 'lista_id'), ('lista', Lista, 'usuario_id', 'id')):
+        if tipo not in (None, nome):
+            continue
+        queryset = modelo.objects.filter(**{dono: usuario_id}).annotate(vetor=_vetor()).filter(vetor=consulta)
+        queryset = queryset.annotate(
+            relevancia=SearchRank('vetor', consulta),
+            destaque=SearchHeadline('titulo', consulta, config=CONFIG_POSTGRES, start_sel=INICIO,
+                                    stop_sel=FIM, highlight_all=True),
+            trecho=SearchHeadline('descricao', consulta, config=CONFIG_POSTGRES, start_sel=INICIO,
+                                  stop_sel=FIM, max_words=16, min_words=8),
+        ).order_by('-relevancia').values_list('id', lista, 'titulo', 'destaque', 'trecho', 'relevancia')[:limite]
+        resultados.extend(_resultado(nome, *linha) for linha in queryset)
+    resultados.sort(key=lambda resultado: resultado['relevancia'], reverse=True)
+    return resultados[:limite]
+
+
+def _marcar(texto, termos):
+    """ Destaque feito no Python para os bancos sem busca textual """
+    padrao = re.compile('|'.join(re.escape(palavra) for palavra in termos), re.IGNORECASE)
+    return padrao.sub(lambda m: INICIO + m.group(0) + FIM, texto or '')
+
+
+def _buscar_simples(usuario_id, termos, tipo, limite):
+    resultados = []
+    for nome, modelo, dono, lista in (('tarefa', Tarefa, 'user_id', 'lista_id'), ('lista', Lista, 'usuario_id', 'id')):
+        if tipo not in (None, nome):
+            continue
+        queryset = modelo.objects.filter(**{dono: usuario_id})
+        for palavra in termos:
+            queryset = queryset.filter(Q(titulo__icontains=palavra) | Q(descricao__icontains=palavra))
+        for pk, lista_id, titulo, descricao in queryset.values_list('id', lista, 'titulo', 'descricao')[:limite]:
+            resultados.append(_resultado(nome, pk, lista_id, titulo, _marcar(titulo, termos),
+                                         _marcar(descricao, termos), 0.0))
+    return resultados[:limite]
+
+
+def buscar(usuario_id, termos, tipo=None, limite=LIMITE):
+    """
+    Busca nas tarefas e listas do usuario. tipo limita a 'tarefa' ou 'lista'.
+    Retorna dicionarios com tipo, id, lista, titulo, destaque e trecho (HTML seguro, com <mark>)
+    e relevancia, do mais relevante para o menos.
+    """
+    termos = palavras(termos)
+    if not termos:
+        return []
+    if connection.vendor == 'sqlite':
+        return _buscar_sqlite(usuario_id, termos, tipo, limite)
+    if connection.vendor == 'postgresql':
+        return _buscar_postgres(usuario_id, termos, tipo, limite)
+    return _buscar_simples(usuario_id, termos, tipo, limite)
@@ -0,0 +1,96 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+# Cache das paginas mais acessadas (index e get_list).
+# Nenhuma chave é apagada quando os dados mudam: cada usuario e cada lista têm um numero de versão
+# que faz parte das chaves, e os signals de Tarefa e Lista trocam esse numero. As entradas antigas
+# simplesmente deixam de ser lidas e expiram sozinhas.
+
+
+def _cache():
+    return caches[getattr(settings, 'TODO_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'TODO_CACHE_TIMEOUT', 300)
+
+
+def _chave_versao(tipo, pk):
+    return f'todo:versao:{tipo}:{pk}'
+
+
+def versao(tipo, pk):
+    """
+    Retorna a versão atual de um usuario (tipo 'usuario') ou de uma lista (tipo 'lista').
+    Se a versão não estiver no cache (primeiro acesso ou expulsa pelo backend) uma nova é criada,
+    assim nunca se volta a usar uma versão antiga.
+    """
+    cache = _cache()
+    chave = _chave_versao(tipo, pk)
+    valor = cache.get(chave)
+    if valor is None:
+        cache.add(chave, time.time_ns(), None)
+        valor = cache.get(chave)
+    return valor
+
+
+async def aversao(tipo, pk):
+    """ Versão assincrona de versao(), para as views async """
+    cache = _cache()
+    chave = _chave_versao(tipo, pk)
+    valor = await cache.aget(chave)
+    if valor is None:
+        await cache.aadd(chave, time.time_ns(), None)
+        valor = await cache.aget(chave)
+    return valor
+
+
+def _trocar_versoes(chaves):
+    novo = time.time_ns()
+    _cache().set_many({chave: novo for chave in chaves}, None)
+
+
+def invalidar(usuario_id=None, lista_ids=(), usuario_ids=()):
+    """
+    Troca a versão do usuario (ou dos usuarios, nas operações em lote) e das listas informadas,
+    invalidando tudo que foi guardado com elas.
+    A troca é feita na hora e de novo no commit da transação, para que uma leitura concorrente
+    não guarde no cache dados que ainda não foram commitados.
+    """
+    chaves = [_chave_versao('lista', pk) for pk in lista_ids if pk is not None]
+    if usuario_id is not None:
+        chaves.append(_chave_versao('usuario', usuario_id))
+    chaves.extend(_chave_versao('usuario', pk) for pk in usuario_ids)
+    if not chaves:
+        return
+    _trocar_versoes(chaves)
+    transaction.on_commit(lambda: _trocar_versoes(chaves))
+
+
+def obter(chave, funcao, timeout=None):
+    """ Retorna o valor guardado em todo:<chave> ou calcula com funcao() e guarda no cache """
+    return _cache().get_or_set(f'todo:{chave}', funcao, _timeout() if timeout is None else timeout)
+
+
+async def aobter(chave, funcao, timeout=None):
+    """ Versão assincrona de obter(): funcao é uma corotina, chamada só quando a chave não está no cache """
+    cache = _cache()
+    valor = await cache.aget(f'todo:{chave}')
+    if valor is None:
+        valor = await funcao()
+        await cache.aadd(f'todo:{chave}', valor, _timeout() if timeout is None else timeout)
+    return valor
+
+
+def segredo_csrf(request):
+    """
+    Retorna o segredo CSRF da requisição, usado nas chaves dos fragmentos de template que
+    contêm {% csrf_token %}, assim um fragmento nunca é servido com o token de outra sessão
+    """
+    if not request.META.get('CSRF_COOKIE'):
+        from django.middleware.csrf import get_token
+        get_token(request)
+    return request.META.get('CSRF_COOKIE', '')
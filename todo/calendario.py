@@ -0,0 +1,161 @@
+import datetime
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Q
+from django.db.models.expressions import RawSQL
+
+from . import recorrencias
+from .models import Tarefa
+from .paginacao import decodificar_cursor, paginar
+
+# Calendario das tarefas do usuario por dataVencimento, com todas as listas juntas.
+#
+#   mes     grade de semanas inteiras (segunda a domingo) que cobre o mês
+#   semana  segunda a domingo da semana da data
+#   agenda  proximas tarefas a partir da data, paginadas por cursor em (dataVencimento, id)
+#
+# Mês e semana buscam só a janela visivel, com duas consultas pelo indice tarefa_user_venc_idx
+# (user, dataVencimento, concluido), independente do numero de dias: um GROUP BY dataVencimento
+# com o total e as abertas de cada dia (o mapa de calor, só no indice) e as primeiras `por_dia`
+# tarefas de cada dia com tarefas, um SELECT ... LIMIT n por dia sobre o indice. Um usuario com
+# milhares de tarefas por dia carrega só as que aparecem na tela; o resto vira "+N". As tarefas
+# são distribuidas nos dias numa unica passada.
+#
+# As ocorrencias futuras das tarefas recorrentes (recorrencias.previstas) entram nos dias como
+# previstas, sem serem inseridas.
+
+VISOES = ('mes', 'semana', 'agenda')
+
+CAMPOS = ('id', 'titulo', 'status', 'concluido', 'prioridade', 'dataVencimento', 'lista_id', 'recorrencia_id')
+
+# Niveis do mapa de calor (0 = dia sem tarefas).
+NIVEIS = 4
+
+Dia = namedtuple('Dia', ['data', 'total', 'abertas', 'nivel', 'tarefas', 'mais', 'do_mes', 'hoje'])
+
+# A janela e a navegação de um mês vão até 62 dias antes ou depois da data
+MARGEM = datetime.timedelta(days=62)
+
+
+def por_dia():
+    return getattr(settings, 'TODO_CALENDARIO_POR_DIA', {'mes': 3, 'semana': 20})
+
+
+def limitar(data):
+    """ A data mais proxima de data cuja janela e navegação não passam de date.min e date.max """
+    return min(max(data, datetime.date.min + MARGEM), datetime.date.max - MARGEM)
+
+
+def janela(visao, data):
+    """ Primeiro e ultimo dia visiveis da visão 'mes' ou 'semana' que contém a data """
+    if visao == 'semana':
+        inicio = data - datetime.timedelta(days=data.weekday())
+        return inicio, inicio + datetime.timedelta(days=6)
+    primeiro = data.replace(day=1)
+    ultimo = (primeiro + datetime.timedelta(days=32)).replace(day=1) - datetime.timedelta(days=1)
+    return (primeiro - datetime.timedelta(days=primeiro.weekday()),
+            ultimo + datetime.timedelta(days=6 - ultimo.weekday()))
+
+
+def navegacao(visao, data):
+    """ Datas da visão anterior e da proxima """
+    if visao == 'semana':
+        return data - datetime.timedelta(days=7), data + datetime.timedelta(days=7)
+    primeiro = data.replace(day=1)
+    return (primeiro - datetime.timedelta(days=1)).replace(day=1), (primeiro + datetime.timedelta(days=32)).replace(day=1)
+
+
+def contagens(usuario_id, inicio, fim):
+    """ {dia: (total, abertas)} dos dias com tarefas entre inicio e fim, num unico GROUP BY """
+    linhas = (Tarefa.objects.filter(user_id=usuario_id, dataVencimento__range=(inicio, fim))
+              .order_by().values('dataVencimento')
+              .annotate(total=Count('id'), abertas=Count('id', filter=Q(concluido=False))))
+    return {linha['dataVencimento']: (linha['total'], linha['abertas']) for linha in linhas}
+
+
+def primeiras(usuario_id, dias, quantidade):
+    """
+    As primeiras `quantidade` tarefas de cada um dos dias informados (abertas primeiro, depois
+    por id), numa consulta: um SELECT ... LIMIT n por dia, cada um resolvido no indice, unidos
+    com UNION ALL. O SQL é montado à mão porque compilar um queryset fatiado por dia custava
+    mais que a consulta inteira.
+    """
+    dias = list(dias)
+    if not dias:
+        return Tarefa.objects.none().values(*CAMPOS, 'lista__titulo')
+    q = connection.ops.quote_name
+    tabela, usuario, vencimento = q(Tarefa._meta.db_table), q('user_id'), q('dataVencimento')
+    sql = ' UNION ALL '.join(
+        f'SELECT id FROM (SELECT id FROM {tabela} WHERE {usuario} = %s AND {vencimento} = %s '
+        f'ORDER BY concluido, id LIMIT {int(quantidade)}) AS dia_{indice}'
+        for indice in range(len(dias)))
+    parametros = [valor for dia in dias for valor in (usuario_id, dia)]
+    return (Tarefa.objects.filter(pk__in=RawSQL(sql, parametros))
+            .order_by('dataVencimento', 'concluido', 'id').values(*CAMPOS, 'lista__titulo'))
+
+
+def _previstas(usuario_id, inicio, fim):
+    """ {dia: [ocorrencias previstas]} das recorrencias do usuario, como dicts marcados com prevista """
+    previstas = {}
+    for recorrencia, dia in recorrencias.previstas(usuario_id, inicio, fim):
+        previstas.setdefault(dia, []).append({'titulo': recorrencias.titulo(recorrencia, dia), 'prevista': True,
+                                              'lista_id': recorrencia.lista_id, 'dataVencimento': dia})
+    return previstas
+
+
+def _nivel(total, maximo):
+    if not total:
+        return 0
+    return min(NIVEIS, 1 + (total * NIVEIS - 1) // maximo)
+
+
+def dias(usuario_id, visao, data, hoje=None):
+    """ Os dias visiveis da visão 'mes' ou 'semana', com as contagens e as primeiras tarefas de cada um """
+    hoje = hoje or datetime.date.today()
+    inicio, fim = janela(visao, data)
+    totais = contagens(usuario_id, inicio, fim)
+    tarefas = {}
+    quantidade = por_dia()[visao]
+    if totais:
+        # Uma passada: as linhas vêm ordenadas por dia
+        for tarefa in primeiras(usuario_id, totais, quantidade):
+            tarefas.setdefault(tarefa['dataVencimento'], []).append(tarefa)
+    previstas = _previstas(usuario_id, max(inicio, hoje), fim)
+    linhas = []
+    dia = inicio
+    while dia <= fim:
+        total, abertas = totais.get(dia, (0, 0))
+        reais, extras = tarefas.get(dia, []), previstas.get(dia, [])
+        linhas.append((dia, total + len(extras), abertas + len(extras), reais + extras[:max(0, quantidade - len(reais))]))
+        dia += datetime.timedelta(days=1)
+    maximo = max(total for _, total, _, _ in linhas)
+    return [Dia(dia, total, abertas, _nivel(total, maximo), visiveis, total - len(visiveis),
+                visao == 'semana' or dia.month == data.month, dia == hoje)
+            for dia, total, abertas, visiveis in linhas]
+
+
+def agenda(usuario_id, data, cursor=None, tamanho=None, hoje=None):
+    """
+    Pagina da agenda a partir da data, agrupada por dia: ([(dia, [tarefas])], proximo cursor).
+    As previstas das recorrencias entram nos dias cobertos pela pagina: do dia seguinte ao
+    ultimo da pagina anterior até o ultimo desta (na ultima pagina, TODO_CALENDARIO_AGENDA_DIAS além).
+    """
+    hoje = hoje or datetime.date.today()
+    pagina = paginar(Tarefa.objects.filter(user_id=usuario_id, dataVencimento__gte=data)
+                     .select_related('lista').only(*(campo.removesuffix('_id') for campo in CAMPOS), 'lista__titulo'), 'dataVencimento', cursor, tamanho)
+    grupos = {}
+    for tarefa in pagina.itens:
+        grupos.setdefault(tarefa.dataVencimento, []).append(tarefa)
+    anterior = decodificar_cursor(cursor, Tarefa, 'dataVencimento') if cursor else None
+    inicio = anterior[0] + datetime.timedelta(days=1) if anterior and anterior[0] else data
+    if pagina.proximo:
+        fim = pagina.itens[-1].dataVencimento
+    else:
+        ultimo = max([inicio, *grupos])
+        fim = ultimo + datetime.timedelta(days=min(getattr(settings, 'TODO_CALENDARIO_AGENDA_DIAS', 30),
+                                                   (datetime.date.max - ultimo).days))
+    for dia, extras in _previstas(usuario_id, max(inicio, hoje), fim).items():
+        grupos.setdefault(dia, []).extend(extras)
+    return sorted(grupos.items()), pagina.proximo
@@ -0,0 +1,135 @@
+import datetime
+import hashlib
+from functools import wraps
+
+from django.contrib import messages
+from django.db.models import Count, Max
+from django.views.decorators.http import condition
+
+from .cache import segredo_csrf
+from .models import Lista
+
+# Validadores para GET condicional (ETag/Last-Modified) do index e do get_list.
+# Eles vêm de Lista.data_atualizacao, que é atualizada em toda criação, edição e remoção de
+# tarefas, e são calculados com uma consulta pequena e indexada. Quando o navegador já tem a
+# versão atual a view nem é chamada e a resposta é um 304 sem corpo.
+
+
+def _sem_mensagens(request):
+    # Uma mensagem pendente muda a pagina sem mudar os dados
+    return len(messages.get_messages(request)) == 0
+
+
+def _condicional(request):
+    """ Só GET/HEAD sem mensagens pendentes podem ser respondidos com 304 """
+    if request.method not in ('GET', 'HEAD') or not request.user.is_authenticated:
+        return False
+    return _sem_mensagens(request)
+
+
+def _etag(request, usuario_id, *partes):
+    """
+    Monta a ETag com o usuario, a url completa (cursor e tamanho da pagina) e o segredo CSRF,
+    já que a pagina contem formularios com o token
+    """
+    dados = [usuario_id, request.get_full_path(), segredo_csrf(request), *partes]
+    return hashlib.md5(repr(dados).encode(), usedforsecurity=False).hexdigest()
+
+
+async def _acondicional(request):
+    """ Versão assincrona de _condicional, que carrega o usuario sem bloquear """
+    if request.method not in ('GET', 'HEAD') or not (await request.auser()).is_authenticated:
+        return False
+    return _sem_mensagens(request)
+
+
+def _consulta_index(usuario_id):
+    # Coberta pelo indice (usuario, data_atualizacao); o total muda quando uma lista é deletada
+    return Lista.objects.filter(usuario_id=usuario_id)
+
+
+def _montar_index(request, usuario_id, dados):
+    # As tarefas atrasadas dependem do dia
+    etag = _etag(request, usuario_id, dados['ultima'], dados['total'], datetime.date.today())
+    return (etag, dados['ultima'])
+
+
+def _montar_lista(request, usuario_id, dados):
+    # Listas de outro usuario ou inexistentes seguem o caminho normal da view
+    if dados is None or dados[0] != usuario_id:
+        return None
+    return (_etag(request, usuario_id, dados[1], datetime.date.today()), dados[1])
+
+
+def _validadores_index(request):
+    if not hasattr(request, '_todo_validadores'):
+        request._todo_validadores = None
+        if _condicional(request):
+            dados = _consulta_index(request.user.pk).aggregate(ultima=Max('data_atualizacao'), total=Count('id'))
+            request._todo_validadores = _montar_index(request, request.user.pk, dados)
+    return request._todo_validadores
+
+
+def _validadores_lista(request, pk):
+    if not hasattr(request, '_todo_validadores'):
+        request._todo_validadores = None
+        if _condicional(request):
+            dados = Lista.objects.filter(pk=pk).values_list('usuario_id', 'data_atualizacao').first()
+            request._todo_validadores = _montar_lista(request, request.user.pk, dados)
+    return request._todo_validadores
+
+
+async def _avalidadores_index(request):
+    if not hasattr(request, '_todo_validadores'):
+        request._todo_validadores = None
+        if await _acondicional(request):
+            usuario_id = (await request.auser()).pk
+            dados = await _consulta_index(usuario_id).aaggregate(ultima=Max('data_atualizacao'), total=Count('id'))
+            request._todo_validadores = _montar_index(request, usuario_id, dados)
+    return request._todo_validadores
+
+
+async def _avalidadores_lista(request, pk):
+    if not hasattr(request, '_todo_validadores'):
+        request._todo_validadores = None
+        if await _acondicional(request):
+            dados = await Lista.objects.filter(pk=pk).values_list('usuario_id', 'data_atualizacao').afirst()
+            request._todo_validadores = _montar_lista(request, (await request.auser()).pk, dados)
+    return request._todo_validadores
+
+
+def _campo(funcao, indice):
+    def validador(request, *args, **kwargs):
+        validadores = funcao(request, *args, **kwargs)
+        return validadores[indice] if validadores else None
+    return validador
+
+
+# Decoradores prontos para as views
+
+condicional_index = condition(etag_func=_campo(_validadores_index, 0),
+                              last_modified_func=_campo(_validadores_index, 1))
+
+condicional_lista = condition(etag_func=_campo(_validadores_lista, 0),
+                              last_modified_func=_campo(_validadores_lista, 1))
+
+
+def _assincrono(avalidadores, condicional):
+    """
+    Para views async: calcula os validadores com o ORM assincrono antes de chamar o decorador
+    condition(), que então só lê o valor já guardado em request._todo_validadores
+    """
+    def decorador(view_func):
+        view_condicional = condicional(view_func)
+
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            await avalidadores(request, *args, **kwargs)
+            return await view_condicional(request, *args, **kwargs)
+        return wrapper
+    return decorador
+
+
+acondicional_index = _assincrono(_avalidadores_index, condicional_index)
+
+acondicional_lista = _assincrono(_avalidadores_lista, condicional_lista)
@@ -0,0 +1,98 @@
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F
+
+from .models import Lista, Tarefa
+
+# Contadores de tarefas guardados na propria Lista (total_tarefas, pendentes, em_andamento e
+# concluidas), para o index mostrar o progresso das listas sem contar as tarefas.
+#
+# Os contadores são atualizados com F() na mesma transação da alteração da tarefa:
+#   - save() de uma tarefa: signal post_save (criação, troca de status, troca de lista)
+#   - delete() de uma tarefa: signal post_delete
+#   Nesses dois casos o mesmo UPDATE atualiza Lista.data_atualizacao.
+#   - bulk_create, update() e deleções por queryset (importação, ações em lote, gerar_dados)
+#     não disparam esses signals, quem faz a operação chama ajustar() com os totais
+# As tarefas atrasadas não são contadas aqui: elas mudam com a passagem do dia, sem nenhuma
+# escrita no banco, então são contadas na consulta do index.
+# O comando recalcular_contadores confere e reconstroi os contadores a partir das tarefas.
+
+# Contador de cada status
+POR_STATUS = {'pendente': 'pendentes', 'em andamento': 'em_andamento', 'concluido': 'concluidas'}
+
+CAMPOS = ('total_tarefas',) + tuple(POR_STATUS.values())
+
+# Quantidade maxima de listas por UPDATE em ajustar().
+TAMANHO_CONSULTA = 500
+
+
+def diferencas(criadas=(), removidas=()):
+    """
+    Junta as diferenças por lista a partir de trincas (lista_id, status, quantidade) de tarefas
+    que entraram e que saíram de cada lista. Retorna {lista_id: {campo: diferença}}.
+    """
+    resultado = defaultdict(Counter)
+    for sinal, trincas in ((1, criadas), (-1, removidas)):
+        for lista_id, status, quantidade in trincas:
+            resultado[lista_id]['total_tarefas'] += sinal * quantidade
+            if status in POR_STATUS:
+                resultado[lista_id][POR_STATUS[status]] += sinal * quantidade
+    return resultado
+
+
+def incrementos(campos):
+    """ Expressões F() para o update() a partir das diferenças de uma lista """
+    return {campo: F(campo) + valor for campo, valor in campos.items() if valor}
+
+
+def ajustar(por_lista, **outros):
+    """
+    Aplica as diferenças de diferencas(). As listas com as mesmas diferenças são atualizadas
+    juntas, num UPDATE com F() por grupo (em lotes de TAMANHO_CONSULTA ids). `outros` são campos
+    gravados no mesmo UPDATE (ex.: data_atualizacao), em vez de mais uma consulta.
+    """
+    grupos = defaultdict(list)
+    for lista_id, campos in por_lista.items():
+        campos = tuple(sorted((campo, valor) for campo, valor in campos.items() if valor))
+        if campos:
+            grupos[campos].append(lista_id)
+    for campos, ids in grupos.items():
+        for inicio in range(0, len(ids), TAMANHO_CONSULTA):
+            Lista.objects.filter(pk__in=ids[inicio:inicio + TAMANHO_CONSULTA]).update(
+                **incrementos(dict(campos)), **outros)
+
+
+def status_por_lista(tarefas):
+    """ Trincas (lista_id, status, quantidade) das tarefas do queryset, numa consulta """
+    return [(linha['lista_id'], linha['status'], linha['n'])
+            for linha in tarefas.order_by().values('lista_id', 'status').annotate(n=Count('id'))]
+
+
+def contar(listas):
+    """ Contadores corretos das listas do queryset, calculados a partir das tarefas """
+    corretos = {pk: dict.fromkeys(CAMPOS, 0) for pk in listas.values_list('pk', flat=True)}
+    linhas = (Tarefa.objects.filter(lista__in=listas).order_by()
+              .values('lista_id', 'status').annotate(n=Count('id')))
+    for linha in linhas:
+        campos = corretos[linha['lista_id']]
+        campos['total_tarefas'] += linha['n']
+        if linha['status'] in POR_STATUS:
+            campos[POR_STATUS[linha['status']]] += linha['n']
+    return corretos
+
+
+def recalcular(listas, corrigir=True, batch_size=500):
+    """
+    Compara os contadores guardados com os calculados a partir das tarefas.
+    Retorna {lista_id: (guardados, corretos)} das listas divergentes e, se corrigir, grava os corretos.
+    """
+    corretos = contar(listas)
+    divergentes = {}
+    for linha in listas.values('pk', *CAMPOS).iterator():
+        pk = linha.pop('pk')
+        if linha != corretos[pk]:
+            divergentes[pk] = (linha, corretos[pk])
+    if corrigir and divergentes:
+        Lista.objects.bulk_update(
+            [Lista(pk=pk, **valores) for pk, (_, valores) in divergentes.items()], CAMPOS, batch_size=batch_size)
+    return divergentes
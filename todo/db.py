@@ -0,0 +1,47 @@
+# Ajustes das conexões com o SQLite, aplicados no connection_created (ver signals.configurar_conexao).
+# Cada PRAGMA vale só para a conexão que o executou, menos o journal_mode=wal, que fica gravado
+# no arquivo do banco. Os valores de produção ficam em polls/settings_producao.py.
+#
+#   journal_mode=wal     leitores não bloqueiam o escritor nem o escritor os leitores
+#   synchronous=normal   com WAL não corrompe o banco; uma queda de energia pode perder só os
+#                        ultimos commits, em troca de não fazer fsync a cada commit
+#   cache_size           paginas em memoria por conexão (negativo: em KiB)
+#   mmap_size            le o arquivo por memoria mapeada, sem copiar para o cache do SQLite
+#   busy_timeout         quanto uma escrita espera pelo lock antes do "database is locked" (ms)
+#   temp_store=memory    tabelas temporarias de ORDER BY e GROUP BY em memoria
+
+# Ordem de aplicação: journal_mode primeiro, o synchronous depende dele.
+ORDEM = ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size', 'mmap_size', 'temp_store')
+
+
+def configurar_sqlite(connection, pragmas):
+    """ Executa os PRAGMA informados ({nome: valor}) numa conexão SQLite recém aberta """
+    nomes = sorted(pragmas, key=lambda nome: ORDEM.index(nome) if nome in ORDEM else len(ORDEM))
+    with connection.cursor() as cursor:
+        for nome in nomes:
+            cursor.execute(f'PRAGMA {nome} = {pragmas[nome]}')
+
+
+def pragmas_atuais(connection, nomes=ORDEM):
+    """ Valores atuais dos PRAGMA na conexão, usado para conferir a configuração """
+    with connection.cursor() as cursor:
+        valores = {}
+        for nome in nomes:
+            cursor.execute(f'PRAGMA {nome}')
+            valores[nome] = cursor.fetchone()[0]
+    return valores
+
+
+def copiar_sqlite(origem, destino):
+    """
+    Copia o banco SQLite da conexão `origem` para o arquivo `destino` com a API de backup do
+    SQLite, que le uma versão consistente mesmo com escritas acontecendo no primario.
+    """
+    import sqlite3
+
+    origem.ensure_connection()
+    copia = sqlite3.connect(destino)
+    try:
+        origem.connection.backup(copia)
+    finally:
+        copia.close()
@@ -0,0 +1,212 @@
+import datetime
+from collections import Counter, defaultdict
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from . import contadores
+from .models import EstatisticaDiaria, Lista, Tarefa
+
+# Estatisticas de produtividade do usuario (concluidas por dia/semana/mês, tempo medio até
+# concluir, conclusões atrasadas e prioridades) lidas de EstatisticaDiaria, uma linha por
+# usuario e dia de conclusão. As paginas não varrem Tarefa: um periodo de anos são alguns
+# milhares de linhas pequenas, agrupadas numa consulta pelo indice (usuario, dia).
+#
+# As linhas são somadas com F() na transação da alteração da tarefa, como os contadores da
+# lista (todo/contadores.py):
+#   - save() de uma tarefa que passa a concluido, deixa de estar concluida ou muda de data de
+#     conclusão (editar_tarefa, API): signal post_save
+#   - update() e bulk_create (ações em lote, importação, gerar_dados): quem faz a operação
+#     chama ajustar() com diferencas()
+# É um historico: deletar uma tarefa concluida não desconta a conclusão. O comando
+# recalcular_estatisticas reconstroi as linhas a partir das tarefas existentes (o backfill
+# dos dados anteriores a esta tabela).
+
+CAMPOS = ('concluidas', 'concluidas_atrasadas', 'dias_ate_concluir', 'alta', 'media', 'baixa')
+
+PRIORIDADES = ('alta', 'media', 'baixa')
+
+AGRUPAMENTOS = ('dia', 'semana', 'mes')
+
+# Dias por UPDATE em ajustar(), abaixo do limite de 999 parametros do SQLite.
+TAMANHO_CONSULTA = 500
+
+
+def valores(criacao, vencimento, conclusao, prioridade):
+    """ Quanto uma tarefa concluida soma em cada campo do dia da conclusão """
+    campos = Counter(concluidas=1, dias_ate_concluir=max(0, (conclusao - criacao).days))
+    if vencimento is not None and conclusao > vencimento:
+        campos['concluidas_atrasadas'] = 1
+    if prioridade in PRIORIDADES:
+        campos[prioridade] = 1
+    return campos
+
+
+def diferencas(concluidas=(), reabertas=()):
+    """
+    Junta as diferenças por (usuario_id, dia) a partir de tuplas (usuario_id, dataCriacao,
+    dataVencimento, dataConclusao, prioridade) das tarefas concluidas e das que deixaram de
+    estar concluidas. Retorna {(usuario_id, dia): {campo: diferença}}.
+    """
+    resultado = defaultdict(Counter)
+    for sinal, tarefas in ((1, concluidas), (-1, reabertas)):
+        for usuario_id, criacao, vencimento, conclusao, prioridade in tarefas:
+            if conclusao is None:
+                continue
+            for campo, valor in valores(criacao, vencimento, conclusao, prioridade).items():
+                resultado[usuario_id, conclusao][campo] += sinal * valor
+    return resultado
+
+
+def da_tarefa(tarefa, conclusao=None):
+    """ Tupla de diferencas() de uma instancia de Tarefa """
+    return (tarefa.user_id, tarefa.dataCriacao, tarefa.dataVencimento, conclusao or tarefa.dataConclusao,
+            tarefa.prioridade)
+
+
+def ajustar(por_dia):
+    """
+    Aplica as diferenças de diferencas(). Os dias de um usuario com as mesmas diferenças são
+    atualizados juntos, num UPDATE com F(). Dias sem linha (a primeira conclusão do dia) ganham
+    uma linha zerada com INSERT ... ON CONFLICT DO NOTHING antes do UPDATE, assim duas
+    transações ao mesmo tempo não perdem nenhuma soma.
+    """
+    grupos = defaultdict(list)
+    for (usuario_id, dia), campos in por_dia.items():
+        campos = tuple(sorted((campo, valor) for campo, valor in campos.items() if valor))
+        if campos:
+            grupos[usuario_id, campos].append(dia)
+    for (usuario_id, campos), dias in grupos.items():
+        incrementos = contadores.incrementos(dict(campos))
+        for inicio in range(0, len(dias), TAMANHO_CONSULTA):
+            parte = dias[inicio:inicio + TAMANHO_CONSULTA]
+            linhas = EstatisticaDiaria.objects.filter(usuario_id=usuario_id, dia__in=parte)
+            # Quase sempre um dia só (hoje) que já tem linha: um UPDATE
+            if len(parte) == 1 and linhas.update(**incrementos):
+                continue
+            EstatisticaDiaria.objects.bulk_create(
+                [EstatisticaDiaria(usuario_id=usuario_id, dia=dia) for dia in parte], ignore_conflicts=True)
+            linhas.update(**incrementos)
+
+
+def contar(usuario_ids):
+    """ {(usuario_id, dia): {campo: valor}} corretos dos usuarios, num GROUP BY sobre as tarefas concluidas """
+    corretos = defaultdict(Counter)
+    linhas = (Tarefa.objects.filter(user_id__in=usuario_ids, status='concluido', dataConclusao__isnull=False)
+              .order_by().values('user_id', 'dataConclusao', 'prioridade')
+              .annotate(n=Count('id'), atrasadas=Count('id', filter=Q(dataVencimento__lt=F('dataConclusao'))),
+                        # Conclusão antes da criação (dados antigos) conta como zero dias, como em valores()
+                        dias=Sum(F('dataConclusao') - F('dataCriacao'), filter=Q(dataConclusao__gte=F('dataCriacao')))))
+    for linha in linhas:
+        campos = corretos[linha['user_id'], linha['dataConclusao']]
+        campos['concluidas'] += linha['n']
+        campos['concluidas_atrasadas'] += linha['atrasadas']
+        campos['dias_ate_concluir'] += linha['dias'].days if linha['dias'] is not None else 0
+        if linha['prioridade'] in PRIORIDADES:
+            campos[linha['prioridade']] += linha['n']
+    return corretos
+
+
+def recalcular(usuario_ids, corrigir=True):
+    """
+    Compara as linhas guardadas dos usuarios com as calculadas a partir das tarefas.
+    Retorna {(usuario_id, dia): (guardados, corretos)} das divergentes e, se corrigir, grava as corretas.
+    """
+    usuario_ids = list(usuario_ids)
+    corretos = contar(usuario_ids)
+    guardados = {(linha.pop('usuario_id'), linha.pop('dia')): linha for linha in
+                 EstatisticaDiaria.objects.filter(usuario_id__in=usuario_ids).values('usuario_id', 'dia', *CAMPOS)}
+    divergentes = {}
+    for chave in guardados.keys() | corretos.keys():
+        certo = {campo: corretos.get(chave, {}).get(campo, 0) for campo in CAMPOS}
+        atual = guardados.get(chave, dict.fromkeys(CAMPOS, 0))
+        if atual != certo:
+            divergentes[chave] = (atual, certo)
+    if corrigir and divergentes:
+        EstatisticaDiaria.objects.bulk_create(
+            [EstatisticaDiaria(usuario_id=usuario_id, dia=dia, **certo)
+             for (usuario_id, dia), (_, certo) in divergentes.items()],
+            update_conflicts=True, unique_fields=['usuario', 'dia'], update_fields=CAMPOS, batch_size=500)
+    return divergentes
+
+
+def recalcular_usuarios(usuarios=None, corrigir=True, lote=200):
+    """
+    recalcular() para os usuarios do queryset (padrão: todos), `lote` usuarios por transação em
+    ordem de id, assim a memoria não cresce com a base. Retorna quantos dias estavam divergentes.
+    """
+    usuarios = (usuarios if usuarios is not None else User.objects.all()).order_by('pk').values_list('pk', flat=True)
+    divergentes = ultimo = 0
+    while ids := list(usuarios.filter(pk__gt=ultimo)[:lote]):
+        with transaction.atomic():
+            divergentes += len(recalcular(ids, corrigir))
+        ultimo = ids[-1]
+    return divergentes
+
+
+def _periodo(dia, agrupamento):
+    if agrupamento == 'semana':
+        return dia - datetime.timedelta(days=dia.weekday())
+    if agrupamento == 'mes':
+        return dia.replace(day=1)
+    return dia
+
+
+def _seguinte(periodo, agrupamento):
+    if agrupamento == 'semana':
+        return periodo + datetime.timedelta(days=7)
+    if agrupamento == 'mes':
+        return (periodo + datetime.timedelta(days=32)).replace(day=1)
+    return periodo + datetime.timedelta(days=1)
+
+
+def _derivados(linha):
+    """ Media de dias até concluir, percentual de atrasadas e as sem prioridade """
+    concluidas = linha['concluidas']
+    linha['sem_prioridade'] = concluidas - sum(linha[prioridade] for prioridade in PRIORIDADES)
+    linha['media_dias'] = round(linha['dias_ate_concluir'] / concluidas, 1) if concluidas else None
+    linha['taxa_atraso'] = round(100 * linha['concluidas_atrasadas'] / concluidas, 1) if concluidas else None
+    return linha
+
+
+def serie(usuario_id, de=None, ate=None, agrupamento='dia'):
+    """
+    Totais por periodo ('dia', 'semana' que começa na segunda ou 'mes') entre de e ate, com os
+    periodos sem conclusões zerados, e os totais do intervalo: (periodos, totais). Sem `de`,
+    desde a primeira conclusão. Uma consulta.
+    """
+    linhas = EstatisticaDiaria.objects.filter(usuario_id=usuario_id)
+    if de is not None:
+        linhas = linhas.filter(dia__gte=de)
+    if ate is not None:
+        linhas = linhas.filter(dia__lte=ate)
+    if agrupamento == 'dia':
+        linhas = linhas.annotate(periodo=F('dia'))
+    else:
+        linhas = linhas.annotate(periodo=(TruncWeek if agrupamento == 'semana' else TruncMonth)('dia'))
+    linhas = linhas.order_by().values('periodo').annotate(**{campo: Sum(campo) for campo in CAMPOS})
+    por_periodo = {linha['periodo']: linha for linha in linhas}
+
+    periodos = []
+    totais = dict.fromkeys(CAMPOS, 0)
+    if por_periodo or de is not None:
+        periodo = _periodo(de if de is not None else min(por_periodo), agrupamento)
+        fim = _periodo(ate if ate is not None else max(por_periodo, default=periodo), agrupamento)
+        while periodo <= fim:
+            linha = por_periodo.get(periodo) or dict.fromkeys(CAMPOS, 0)
+            for campo in CAMPOS:
+                totais[campo] += linha[campo]
+            periodos.append(_derivados({'periodo': periodo, **{campo: linha[campo] for campo in CAMPOS}}))
+            periodo = _seguinte(periodo, agrupamento)
+    return periodos, _derivados(totais)
+
+
+def situacao(usuario_id, hoje=None):
+    """ Tarefas abertas (dos contadores das listas) e atrasadas hoje (pelo indice das abertas) """
+    abertas = Lista.objects.filter(usuario_id=usuario_id).aggregate(
+        abertas=Sum('pendentes') + Sum('em_andamento'))['abertas'] or 0
+    atrasadas = Tarefa.objects.filter(user_id=usuario_id).atrasadas(hoje).count()
+    return {'abertas': abertas, 'atrasadas': atrasadas,
+            'taxa_atrasadas': round(100 * atrasadas / abertas, 1) if abertas else None}
@@ -0,0 +1,137 @@
+import csv
+import datetime
+
+from django.conf import settings
+
+from .models import Tarefa
+
+# Exportação de tarefas em CSV e iCalendar (VTODO com a dataVencimento como DUE).
+# As linhas são lidas com values_list().iterator(), sem criar objetos Tarefa nem carregar a
+# consulta inteira, e são geradas aos poucos: a memoria fica constante para qualquer tamanho
+# de exportação e o primeiro bloco sai logo depois do primeiro lote do banco.
+
+FORMATOS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ics': ('text/calendar; charset=utf-8', 'ics'),
+}
+
+# As colunas do CSV usam os mesmos nomes aceitos pela importação, então o arquivo pode ser reimportado
+COLUNAS_CSV = ('titulo', 'descricao', 'status', 'prioridade', 'dataVencimento', 'dataCriacao', 'dataConclusao', 'lista')
+CAMPOS_CSV = COLUNAS_CSV[:-1] + ('lista__titulo',)
+CAMPOS_ICS = ('id', 'titulo', 'descricao', 'status', 'prioridade', 'dataVencimento', 'dataConclusao', 'lista__titulo')
+
+STATUS_ICS = {'concluido': 'COMPLETED', 'em andamento': 'IN-PROCESS', 'pendente': 'NEEDS-ACTION'}
+PRIORIDADE_ICS = {'alta': 1, 'media': 5, 'baixa': 9}
+
+# Tamanho aproximado, em caracteres, de cada bloco enviado ao cliente
+TAMANHO_BLOCO = 16 * 1024
+
+
+def _chunk_size():
+    return getattr(settings, 'TODO_EXPORT_CHUNK_SIZE', 2000)
+
+
+def tarefas_para_exportar(usuario_id, lista_id=None):
+    """ Tarefas do usuario (ou só de uma lista) na ordem da exportação """
+    tarefas = Tarefa.objects.filter(user_id=usuario_id)
+    if lista_id is not None:
+        tarefas = tarefas.filter(lista_id=lista_id)
+    return tarefas.order_by('lista_id', 'dataVencimento', 'id')
+
+
+def _em_blocos(partes):
+    """ Junta as partes em blocos de ~TAMANHO_BLOCO, evitando uma escrita na rede por linha """
+    bloco, tamanho = [], 0
+    for parte in partes:
+        bloco.append(parte)
+        tamanho += len(parte)
+        if tamanho >= TAMANHO_BLOCO:
+            yield ''.join(bloco)
+            bloco, tamanho = [], 0
+    if bloco:
+        yield ''.join(bloco)
+
+
+class _Eco:
+    """ Arquivo falso para o csv.writer: write() só devolve a linha formatada """
+
+    def write(self, valor):
+        return valor
+
+
+def linhas_csv(tarefas, chunk_size=None):
+    """ Gera o CSV das tarefas em blocos de texto """
+    escritor = csv.writer(_Eco())
+
+    def partes():
+        yield escritor.writerow(COLUNAS_CSV)
+        for linha in tarefas.values_list(*CAMPOS_CSV).iterator(chunk_size=chunk_size or _chunk_size()):
+            yield escritor.writerow(linha)
+    return _em_blocos(partes())
+
+
+def _escapar(texto):
+    """ Escapa um valor TEXT do iCalendar (RFC 5545, 3.3.11) """
+    return (texto.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def _dobrar(linha):
+    """ Quebra linhas com mais de 75 octetos, continuando com um espaço (RFC 5545, 3.1) """
+    if len(linha.encode()) <= 75:
+        return linha + '\r\n'
+    partes, atual, tamanho = [], '', 0
+    for caractere in linha:
+        octetos = len(caractere.encode())
+        if tamanho + octetos > 75:
+            partes.append(atual)
+            atual, tamanho = ' ', 1
+        atual += caractere
+        tamanho += octetos
+    partes.append(atual)
+    return '\r\n'.join(partes) + '\r\n'
+
+
+def _vtodo(linha, carimbo, dominio):
+    pk, titulo, descricao, status, prioridade, vencimento, conclusao, lista = linha
+    yield 'BEGIN:VTODO'
+    yield f'UID:tarefa-{pk}@{dominio}'
+    yield f'DTSTAMP:{carimbo}'
+    yield 'SUMMARY:' + _escapar(titulo)
+    if descricao:
+        yield 'DESCRIPTION:' + _escapar(descricao)
+    if lista:
+        yield 'CATEGORIES:' + _escapar(lista)
+    if vencimento:
+        yield f'DUE;VALUE=DATE:{vencimento:%Y%m%d}'
+    if status in STATUS_ICS:
+        yield f'STATUS:{STATUS_ICS[status]}'
+    if prioridade in PRIORIDADE_ICS:
+        yield f'PRIORITY:{PRIORIDADE_ICS[prioridade]}'
+    if conclusao:
+        yield f'COMPLETED:{conclusao:%Y%m%d}T000000Z'
+    yield 'END:VTODO'
+
+
+def linhas_ics(tarefas, nome='Tarefas', dominio='todo', chunk_size=None):
+    """ Gera o calendario iCalendar das tarefas em blocos de texto, com quebras de linha CRLF """
+    carimbo = datetime.datetime.now(datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+    def partes():
+        for linha in ('BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//todo//exportar//PT',
+                      'X-WR-CALNAME:' + _escapar(nome)):
+            yield _dobrar(linha)
+        for linha in tarefas.values_list(*CAMPOS_ICS).iterator(chunk_size=chunk_size or _chunk_size()):
+            for propriedade in _vtodo(linha, carimbo, dominio):
+                yield _dobrar(propriedade)
+        yield 'END:VCALENDAR\r\n'
+    return _em_blocos(partes())
+
+
+def exportar(tarefas, formato, nome='Tarefas', dominio='todo', chunk_size=None):
+    """ Retorna o gerador de blocos do formato pedido ('csv' ou 'ics') """
+    if formato == 'csv':
+        return linhas_csv(tarefas, chunk_size)
+    if formato == 'ics':
+        return linhas_ics(tarefas, nome, dominio, chunk_size)
+    raise ValueError(f'Formato não suportado: {formato}')
@@ -0,0 +1,188 @@
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import metricas
+from .models import Trabalho
+
+# Fila de trabalhos em segundo plano guardada numa tabela do proprio banco (Trabalho).
+#
+# As funções são registradas com @trabalho('nome') (as do app ficam em todo/trabalhos.py) e
+# enfileiradas com funcao.enfileirar(*args, **kwargs). O INSERT entra na transação de quem
+# enfileirou: se ela for desfeita, o trabalho também some.
+#
+# O comando `manage.py worker` executa a fila com N threads. Cada thread pega um lote de
+# trabalhos com um unico UPDATE ... WHERE id IN (SELECT ... LIMIT n), que marca os trabalhos
+# com um identificador do lote; dois workers nunca pegam o mesmo trabalho. No PostgreSQL o
+# SELECT usa FOR UPDATE SKIP LOCKED para os workers não esperarem uns pelos outros.
+#
+# Ordem: maior prioridade primeiro, depois executar_em e id. Um trabalho que levanta exceção
+# volta para a fila com espera exponencial (TODO_FILA_ESPERA * 2^(tentativa-1) segundos) até
+# max_tentativas, e então fica como falhou com o traceback em erro. Trabalhos em executando há
+# mais de TODO_FILA_EXPIRACAO segundos (worker que morreu) voltam para a fila.
+
+logger = logging.getLogger(__name__)
+
+_registro = {}
+
+
+def espera_base():
+    return getattr(settings, 'TODO_FILA_ESPERA', 5)
+
+
+def expiracao():
+    return getattr(settings, 'TODO_FILA_EXPIRACAO', 300)
+
+
+def trabalho(nome, prioridade=0, max_tentativas=None):
+    """
+    Registra a função como um trabalho da fila com o nome informado.
+    A função ganha funcao.enfileirar(*args, **kwargs), com a prioridade e as tentativas dadas aqui.
+    """
+    def registrar(funcao):
+        if nome in _registro and _registro[nome] is not funcao:
+            raise ValueError(f'Já existe um trabalho registrado como {nome}')
+        _registro[nome] = funcao
+
+        def enfileirar_funcao(*args, **kwargs):
+            return enfileirar(nome, args, kwargs, prioridade=prioridade, max_tentativas=max_tentativas)
+
+        funcao.enfileirar = enfileirar_funcao
+        funcao.nome_trabalho = nome
+        return funcao
+    return registrar
+
+
+def enfileirar(nome, argumentos=(), argumentos_nomeados=None, prioridade=0, executar_em=None, max_tentativas=None):
+    """ Coloca um trabalho na fila. Os argumentos precisam ser serializaveis em JSON """
+    if nome not in _registro:
+        raise ValueError(f'Trabalho não registrado: {nome}')
+    return Trabalho.objects.create(
+        nome=nome, argumentos=list(argumentos), argumentos_nomeados=argumentos_nomeados or {},
+        prioridade=prioridade, executar_em=executar_em or timezone.now(),
+        max_tentativas=max_tentativas or getattr(settings, 'TODO_FILA_TENTATIVAS', 3),
+    )
+
+
+def pegar(lote=10, trabalhador=''):
+    """ Marca até `lote` trabalhos prontos como executando e os retorna """
+    agora = timezone.now()
+    marca = f'{trabalhador}:{uuid.uuid4().hex[:12]}'[-100:]
+    with transaction.atomic():
+        prontos = Trabalho.objects.filter(status='pendente', executar_em__lte=agora)
+        if connection.features.has_select_for_update_skip_locked:
+            prontos = prontos.select_for_update(skip_locked=True)
+        prontos = prontos.order_by('-prioridade', 'executar_em', 'id').values('id')[:lote]
+        pegos = Trabalho.objects.filter(pk__in=prontos, status='pendente').update(
+            status='executando', trabalhador=marca, iniciado_em=agora, tentativas=F('tentativas') + 1)
+    if not pegos:
+        return []
+    return list(Trabalho.objects.filter(trabalhador=marca, status='executando').order_by('-prioridade', 'id'))
+
+
+def executar(trabalho):
+    """ Executa um trabalho já marcado como executando. Retorna True se deu certo """
+    funcao = _registro.get(trabalho.nome)
+    try:
+        if funcao is None:
+            raise LookupError(f'Trabalho não registrado: {trabalho.nome}')
+        funcao(*trabalho.argumentos, **trabalho.argumentos_nomeados)
+    except Exception:
+        erro = traceback.format_exc()
+        # Sem a função registrada não adianta tentar de novo
+        if funcao is None or trabalho.tentativas >= trabalho.max_tentativas:
+            Trabalho.objects.filter(pk=trabalho.pk).update(status='falhou', erro=erro, concluido_em=timezone.now())
+            logger.error('Trabalho %s falhou na tentativa %s:\n%s', trabalho, trabalho.tentativas, erro)
+            metricas.trabalhos.inc(trabalho.nome, 'falhou')
+        else:
+            espera = espera_base() * 2 ** (trabalho.tentativas - 1)
+            Trabalho.objects.filter(pk=trabalho.pk).update(
+                status='pendente', erro=erro, trabalhador='',
+                executar_em=timezone.now() + timezone.timedelta(seconds=espera))
+            logger.warning('Trabalho %s falhou, nova tentativa em %ss', trabalho, espera)
+            metricas.trabalhos.inc(trabalho.nome, 'repetir')
+        return False
+    metricas.trabalhos.inc(trabalho.nome, 'concluido')
+    return True
+
+
+def concluir(ids):
+    """ Marca como concluidos os trabalhos que deram certo, num unico UPDATE """
+    if ids:
+        Trabalho.objects.filter(pk__in=ids).update(status='concluido', erro='', concluido_em=timezone.now())
+
+
+def recuperar():
+    """ Devolve para a fila (ou marca como falhou) os trabalhos presos em executando. Retorna quantos """
+    limite = timezone.now() - timezone.timedelta(seconds=expiracao())
+    presos = Trabalho.objects.filter(status='executando', iniciado_em__lt=limite)
+    falhos = presos.filter(tentativas__gte=F('max_tentativas')).update(
+        status='falhou', erro='O trabalhador parou durante a execução', concluido_em=timezone.now())
+    devolvidos = presos.update(status='pendente', trabalhador='')
+    return falhos + devolvidos
+
+
+def processar(lote=10, trabalhador=''):
+    """ Pega e executa um lote. Retorna quantos trabalhos foram executados """
+    trabalhos = pegar(lote, trabalhador)
+    concluir([trabalho.pk for trabalho in trabalhos if executar(trabalho)])
+    return len(trabalhos)
+
+
+def trabalhar(concorrencia=1, lote=10, intervalo=1.0, parar=None, ate_esvaziar=False):
+    """
+    Executa a fila com `concorrencia` threads até o evento `parar` (ou, com ate_esvaziar, até não
+    haver mais trabalhos prontos). Retorna quantos trabalhos foram executados.
+    """
+    parar = parar or threading.Event()
+    nome = f'{socket.gethostname()}:{os.getpid()}'
+    executados = []
+    trava = threading.Lock()
+
+    def thread(indice, propria=True):
+        total = 0
+        ultima_recuperacao = 0
+        try:
+            while not parar.is_set():
+                try:
+                    if indice == 0 and time.monotonic() - ultima_recuperacao > expiracao() / 2:
+                        ultima_recuperacao = time.monotonic()
+                        if recuperados := recuperar():
+                            logger.warning('%s trabalhos presos voltaram para a fila', recuperados)
+                    feitos = processar(lote, f'{nome}:{indice}')
+                except DatabaseError:
+                    # Ex.: "database is locked" no SQLite; tenta de novo depois do intervalo
+                    logger.exception('Erro no banco ao processar a fila')
+                    close_old_connections()
+                    feitos = 0
+                total += feitos
+                if not feitos:
+                    if ate_esvaziar:
+                        break
+                    parar.wait(intervalo)
+        finally:
+            # Cada thread tem as suas conexões; a thread de quem chamou continua com as dela
+            if propria:
+                connections.close_all()
+            with trava:
+                executados.append(total)
+
+    if concorrencia <= 1:
+        thread(0, propria=False)
+        return sum(executados)
+    threads = [threading.Thread(target=thread, args=(i,), name=f'worker-{i}', daemon=True)
+               for i in range(concorrencia)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(executados)
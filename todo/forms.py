@@ -1,5 +1,7 @@
 from django import forms 
 from todo.models import *
+from todo.importar import FORMATOS
+from todo.lote import OPERACOES
 from django.contrib.auth.models import User
 
 
@@ -27,4 +29,13 @@ class UpdateSenhaForm(forms.Form):
 
 class UserLoginForm(forms.Form):
     user = forms.CharField(widget=forms.TextInput(attrs={'class':'form-control'}),max_length=150, required=True)
-    password = forms.CharField(widget=forms.PasswordInput(attrs={'class':'form-control'}), max_length=200, required=True)
\ No newline at end of file
+    password = forms.CharField(widget=forms.PasswordInput(attrs={'class':'form-control'}), max_length=200, required=True)
+
+class ImportTaskForm(forms.Form):
+    arquivo = forms.FileField(widget=forms.ClearableFileInput(attrs={'class':'form-control'}), required=True)
+    formato = forms.ChoiceField(choices=FORMATOS, widget=forms.Select(attrs={'class':'form-control'}), required=True)
+
+class AcaoLoteForm(forms.Form):
+    operacao = forms.ChoiceField(choices=OPERACOES, widget=forms.Select(attrs={'class':'form-control'}), required=True)
+    valor = forms.CharField(widget=forms.TextInput(attrs={'class':'form-control'}), max_length=20, required=False)
+    lista = forms.IntegerField(widget=forms.HiddenInput(), required=False)
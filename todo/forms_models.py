@@ -3,6 +3,10 @@ from todo.models import *
 from django.contrib.auth.models import User
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+import datetime
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from todo import recorrencias
 
 class RegisterForm(forms.ModelForm):
     class Meta:
@@ -17,6 +21,7 @@ class RegisterForm(forms.ModelForm):
         user = User(username = username, password = password, email = email)
         user.set_password(password)
         user.save()
+        return user
 
 
 class RegisterListForm(forms.ModelForm):
@@ -29,13 +34,28 @@ class RegisterListForm(forms.ModelForm):
         }
     def save(self,request,commit=True):
         lista = super().save(commit=False)
-        lista.usuario = get_object_or_404(User, pk=request.user.pk)
+        # O usuario logado já foi carregado pelo AuthenticationMiddleware
+        lista.usuario = request.user
         lista.data_criacao = timezone.now()
-        lista.data_atualizacao = timezone.now()
+        lista.data_atualizacao = lista.data_criacao
         if commit:
             lista.save()
+        return lista
 
 class RegisterTaskForm(forms.ModelForm):
+    # Não são campos de Tarefa: com repetir a tarefa vira a primeira ocorrencia de uma Recorrencia
+    repetir = forms.ChoiceField(
+        choices=[('', 'Não repete'), ('diaria', 'Todo dia'), ('semanal', 'Toda semana'), ('mensal', 'Todo mês')]
+                + ([('rrule', 'Regra RRULE')] if recorrencias.rrule_disponivel() else []),
+        required=False, widget=forms.Select(attrs={'class':'form-control'}))
+    intervalo = forms.IntegerField(min_value=1, max_value=365, required=False,
+                                   widget=forms.NumberInput(attrs={'class':'form-control','placeholder':'1'}))
+    repetir_ate = forms.DateField(required=False, widget=forms.DateInput(attrs={'class':'form-control','type':'date'}))
+    if recorrencias.rrule_disponivel():
+        regra = forms.CharField(max_length=500, required=False,
+                                widget=forms.TextInput(attrs={'class':'form-control',
+                                                              'placeholder':'FREQ=WEEKLY;BYDAY=MO,WE'}))
+
     class Meta:
         model = Tarefa
         fields = ['titulo', 'descricao', 'prioridade','dataVencimento']
@@ -47,14 +67,36 @@ class RegisterTaskForm(forms.ModelForm):
                                                                       'type':'date'})
            
         }
-    def save(self,request,commit=True):
+    def clean(self):
+        dados = super().clean()
+        vencimento = dados.get('dataVencimento')
+        if dados.get('repetir') == 'rrule':
+            try:
+                recorrencias.validar_regra(dados.get('regra', ''), vencimento or datetime.date.today())
+            except ValidationError as e:
+                self.add_error('regra', e)
+        if dados.get('repetir') and dados.get('repetir_ate') and vencimento and dados['repetir_ate'] < vencimento:
+            self.add_error('repetir_ate', 'A repetição termina antes do vencimento')
+        return dados
+
+    def save(self,request,commit=True,lista=None):
+            """
+            Salva a tarefa na lista informada (a view já a carregou para conferir o dono) ou na
+            lista de request.GET['Enviar']. O save da tarefa atualiza a lista na mesma transação.
+            Com repetir, a tarefa é a primeira ocorrencia de uma nova Recorrencia.
+            """
             task = super().save(commit=False)
-            lista = get_object_or_404(Lista, pk=request.GET.get('Enviar'))
-            task.lista = lista
+            task.lista = lista or get_object_or_404(Lista, pk=request.GET.get('Enviar'))
             task.dataCriacao = timezone.now()
-            task.user = task.lista.usuario
-            if commit:
+            task.user = request.user if request.user.pk == task.lista.usuario_id else task.lista.usuario
+            if commit and self.cleaned_data.get('repetir'):
+                with transaction.atomic():
+                    task.save()
+                    recorrencias.criar(task, self.cleaned_data['repetir'], self.cleaned_data.get('intervalo') or 1,
+                                       self.cleaned_data.get('regra', ''), self.cleaned_data.get('repetir_ate'))
+            elif commit:
                 task.save()
+            return task
 
 class UpdateTaskForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,154 @@
+import csv
+import datetime
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import contadores, estatisticas, metricas, posicoes
+from .cache import invalidar
+from .models import Lista, Tarefa
+
+# Importação de tarefas em lote: a validação é feita de uma vez para todas as linhas
+# (uma consulta para os titulos já existentes) e a inserção usa bulk_create em lotes,
+# tudo dentro de uma unica transação. Ou todas as tarefas entram ou nenhuma.
+
+FORMATOS = (('csv', 'CSV'), ('jsonl', 'JSON Lines'))
+
+# Quantidade maxima de parametros por consulta usada na busca dos titulos já existentes.
+TAMANHO_CONSULTA = 500
+
+PRIORIDADES = {valor for valor, _ in Tarefa.PRIORIDADE}
+STATUS = {valor for valor, _ in Tarefa.STATUS}
+
+
+def ler_linhas(arquivo, formato):
+    """ Le um arquivo de texto (qualquer iteravel de linhas) em csv ou jsonl e retorna uma lista de dicionarios """
+    if formato == 'csv':
+        return list(csv.DictReader(arquivo))
+    if formato == 'jsonl':
+        linhas = []
+        for numero, linha in enumerate(arquivo, start=1):
+            if not linha.strip():
+                continue
+            try:
+                objeto = json.loads(linha)
+            except json.JSONDecodeError:
+                objeto = None
+            if not isinstance(objeto, dict):
+                raise ValidationError(f'Linha {numero}: JSON inválido')
+            linhas.append(objeto)
+        return linhas
+    raise ValidationError(f'Formato não suportado: {formato}')
+
+
+def _texto(linha, campo):
+    """ Retorna o valor do campo como texto sem espaços nas pontas, ou None se estiver vazio """
+    valor = linha.get(campo)
+    if valor is None:
+        return None
+    return str(valor).strip() or None
+
+
+def _data(valor):
+    """ Converte a data de vencimento, aceitando AAAA-MM-DD e DD/MM/AAAA """
+    for formato in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.datetime.strptime(valor or '', formato).date()
+        except ValueError:
+            pass
+    return None
+
+
+def _titulos_existentes(usuario_id, titulos):
+    """ Retorna quais dos titulos informados já estão em uso pelo usuario """
+    titulos = list(titulos)
+    existentes = set()
+    for inicio in range(0, len(titulos), TAMANHO_CONSULTA):
+        existentes.update(Tarefa.objects.filter(
+            user_id=usuario_id, titulo__in=titulos[inicio:inicio + TAMANHO_CONSULTA]
+        ).values_list('titulo', flat=True))
+    return existentes
+
+
+def validar_linhas(lista: Lista, linhas):
+    """
+    Valida todas as linhas de uma vez e retorna as tarefas (ainda não salvas) prontas para o bulk_create.
+    Levanta um ValidationError com uma mensagem por linha inválida.
+    """
+    hoje = datetime.date.today()
+    erros = []
+    tarefas = []
+    vistos = set()
+    for numero, linha in enumerate(linhas, start=1):
+        titulo = _texto(linha, 'titulo') or ''
+        descricao = _texto(linha, 'descricao')
+        prioridade = _texto(linha, 'prioridade')
+        status = _texto(linha, 'status') or 'pendente'
+        vencimento = _data(_texto(linha, 'dataVencimento'))
+
+        if not titulo:
+            erros.append(f'Linha {numero}: informe um titulo')
+        elif len(titulo) > 100:
+            erros.append(f'Linha {numero}: o titulo deve ter no maximo 100 caracteres')
+        elif titulo in vistos:
+            erros.append(f'Linha {numero}: o titulo "{titulo}" está repetido no arquivo')
+        if descricao and len(descricao) > 300:
+            erros.append(f'Linha {numero}: a descrição deve ter no maximo 300 caracteres')
+        if prioridade is not None and prioridade not in PRIORIDADES:
+            erros.append(f'Linha {numero}: prioridade inválida')
+        if status not in STATUS:
+            erros.append(f'Linha {numero}: status inválido')
+        if vencimento is None or vencimento < hoje:
+            erros.append(f'Linha {numero}: informe uma data de vencimento válida')
+        vistos.add(titulo)
+
+        concluido = status == 'concluido'
+        tarefas.append(Tarefa(
+            titulo=titulo, descricao=descricao, prioridade=prioridade, status=status,
+            dataVencimento=vencimento, dataCriacao=hoje, concluido=concluido,
+            dataConclusao=hoje if concluido else None,
+            lista_id=lista.pk, user_id=lista.usuario_id,
+        ))
+
+    for titulo in sorted(_titulos_existentes(lista.usuario_id, vistos)):
+        erros.append(f'O nome da tarefa "{titulo}" já está em uso')
+    if erros:
+        raise ValidationError(erros)
+    return tarefas
+
+
+def importar_tarefas(lista: Lista, linhas, batch_size=None):
+    """
+    Valida e insere as tarefas na lista informada, em lotes de batch_size
+    (por padrão settings.TODO_IMPORT_BATCH_SIZE). Retorna a quantidade de tarefas criadas.
+    """
+    if batch_size is None:
+        batch_size = getattr(settings, 'TODO_IMPORT_BATCH_SIZE', 500)
+    tarefas = []
+    try:
+        with transaction.atomic():
+            tarefas = validar_linhas(lista, linhas)
+            # No fim da lista, na ordem do arquivo
+            posicoes.no_fim(tarefas)
+            Tarefa.objects.bulk_create(tarefas, batch_size=batch_size)
+            # bulk_create e update() não disparam os signals que invalidam o cache, contam as metricas
+            # e atualizam os contadores da lista, que vão no mesmo UPDATE da data de atualização
+            novas = contadores.diferencas(criadas=[(lista.pk, tarefa.status, 1) for tarefa in tarefas])
+            Lista.objects.filter(pk=lista.pk).update(data_atualizacao=timezone.now(),
+                                                     **contadores.incrementos(novas[lista.pk]))
+            estatisticas.ajustar(estatisticas.diferencas(
+                concluidas=[estatisticas.da_tarefa(tarefa) for tarefa in tarefas if tarefa.concluido]))
+            invalidar(lista.usuario_id, [lista.pk])
+    except IntegrityError:
+        # Um titulo do arquivo foi usado (set_task, API ou outra importação) entre a validação e
+        # o INSERT. A transação já foi desfeita, então nada foi importado
+        if tarefas and _titulos_existentes(lista.usuario_id, {tarefa.titulo for tarefa in tarefas}):
+            raise ValidationError('Uma tarefa com um dos titulos do arquivo foi criada durante a importação, '
+                                  'tente de novo')
+        raise
+    metricas.tarefas_criadas.inc(valor=len(tarefas))
+    metricas.tarefas_concluidas.inc(valor=sum(tarefa.concluido for tarefa in tarefas))
+    return len(tarefas)
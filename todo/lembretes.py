@@ -0,0 +1,75 @@
+import datetime
+from itertools import groupby
+
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F
+
+from .models import Tarefa
+
+# Lembretes das tarefas que vencem em breve, um email por usuario com todas as suas tarefas.
+# Cada execução faz uma unica consulta por faixa de vencimento, coberta pelo indice parcial
+# tarefa_abertas_venc_idx (só tarefas não concluidas), em vez de percorrer os usuarios.
+# Tarefa.lembrete_vencimento guarda o vencimento já lembrado: a tarefa não é lembrada de novo
+# até o vencimento mudar.
+#
+# Os emails saem em lotes de usuarios por conexão SMTP e cada lote é marcado como enviado logo
+# depois de sair, então uma execução interrompida reenvia no maximo um lote.
+
+# Quantidade maxima de ids por UPDATE na marcação dos lembretes enviados.
+TAMANHO_CONSULTA = 500
+
+CAMPOS = ('id', 'titulo', 'dataVencimento', 'lista__titulo', 'user_id', 'user__username', 'user__email')
+
+
+def pendentes(dias=None, hoje=None):
+    """ Tarefas abertas que vencem nos proximos dias e ainda não foram lembradas, ordenadas por usuario """
+    return (Tarefa.objects.vencendo(dias, hoje)
+            .exclude(lembrete_vencimento=F('dataVencimento'))
+            .exclude(user__email='')
+            .order_by('user_id', 'dataVencimento', 'id')
+            .values(*CAMPOS))
+
+
+def mensagem(tarefas, hoje=None):
+    """ Monta o email de lembrete de um usuario a partir das suas tarefas (linhas de pendentes()) """
+    hoje = hoje or datetime.date.today()
+    linhas = []
+    for tarefa in tarefas:
+        quando = 'hoje' if tarefa['dataVencimento'] == hoje else tarefa['dataVencimento'].strftime('%d/%m/%Y')
+        linhas.append(f'- {tarefa["titulo"]} ({tarefa["lista__titulo"]}), vence {quando}')
+    total = len(tarefas)
+    return EmailMessage(
+        subject=f'{total} tarefa{"s" if total > 1 else ""} vencendo em breve',
+        body=f'Olá {tarefas[0]["user__username"]},\n\nAs tarefas abaixo vencem em breve:\n\n' + '\n'.join(linhas) + '\n',
+        to=[tarefas[0]['user__email']],
+    )
+
+
+def _enviar_lote(mensagens, ids, simular):
+    if simular or not mensagens:
+        return
+    get_connection().send_messages(mensagens)
+    # Só lembrete_vencimento muda, as tarefas continuam na faixa do indice que está sendo lida
+    for inicio in range(0, len(ids), TAMANHO_CONSULTA):
+        Tarefa.objects.filter(pk__in=ids[inicio:inicio + TAMANHO_CONSULTA]).update(
+            lembrete_vencimento=F('dataVencimento'))
+
+
+def enviar(dias=None, hoje=None, lote=100, simular=False):
+    """
+    Envia os lembretes pendentes, em lotes de `lote` usuarios. Com simular só conta, sem enviar nem marcar.
+    Retorna (usuarios, tarefas) lembrados.
+    """
+    usuarios = total = 0
+    mensagens, ids = [], []
+    for _, tarefas in groupby(pendentes(dias, hoje).iterator(), key=lambda tarefa: tarefa['user_id']):
+        tarefas = list(tarefas)
+        mensagens.append(mensagem(tarefas, hoje))
+        ids.extend(tarefa['id'] for tarefa in tarefas)
+        usuarios += 1
+        total += len(tarefas)
+        if len(mensagens) >= lote:
+            _enviar_lote(mensagens, ids, simular)
+            mensagens, ids = [], []
+    _enviar_lote(mensagens, ids, simular)
+    return usuarios, total
@@ -0,0 +1,127 @@
+import datetime
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from . import contadores, estatisticas, metricas, posicoes, recorrencias
+from .cache import invalidar
+from .models import Lista, Tarefa
+
+# Ações em lote sobre varias tarefas de uma vez (selecionadas no get_list ou pela API).
+# A posse das tarefas é conferida com uma unica consulta, cada operação é um unico
+# UPDATE ... WHERE id IN (...) (ou um DELETE) e cada lista afetada tem data_atualizacao
+# atualizada uma vez só, tudo numa transação.
+#
+# Operações e o valor que cada uma recebe:
+#   concluir                marca as tarefas como concluidas (sem valor)
+#   status                  um dos Tarefa.STATUS
+#   prioridade              uma das Tarefa.PRIORIDADE
+#   mover                   id de outra lista do usuario (as tarefas vão para o fim dela)
+#   deletar                 deleta as tarefas (sem valor)
+
+OPERACOES = (('concluir', 'Concluir'), ('status', 'Mudar status'), ('prioridade', 'Mudar prioridade'),
+             ('mover', 'Mover para a lista'), ('deletar', 'Deletar'))
+
+STATUS = {valor for valor, _ in Tarefa.STATUS}
+PRIORIDADES = {valor for valor, _ in Tarefa.PRIORIDADE}
+
+
+def _ids(ids):
+    try:
+        ids = {int(pk) for pk in ids}
+    except (TypeError, ValueError):
+        raise ValidationError('Ids de tarefa inválidos')
+    if not ids:
+        raise ValidationError('Selecione ao menos uma tarefa')
+    maximo = getattr(settings, 'TODO_LOTE_MAXIMO', 1000)
+    if len(ids) > maximo:
+        raise ValidationError(f'Selecione no maximo {maximo} tarefas por vez')
+    return ids
+
+
+def _status(tarefas, status):
+    """
+    UPDATE do status mantendo concluido e dataConclusao coerentes, como em editar_tarefa.
+    O update() não passa pelo signal das estatisticas: as concluidas e as reabertas são lidas
+    antes (uma consulta) e somadas de uma vez.
+    """
+    campos = ('user_id', 'dataCriacao', 'dataVencimento', 'dataConclusao', 'prioridade')
+    if status == 'concluido':
+        # As que já estavam concluidas mantem a data de conclusão
+        hoje = datetime.date.today()
+        abertas = tarefas.exclude(concluido=True)
+        concluidas = [(usuario_id, criacao, vencimento, hoje, prioridade)
+                      for usuario_id, criacao, vencimento, _, prioridade in abertas.values_list(*campos)]
+        alteradas = abertas.update(status='concluido', concluido=True, dataConclusao=hoje)
+        estatisticas.ajustar(estatisticas.diferencas(concluidas=concluidas))
+        metricas.tarefas_concluidas.inc(valor=alteradas)
+        return alteradas
+    reabertas = list(tarefas.filter(status='concluido').values_list(*campos))
+    alteradas = tarefas.update(status=status, concluido=False, dataConclusao=None)
+    estatisticas.ajustar(estatisticas.diferencas(reabertas=reabertas))
+    return alteradas
+
+
+def aplicar(usuario_id, ids, operacao, valor=None):
+    """
+    Aplica a operação nas tarefas informadas, que precisam ser todas do usuario.
+    Levanta ValidationError para ids, operação ou valor inválidos. Retorna quantas tarefas foram alteradas.
+    """
+    ids = _ids(ids)
+    if operacao not in dict(OPERACOES):
+        raise ValidationError('Operação inválida')
+    if operacao == 'status' and valor not in STATUS:
+        raise ValidationError('Status inválido')
+    if operacao == 'prioridade' and valor not in PRIORIDADES:
+        raise ValidationError('Prioridade inválida')
+
+    with transaction.atomic():
+        # Uma consulta confere a posse de todas e traz as listas afetadas
+        listas = dict(Tarefa.objects.select_for_update().filter(pk__in=ids, user_id=usuario_id)
+                      .values_list('id', 'lista_id'))
+        if len(listas) != len(ids):
+            raise ValidationError('Alguma das tarefas não existe ou não pertence a você')
+        afetadas = set(listas.values())
+        tarefas = Tarefa.objects.filter(pk__in=ids)
+        # update() e o delete() por queryset não passam pelos signals dos contadores das listas:
+        # conta as tarefas por (lista, status) antes e depois da operação e ajusta a diferença
+        antes = contadores.status_por_lista(tarefas) if operacao != 'prioridade' else []
+
+        if operacao == 'concluir':
+            alteradas = _status(tarefas, 'concluido')
+        elif operacao == 'status':
+            alteradas = _status(tarefas, valor)
+        elif operacao == 'prioridade':
+            alteradas = tarefas.update(prioridade=valor)
+        elif operacao == 'mover':
+            try:
+                destino = Lista.objects.only('id').get(pk=valor, usuario_id=usuario_id)
+            except (Lista.DoesNotExist, ValueError, TypeError):
+                raise ValidationError('Lista de destino não encontrada')
+            # As movidas vão para o fim da lista de destino, na ordem em que estavam
+            movidas = list(tarefas.exclude(lista_id=destino.pk).order_by('lista_id', 'posicao', 'pk').only('pk'))
+            for tarefa in movidas:
+                tarefa.lista_id = destino.pk
+            posicoes.no_fim(movidas)
+            Tarefa.objects.bulk_update(movidas, ['lista', 'posicao'], batch_size=posicoes.TAMANHO_CONSULTA)
+            alteradas = len(movidas)
+            afetadas.add(destino.pk)
+        else:
+            # delete() dispara os signals de cada tarefa (cache e metricas)
+            alteradas = tarefas.delete()[1].get(Tarefa._meta.label, 0)
+
+        if antes and alteradas:
+            depois = contadores.status_por_lista(tarefas) if operacao != 'deletar' else []
+            contadores.ajustar(contadores.diferencas(criadas=depois, removidas=antes))
+        if alteradas:
+            Lista.objects.filter(pk__in=afetadas).update(data_atualizacao=timezone.now())
+            # update() não dispara os signals que invalidam o cache
+            invalidar(usuario_id, afetadas)
+        if alteradas and (operacao == 'concluir' or valor == 'concluido'):
+            # Nem o signal que cria a proxima ocorrencia das tarefas recorrentes concluidas
+            series = set(tarefas.filter(recorrencia__isnull=False).values_list('recorrencia_id', flat=True))
+            if series:
+                recorrencias.avancar(series)
+    return alteradas
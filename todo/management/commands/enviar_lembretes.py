@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from todo import lembretes
+
+
+class Command(BaseCommand):
+    help = ('Envia um email por usuario com as tarefas abertas que vencem nos proximos dias. '
+            'Feito para rodar periodicamente (cron), cada tarefa é lembrada uma vez por vencimento')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=None,
+                            help='Lembra as tarefas que vencem até daqui a N dias (padrão: TODO_LEMBRETE_DIAS)')
+        parser.add_argument('--lote', type=int, default=100, help='Usuarios por conexão de email (padrão: 100)')
+        parser.add_argument('--simular', action='store_true', help='Só conta os lembretes, sem enviar nem marcar')
+
+    def handle(self, *args, **options):
+        usuarios, tarefas = lembretes.enviar(dias=options['dias'], lote=options['lote'], simular=options['simular'])
+        acao = 'a enviar' if options['simular'] else 'enviados'
+        self.stdout.write(self.style.SUCCESS(f'Lembretes {acao}: {usuarios} usuarios, {tarefas} tarefas'))
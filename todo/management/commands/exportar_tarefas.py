@@ -0,0 +1,46 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from todo.exportar import FORMATOS, exportar, tarefas_para_exportar
+from todo.models import Lista
+
+
+class Command(BaseCommand):
+    help = 'Exporta as tarefas de um usuario (ou de uma lista) em csv ou ics, lendo o banco em lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usuario', help='Username do dono das tarefas')
+        parser.add_argument('--lista', type=int, default=None, help='Exporta só as tarefas desta lista')
+        parser.add_argument('--formato', choices=list(FORMATOS), default='csv', help='Formato do arquivo (padrão: csv)')
+        parser.add_argument('--saida', default='-', help='Arquivo de saida, "-" para a saida padrão')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Linhas lidas do banco por vez (padrão: TODO_EXPORT_CHUNK_SIZE)')
+
+    def handle(self, *args, **options):
+        try:
+            usuario = User.objects.get(username=options['usuario'])
+        except User.DoesNotExist:
+            raise CommandError(f'O usuario {options["usuario"]} não existe')
+
+        nome = 'Tarefas'
+        if options['lista'] is not None:
+            lista = Lista.objects.filter(pk=options['lista'], usuario=usuario).first()
+            if lista is None:
+                raise CommandError(f'A lista {options["lista"]} não existe ou não pertence a {usuario.username}')
+            nome = lista.titulo
+
+        blocos = exportar(tarefas_para_exportar(usuario.pk, options['lista']), options['formato'], nome,
+                          chunk_size=options['chunk_size'])
+        if options['saida'] == '-':
+            for bloco in blocos:
+                sys.stdout.write(bloco)
+            return
+        try:
+            with open(options['saida'], 'w', encoding='utf-8', newline='') as arquivo:
+                for bloco in blocos:
+                    arquivo.write(bloco)
+        except OSError as e:
+            raise CommandError(f'Não foi possivel escrever o arquivo: {e}')
+        self.stderr.write(self.style.SUCCESS(f'Tarefas exportadas para {options["saida"]}'))
@@ -0,0 +1,107 @@
+import datetime
+import random
+import re
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from todo import contadores, estatisticas, posicoes
+from todo.models import EstatisticaDiaria, Lista, Tarefa
+
+# Distribuições usadas nas tarefas geradas: (valor, peso)
+STATUS = (('pendente', 50), ('em andamento', 25), ('concluido', 25))
+PRIORIDADES = (('alta', 20), ('media', 50), ('baixa', 30))
+# Parte das tarefas não concluidas fica atrasada, o resto vence nos proximos 60 dias
+ATRASADAS = 0.15
+
+
+def _escolher(gerador, opcoes):
+    valores, pesos = zip(*opcoes)
+    return gerador.choices(valores, pesos)[0]
+
+
+class Command(BaseCommand):
+    help = ('Gera usuarios, listas e tarefas para testes de desempenho. Os dados são deterministicos '
+            'para a mesma --semente, então duas execuções produzem a mesma base')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuarios', type=int, default=10, help='Quantidade de usuarios (padrão: 10)')
+        parser.add_argument('--listas', type=int, default=10, help='Listas por usuario (padrão: 10)')
+        parser.add_argument('--tarefas', type=int, default=100, help='Tarefas por lista (padrão: 100)')
+        parser.add_argument('--prefixo', default='bench', help='Prefixo dos usernames gerados (padrão: bench)')
+        parser.add_argument('--senha', default='bench', help='Senha de todos os usuarios gerados')
+        parser.add_argument('--semente', type=int, default=42, help='Semente do gerador aleatorio')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Linhas por INSERT')
+        parser.add_argument('--limpar', action='store_true',
+                            help='Apaga antes os usuarios gerados com o prefixo (e suas listas e tarefas)')
+
+    def handle(self, *args, **options):
+        gerador = random.Random(options['semente'])
+        prefixo = options['prefixo']
+        batch_size = options['batch_size']
+
+        if options['limpar']:
+            apagados, _ = User.objects.filter(username__regex=rf'^{re.escape(prefixo)}[0-9]+$').delete()
+            self.stdout.write(f'{apagados} registros apagados')
+
+        # A senha é a mesma para todos, então o hash (lento de proposito) é calculado uma vez só
+        senha = make_password(options['senha'])
+        nomes = [f'{prefixo}{i}' for i in range(options['usuarios'])]
+        existentes = set(User.objects.filter(username__in=nomes).values_list('username', flat=True))
+        if existentes:
+            self.stdout.write(self.style.WARNING(f'{len(existentes)} usuarios já existem e serão ignorados'))
+
+        hoje = datetime.date.today()
+        agora = timezone.now()
+        total_listas = total_tarefas = 0
+        for nome in nomes:
+            if nome in existentes:
+                continue
+            # Um usuario por transação, assim a memoria não cresce com o tamanho da base
+            with transaction.atomic():
+                usuario = User.objects.create(username=nome, password=senha, email=f'{nome}@example.com')
+                listas = [
+                    Lista(usuario=usuario, titulo=f'Lista {j}', descricao=f'Lista {j} de {nome}',
+                          data_criacao=agora - datetime.timedelta(days=gerador.randint(30, 365)),
+                          data_atualizacao=agora - datetime.timedelta(minutes=gerador.randint(0, 60 * 24 * 30)))
+                    for j in range(options['listas'])
+                ]
+                tarefas = []
+                # As listas têm o mesmo numero de tarefas, então as mesmas chaves de posição
+                chaves = posicoes.espacadas(options['tarefas'])
+                for lista in listas:
+                    for k in range(options['tarefas']):
+                        status = _escolher(gerador, STATUS)
+                        # bulk_create não passa pelos signals: os contadores já vão na inserção da lista
+                        lista.total_tarefas += 1
+                        campo = contadores.POR_STATUS[status]
+                        setattr(lista, campo, getattr(lista, campo) + 1)
+                        concluido = status == 'concluido'
+                        if not concluido and gerador.random() < ATRASADAS:
+                            vencimento = hoje - datetime.timedelta(days=gerador.randint(1, 30))
+                        else:
+                            vencimento = hoje + datetime.timedelta(days=gerador.randint(0, 60))
+                        criacao = min(hoje, vencimento) - datetime.timedelta(days=gerador.randint(0, 30))
+                        tarefas.append(Tarefa(
+                            titulo=f'{lista.titulo} - Tarefa {k}', descricao=f'Descrição da tarefa {k}',
+                            prioridade=_escolher(gerador, PRIORIDADES), status=status, concluido=concluido,
+                            dataCriacao=criacao, dataVencimento=vencimento,
+                            dataConclusao=min(hoje, vencimento) if concluido else None,
+                            lista=lista, user=usuario, posicao=chaves[k],
+                        ))
+                Lista.objects.bulk_create(listas, batch_size=batch_size)
+                Tarefa.objects.bulk_create(tarefas, batch_size=batch_size)
+                # Nem pelo das estatisticas: o usuario é novo, então as linhas são inseridas prontas
+                por_dia = estatisticas.diferencas(
+                    concluidas=[estatisticas.da_tarefa(tarefa) for tarefa in tarefas if tarefa.concluido])
+                EstatisticaDiaria.objects.bulk_create(
+                    [EstatisticaDiaria(usuario_id=usuario_id, dia=dia, **campos)
+                     for (usuario_id, dia), campos in por_dia.items()], batch_size=batch_size)
+            total_listas += len(listas)
+            total_tarefas += len(tarefas)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(nomes) - len(existentes)} usuarios, {total_listas} listas e {total_tarefas} tarefas gerados'))
@@ -0,0 +1,34 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from todo.importar import FORMATOS, importar_tarefas, ler_linhas
+from todo.models import Lista
+
+
+class Command(BaseCommand):
+    help = 'Importa tarefas de um arquivo csv ou jsonl para uma lista, usando bulk_create em lotes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('lista', type=int, help='Id da lista que vai receber as tarefas')
+        parser.add_argument('arquivo', help='Caminho do arquivo csv ou jsonl')
+        parser.add_argument('--formato', choices=[valor for valor, _ in FORMATOS],
+                            help='Formato do arquivo, por padrão é deduzido pela extensão')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Quantidade de tarefas por INSERT (padrão: TODO_IMPORT_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        try:
+            lista = Lista.objects.get(pk=options['lista'])
+        except Lista.DoesNotExist:
+            raise CommandError(f'A lista {options["lista"]} não existe')
+
+        formato = options['formato'] or options['arquivo'].rsplit('.', 1)[-1].lower()
+        try:
+            with open(options['arquivo'], encoding='utf-8-sig', newline='') as arquivo:
+                total = importar_tarefas(lista, ler_linhas(arquivo, formato), options['batch_size'])
+        except OSError as e:
+            raise CommandError(f'Não foi possivel abrir o arquivo: {e}')
+        except ValidationError as e:
+            raise CommandError('\n'.join(e.messages))
+
+        self.stdout.write(self.style.SUCCESS(f'{total} tarefas importadas para a lista "{lista.titulo}"'))
@@ -0,0 +1,21 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from todo import recorrencias
+
+
+class Command(BaseCommand):
+    help = ('Cria as ocorrencias das tarefas recorrentes que vencem até a data informada, em lotes. '
+            'Feito para rodar periodicamente (cron ou o trabalho materializar_recorrencias da fila)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=0,
+                            help='Cria as ocorrencias que vencem até daqui a N dias (padrão: 0, só as de hoje)')
+        parser.add_argument('--lote', type=int, default=recorrencias.TAMANHO_LOTE,
+                            help=f'Series por transação (padrão: {recorrencias.TAMANHO_LOTE})')
+
+    def handle(self, *args, **options):
+        ate = datetime.date.today() + datetime.timedelta(days=options['dias'])
+        series, tarefas = recorrencias.materializar(ate=ate, lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(f'Recorrencias processadas: {series} series, {tarefas} tarefas criadas'))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from todo import contadores
+from todo.models import Lista
+
+
+class Command(BaseCommand):
+    help = ('Confere os contadores de tarefas das listas (total, pendentes, em andamento e concluidas) '
+            'contra as tarefas e corrige os que estiverem errados')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verificar', action='store_true',
+                            help='Só mostra as listas divergentes, sem corrigir (sai com erro se houver alguma)')
+        parser.add_argument('--usuario', type=int, help='Confere só as listas deste usuario (id)')
+
+    def handle(self, *args, **options):
+        listas = Lista.objects.all()
+        if options['usuario'] is not None:
+            listas = listas.filter(usuario_id=options['usuario'])
+
+        with transaction.atomic():
+            divergentes = contadores.recalcular(listas, corrigir=not options['verificar'])
+
+        for pk, (guardados, corretos) in sorted(divergentes.items()):
+            self.stdout.write(f'Lista {pk}: ' + ', '.join(
+                f'{campo} {guardados[campo]} -> {corretos[campo]}'
+                for campo in contadores.CAMPOS if guardados[campo] != corretos[campo]))
+        if options['verificar'] and divergentes:
+            raise CommandError(f'{len(divergentes)} listas com contadores errados')
+        acao = 'encontradas' if options['verificar'] else 'corrigidas'
+        self.stdout.write(self.style.SUCCESS(f'{len(divergentes)} listas com contadores errados {acao}'))
@@ -0,0 +1,28 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from todo import estatisticas
+
+
+class Command(BaseCommand):
+    help = ('Reconstroi as estatisticas diarias (concluidas por dia) a partir das tarefas, em lotes de '
+            'usuarios. Serve de backfill para os dados anteriores à tabela e corrige linhas divergentes')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verificar', action='store_true',
+                            help='Só conta os dias divergentes, sem corrigir (sai com erro se houver algum)')
+        parser.add_argument('--usuario', type=int, help='Reconstroi só as estatisticas deste usuario (id)')
+        parser.add_argument('--lote', type=int, default=200, help='Usuarios por transação (padrão: 200)')
+
+    def handle(self, *args, **options):
+        usuarios = User.objects.all()
+        if options['usuario'] is not None:
+            usuarios = usuarios.filter(pk=options['usuario'])
+
+        divergentes = estatisticas.recalcular_usuarios(usuarios, corrigir=not options['verificar'],
+                                                       lote=options['lote'])
+
+        if options['verificar'] and divergentes:
+            raise CommandError(f'{divergentes} dias com estatisticas erradas')
+        acao = 'encontrados' if options['verificar'] else 'corrigidos'
+        self.stdout.write(self.style.SUCCESS(f'{divergentes} dias com estatisticas erradas {acao}'))
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from todo import routers
+from todo.db import copiar_sqlite
+
+
+class Command(BaseCommand):
+    help = ('Copia o banco SQLite primario para as replicas locais (TODO_REPLICAS), uma vez ou a cada '
+            '--intervalo segundos. Simula a replicação, com o atraso do intervalo, para testar o roteamento')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--replica', action='append', help='Alias da replica (padrão: todas de TODO_REPLICAS)')
+        parser.add_argument('--intervalo', type=float, default=0,
+                            help='Repete a copia a cada N segundos até ser interrompido (padrão: copia uma vez)')
+
+    def handle(self, *args, **options):
+        aliases = options['replica'] or routers.replicas()
+        if not aliases:
+            raise CommandError('Nenhuma replica configurada (defina TODO_REPLICA_NAME)')
+        primario = connections['default']
+        for alias in aliases:
+            if alias not in connections.settings or connections[alias].vendor != 'sqlite' or primario.vendor != 'sqlite':
+                raise CommandError(f'{alias} não é uma replica SQLite')
+
+        while True:
+            inicio = time.perf_counter()
+            for alias in aliases:
+                copiar_sqlite(primario, connections[alias].settings_dict['NAME'])
+            self.stdout.write(f'{len(aliases)} replicas copiadas em {time.perf_counter() - inicio:.2f}s')
+            if not options['intervalo']:
+                break
+            time.sleep(options['intervalo'])
@@ -0,0 +1,40 @@
+import signal
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from todo import fila
+
+
+class Command(BaseCommand):
+    help = ('Executa os trabalhos da fila em segundo plano (emails, lembretes, recalculos). '
+            'Para com SIGINT/SIGTERM depois de terminar o lote em andamento')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concorrencia', type=int, default=1, help='Threads executando trabalhos (padrão: 1)')
+        parser.add_argument('--lote', type=int, default=10, help='Trabalhos pegos de uma vez por thread (padrão: 10)')
+        parser.add_argument('--intervalo', type=float, default=1.0,
+                            help='Segundos de espera quando a fila está vazia (padrão: 1)')
+        parser.add_argument('--uma-vez', action='store_true', help='Executa os trabalhos prontos e sai')
+
+    def handle(self, *args, **options):
+        parar = threading.Event()
+
+        def sinal(*_):
+            parar.set()
+
+        anteriores = {}
+        if threading.current_thread() is threading.main_thread():
+            for numero in (signal.SIGINT, signal.SIGTERM):
+                anteriores[numero] = signal.signal(numero, sinal)
+
+        inicio = time.perf_counter()
+        try:
+            total = fila.trabalhar(concorrencia=options['concorrencia'], lote=options['lote'],
+                                   intervalo=options['intervalo'], parar=parar, ate_esvaziar=options['uma_vez'])
+        finally:
+            for numero, anterior in anteriores.items():
+                signal.signal(numero, anterior)
+        segundos = time.perf_counter() - inicio
+        self.stdout.write(self.style.SUCCESS(f'Trabalhos executados: {total} em {segundos:.1f}s'))
@@ -0,0 +1,288 @@
+import atexit
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Metricas no formato texto do Prometheus, expostas em /metrics.
+# Cada thread escreve no seu proprio shard (um dict em threading.local), então registrar uma
+# medição não pega nenhuma trava; a trava só é usada quando uma thread nova cria o seu shard.
+# A exportação soma os shards de todas as threads do processo.
+#
+# Com varios processos (workers do gunicorn) cada um tem as suas metricas. Com TODO_METRICAS_DIR
+# definido, cada processo grava de tempos em tempos (TODO_METRICAS_INTERVALO segundos, e na saída)
+# um snapshot em TODO_METRICAS_DIR/<pid>-<inicio>.json, e o /metrics soma os snapshots de todos os
+# processos. Os arquivos de processos que já terminaram continuam sendo somados, para os
+# contadores não voltarem para trás; o diretorio deve ser esvaziado a cada deploy.
+#
+# TODO_METRICAS_TOKEN: se definido, o /metrics aceita "Authorization: Bearer <token>" além de staff
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_metricas = {}
+_trava = threading.Lock()
+_shards = []
+_local = threading.local()
+_inicio = time.time()
+_exportador = None
+
+# Consultas da requisição atual, somadas no contador por rota quando a requisição termina
+_consultas_requisicao = ContextVar('todo_metricas_consultas', default=None)
+
+
+def _shard():
+    """ Shard da thread atual, criado na primeira medição dela """
+    shard = getattr(_local, 'shard', None)
+    if shard is None:
+        shard = _local.shard = {}
+        with _trava:
+            _shards.append(shard)
+        _iniciar_exportador()
+    return shard
+
+
+def _reiniciar_no_filho():
+    """ Depois de um fork o processo filho começa sem as medições herdadas do pai """
+    global _trava, _local, _shards, _inicio, _exportador
+    _trava = threading.Lock()
+    _local = threading.local()
+    _shards = []
+    _inicio = time.time()
+    _exportador = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reiniciar_no_filho)
+
+
+class Contador:
+    """ Contador que só cresce, com rotulos opcionais """
+    tipo = 'counter'
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        _metricas[nome] = self
+
+    def inc(self, *rotulos, valor=1):
+        shard = _shard()
+        chave = (self.nome, rotulos)
+        shard[chave] = shard.get(chave, 0) + valor
+
+    def _somar(self, atual, outro):
+        return (atual or 0) + outro
+
+    def _linhas(self, rotulos, valor):
+        yield f'{self.nome}{_formatar_rotulos(self.rotulos, rotulos)} {_numero(valor)}'
+
+
+class Histograma:
+    """ Histograma com buckets fixos; cada valor guarda as contagens por bucket, a soma e o total """
+    tipo = 'histogram'
+
+    def __init__(self, nome, ajuda, rotulos=(), buckets=BUCKETS_LATENCIA):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.buckets = tuple(buckets)
+        _metricas[nome] = self
+
+    def observar(self, valor, *rotulos):
+        shard = _shard()
+        chave = (self.nome, rotulos)
+        dados = shard.get(chave)
+        if dados is None:
+            # len(buckets) contagens, a do +Inf, a soma e o total
+            dados = shard[chave] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        dados[bisect_left(self.buckets, valor)] += 1
+        dados[-2] += valor
+        dados[-1] += 1
+
+    def _somar(self, atual, outro):
+        if atual is None:
+            return list(outro)
+        return [a + b for a, b in zip(atual, outro)]
+
+    def _linhas(self, rotulos, dados):
+        acumulado = 0
+        for limite, contagem in zip(self.buckets + (math.inf,), dados):
+            acumulado += contagem
+            le = '+Inf' if limite == math.inf else _numero(limite)
+            yield f'{self.nome}_bucket{_formatar_rotulos(self.rotulos + ("le",), rotulos + (le,))} {acumulado}'
+        yield f'{self.nome}_sum{_formatar_rotulos(self.rotulos, rotulos)} {_numero(dados[-2])}'
+        yield f'{self.nome}_count{_formatar_rotulos(self.rotulos, rotulos)} {dados[-1]}'
+
+
+def _numero(valor):
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return repr(valor) if isinstance(valor, float) else str(valor)
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _formatar_rotulos(nomes, valores):
+    if not nomes:
+        return ''
+    return '{' + ','.join(f'{nome}="{_escapar(valor)}"' for nome, valor in zip(nomes, valores)) + '}'
+
+
+requisicoes = Histograma('todo_requisicao_segundos', 'Latencia das requisicoes por rota', ('rota', 'metodo'))
+consultas = Contador('todo_db_consultas_total', 'Consultas SQL executadas, por rota', ('rota',))
+tarefas_criadas = Contador('todo_tarefas_criadas_total', 'Tarefas criadas')
+tarefas_concluidas = Contador('todo_tarefas_concluidas_total', 'Tarefas que passaram para concluido')
+tarefas_deletadas = Contador('todo_tarefas_deletadas_total', 'Tarefas deletadas')
+logins = Contador('todo_logins_total', 'Tentativas de login no formulario de login', ('resultado',))
+trabalhos = Contador('todo_trabalhos_total', 'Trabalhos da fila executados, por resultado', ('nome', 'resultado'))
+
+
+def contar_consulta(execute, sql, params, many, context):
+    """
+    Wrapper instalado em toda conexão nova (signal connection_created). Dentro de uma requisição
+    só soma no contador da requisição; fora dela (comandos, worker) soma direto no contador.
+    """
+    contagem = _consultas_requisicao.get()
+    if contagem is None:
+        consultas.inc('fora_de_requisicao')
+    else:
+        contagem[0] += 1
+    return execute(sql, params, many, context)
+
+
+def iniciar_requisicao():
+    """ Começa a contar as consultas da requisição atual; retorna o token para terminar_requisicao """
+    return time.perf_counter(), _consultas_requisicao.set([0])
+
+
+def terminar_requisicao(request, inicio):
+    """ Registra a latencia e as consultas da requisição na rota dela """
+    tempo, token = inicio
+    rota = nome_rota(request)
+    requisicoes.observar(time.perf_counter() - tempo, rota, request.method)
+    contagem = _consultas_requisicao.get()
+    _consultas_requisicao.reset(token)
+    if contagem[0]:
+        consultas.inc(rota, valor=contagem[0])
+
+
+def nome_rota(request):
+    """ Nome da url resolvida (index, get_list...), usado como rotulo """
+    correspondencia = getattr(request, 'resolver_match', None)
+    if correspondencia is None:
+        return 'sem_rota'
+    return correspondencia.view_name or correspondencia._func_path
+
+
+def instantaneo():
+    """ Soma dos shards das threads deste processo: {(nome, rotulos): valor} """
+    with _trava:
+        shards = list(_shards)
+    total = {}
+    for shard in shards:
+        for chave, valor in list(shard.items()):
+            total[chave] = _metricas[chave[0]]._somar(total.get(chave), valor)
+    return total
+
+
+def _diretorio():
+    return getattr(settings, 'TODO_METRICAS_DIR', None)
+
+
+def _arquivo_processo(diretorio):
+    return os.path.join(diretorio, f'{os.getpid()}-{int(_inicio * 1000)}.json')
+
+
+def gravar_instantaneo():
+    """ Grava o snapshot deste processo no TODO_METRICAS_DIR (troca atomica do arquivo) """
+    diretorio = _diretorio()
+    if not diretorio:
+        return
+    dados = [[nome, list(rotulos), valor] for (nome, rotulos), valor in instantaneo().items()]
+    os.makedirs(diretorio, exist_ok=True)
+    descritor, temporario = tempfile.mkstemp(dir=diretorio, suffix='.tmp')
+    with os.fdopen(descritor, 'w') as arquivo:
+        json.dump(dados, arquivo)
+    os.replace(temporario, _arquivo_processo(diretorio))
+
+
+def _exportar_periodicamente(intervalo):
+    while True:
+        time.sleep(intervalo)
+        try:
+            gravar_instantaneo()
+        except OSError:
+            pass
+
+
+def _iniciar_exportador():
+    """ No modo multiprocesso, começa a gravar o snapshot deste processo numa thread daemon """
+    global _exportador
+    if _exportador is not None or not _diretorio():
+        return
+    with _trava:
+        if _exportador is not None:
+            return
+        intervalo = getattr(settings, 'TODO_METRICAS_INTERVALO', 5)
+        _exportador = threading.Thread(target=_exportar_periodicamente, args=(intervalo,),
+                                       name='todo-metricas', daemon=True)
+        _exportador.start()
+
+
+@atexit.register
+def _gravar_na_saida():
+    if _exportador is not None:
+        try:
+            gravar_instantaneo()
+        except OSError:
+            pass
+
+
+def agregado():
+    """ Metricas de todos os processos no modo multiprocesso, ou só deste processo """
+    diretorio = _diretorio()
+    if not diretorio:
+        return instantaneo()
+    gravar_instantaneo()
+    total = {}
+    for nome_arquivo in os.listdir(diretorio):
+        if not nome_arquivo.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(diretorio, nome_arquivo)) as arquivo:
+                dados = json.load(arquivo)
+        except (OSError, ValueError):
+            continue
+        for nome, rotulos, valor in dados:
+            metrica = _metricas.get(nome)
+            if metrica is not None:
+                chave = (nome, tuple(rotulos))
+                total[chave] = metrica._somar(total.get(chave), valor)
+    return total
+
+
+def texto(valores=None):
+    """ Metricas no formato de exposição texto do Prometheus """
+    if valores is None:
+        valores = agregado()
+    por_metrica = {}
+    for (nome, rotulos), valor in valores.items():
+        por_metrica.setdefault(nome, []).append((rotulos, valor))
+    linhas = []
+    for nome, metrica in _metricas.items():
+        linhas.append(f'# HELP {nome} {metrica.ajuda}')
+        linhas.append(f'# TYPE {nome} {metrica.tipo}')
+        amostras = sorted(por_metrica.get(nome, []))
+        if not amostras and not metrica.rotulos and metrica.tipo == 'counter':
+            amostras = [((), 0)]
+        for rotulos, valor in amostras:
+            linhas.extend(metrica._linhas(rotulos, valor))
+    return '\n'.join(linhas) + '\n'
@@ -0,0 +1,202 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth import SESSION_KEY, alogout, logout
+
+from . import metricas, perfil, routers
+
+# Expiração do login guardada na propria sessão.
+# A chave CHAVE_EXPIRACAO tem o timestamp em que o login expira; ela é criada no login (signal
+# user_logged_in) e conferida aqui sem carregar o usuario do banco. Com o engine cached_db a
+# sessão vem do cache, então a conferencia não custa nenhuma consulta.
+#
+# TODO_SESSION_TIMEOUT: duração do login em segundos (padrão: uma hora)
+# TODO_SESSION_TIMEOUT_MODO: 'absoluto' expira TODO_SESSION_TIMEOUT depois do login,
+#     'deslizante' expira TODO_SESSION_TIMEOUT depois da ultima requisição
+# TODO_SESSION_RENOVACAO: no modo deslizante, intervalo minimo em segundos entre duas renovações,
+#     para não gravar a sessão a cada requisição
+
+CHAVE_EXPIRACAO = '_todo_expira'
+
+# Timestamp até o qual as leituras do usuario ficam no primario (ver todo/routers.py)
+CHAVE_PRIMARIO = '_todo_primario_ate'
+
+METODOS_LEITURA = ('GET', 'HEAD', 'OPTIONS')
+
+
+def duracao():
+    return getattr(settings, 'TODO_SESSION_TIMEOUT', 3600)
+
+
+def deslizante():
+    return getattr(settings, 'TODO_SESSION_TIMEOUT_MODO', 'absoluto') == 'deslizante'
+
+
+def definir_expiracao(session, agora=None):
+    """ Marca na sessão o momento em que o login expira """
+    session[CHAVE_EXPIRACAO] = (agora or time.time()) + duracao()
+
+
+def _renovar(expira, agora):
+    """ No modo deslizante, diz se já passou tempo suficiente para adiar a expiração """
+    return deslizante() and agora + duracao() - expira >= getattr(settings, 'TODO_SESSION_RENOVACAO', 60)
+
+
+class SessionTimeoutMiddleware:
+    """
+    Desloga o usuario quando o tempo da sessão acaba, como o antigo auto_logout_after_one_hour.
+    Funciona tanto em WSGI quanto em ASGI, sem mandar as requisições async para uma thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        session = request.session
+        if SESSION_KEY in session:
+            agora = time.time()
+            expira = session.get(CHAVE_EXPIRACAO)
+            if expira is None:
+                # Sessões criadas antes da chave existir
+                definir_expiracao(session, agora)
+            elif expira <= agora:
+                logout(request)
+                messages.info(request, 'Seu login expirou')
+            elif _renovar(expira, agora):
+                definir_expiracao(session, agora)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        session = request.session
+        if await session.ahas_key(SESSION_KEY):
+            agora = time.time()
+            expira = await session.aget(CHAVE_EXPIRACAO)
+            if expira is not None and expira <= agora:
+                await alogout(request)
+                messages.info(request, 'Seu login expirou')
+            elif expira is None or _renovar(expira, agora):
+                await session.aset(CHAVE_EXPIRACAO, agora + duracao())
+        return await self.get_response(request)
+
+
+class PerfilMiddleware:
+    """ Mede as requisições amostradas: tempo, consultas SQL, templates e cProfile (ver todo/perfil.py) """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if perfil.amostrar(request):
+            return perfil.medir(request, self.get_response)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        usuario = await request.auser() if perfil.forcado(request) else None
+        if perfil.amostrar(request, usuario):
+            return await perfil.amedir(request, self.get_response)
+        return await self.get_response(request)
+
+
+class MetricasMiddleware:
+    """ Registra a latencia e as consultas SQL de toda requisição por rota (ver todo/metricas.py) """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        inicio = metricas.iniciar_requisicao()
+        try:
+            return self.get_response(request)
+        finally:
+            metricas.terminar_requisicao(request, inicio)
+
+    async def __acall__(self, request):
+        inicio = metricas.iniciar_requisicao()
+        try:
+            return await self.get_response(request)
+        finally:
+            metricas.terminar_requisicao(request, inicio)
+
+
+def _fixar():
+    return getattr(settings, 'TODO_REPLICA_FIXAR', 5)
+
+
+def _limpou_sessao(request, chave):
+    """ A view trocou a sessão por uma vazia com flush() (ex.: logout) """
+    return chave is not None and request.session.session_key is None
+
+
+class ReplicaMiddleware:
+    """
+    Marca quais requisições podem ler das replicas (GET/HEAD de quem não escreveu nos ultimos
+    TODO_REPLICA_FIXAR segundos) e fixa no primario quem acabou de escrever. Sem TODO_REPLICAS não faz nada.
+    Só é fixado quem escreveu no banco ou mandou um POST/PUT/... logado: um POST anonimo que não
+    escreveu (login errado, cadastro inválido) não cria sessão, e a sessão que a view acabou de
+    limpar (logout) não recebe a marca.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not routers.replicas():
+            return self.get_response(request)
+        agora = time.time()
+        leitura = request.method in METODOS_LEITURA
+        estado = routers.iniciar(leitura and request.session.get(CHAVE_PRIMARIO, 0) <= agora)
+        chave = request.session.session_key
+        response = self.get_response(request)
+        if _limpou_sessao(request, chave):
+            return response
+        fixar = estado.escreveu
+        if not fixar and not leitura:
+            usuario = getattr(request, 'user', None)
+            fixar = usuario is not None and usuario.is_authenticated
+        if fixar:
+            request.session[CHAVE_PRIMARIO] = agora + _fixar()
+        return response
+
+    async def __acall__(self, request):
+        if not routers.replicas():
+            return await self.get_response(request)
+        agora = time.time()
+        leitura = request.method in METODOS_LEITURA
+        estado = routers.iniciar(leitura and await request.session.aget(CHAVE_PRIMARIO, 0) <= agora)
+        chave = request.session.session_key
+        response = await self.get_response(request)
+        if _limpou_sessao(request, chave):
+            return response
+        fixar = estado.escreveu
+        if not fixar and not leitura:
+            usuario = await request.auser() if hasattr(request, 'auser') else None
+            fixar = usuario is not None and usuario.is_authenticated
+        if fixar:
+            await request.session.aset(CHAVE_PRIMARIO, agora + _fixar())
+        return response
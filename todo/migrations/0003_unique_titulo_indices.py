@@ -0,0 +1,62 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:16
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+# O clean() antigo não impedia titulos repetidos do mesmo dono (o get() dentro de um except
+# escondia o MultipleObjectsReturned), então bases antigas podem ter duplicatas que fariam as
+# constraints falharem. Antes delas, em cada grupo (dono, titulo) repetido a primeira linha (menor
+# id) fica como está e as outras ganham um sufixo " (2)", " (3)", ... que ainda não esteja em uso.
+
+
+def _renomear_duplicados(modelo, dono):
+    titulo_max = modelo._meta.get_field('titulo').max_length
+    grupos = (modelo.objects.order_by().values(dono, 'titulo').annotate(n=Count('id')).filter(n__gt=1)
+              .values_list(dono, 'titulo'))
+    for dono_id, titulo in list(grupos):
+        usados = set(modelo.objects.filter(**{dono: dono_id}).values_list('titulo', flat=True))
+        repetidos = modelo.objects.filter(**{dono: dono_id, 'titulo': titulo}).order_by('id').values_list('id', flat=True)
+        numero = 1
+        for pk in list(repetidos)[1:]:
+            while True:
+                numero += 1
+                sufixo = f' ({numero})'
+                novo = titulo[:titulo_max - len(sufixo)] + sufixo
+                if novo not in usados:
+                    break
+            usados.add(novo)
+            modelo.objects.filter(pk=pk).update(titulo=novo)
+
+
+def renomear_duplicados(apps, schema_editor):
+    _renomear_duplicados(apps.get_model('todo', 'Lista'), 'usuario')
+    _renomear_duplicados(apps.get_model('todo', 'Tarefa'), 'user')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0002_tarefa_concluido_alter_tarefa_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lista',
+            index=models.Index(fields=['usuario', 'data_atualizacao'], name='lista_usuario_atualizacao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tarefa',
+            index=models.Index(fields=['lista', 'status', 'dataVencimento'], name='tarefa_lista_status_venc_idx'),
+        ),
+        migrations.RunPython(renomear_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='lista',
+            constraint=models.UniqueConstraint(fields=('usuario', 'titulo'), name='unique_lista_usuario_titulo', violation_error_message='O nome da lista já está em uso'),
+        ),
+        migrations.AddConstraint(
+            model_name='tarefa',
+            constraint=models.UniqueConstraint(fields=('user', 'titulo'), name='unique_tarefa_user_titulo', violation_error_message='O nome da tarefa já está em uso'),
+        ),
+    ]
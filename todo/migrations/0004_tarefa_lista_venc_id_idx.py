@@ -0,0 +1,19 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0003_unique_titulo_indices'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tarefa',
+            index=models.Index(fields=['lista', 'dataVencimento', 'id'], name='tarefa_lista_venc_id_idx'),
+        ),
+    ]
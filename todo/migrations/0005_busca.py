@@ -0,0 +1,101 @@
+from django.db import migrations
+
+# Indice de busca textual nos titulos e descrições de tarefas e listas.
+# SQLite: tabela FTS5 todo_busca mantida por triggers e preenchida com os dados existentes.
+# PostgreSQL: indices GIN sobre o SearchVector das consultas.
+#
+# O SQL e os indices são uma copia congelada do que todo/busca.py tinha quando esta migração foi
+# escrita: mudanças posteriores em busca.py não podem alterar o que uma migração já aplicada fez.
+# A recriação dos triggers no post_migrate continua usando busca.py.
+
+SQLITE_TABELA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS todo_busca USING fts5(
+        dono, titulo, descricao, lista UNINDEXED,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4 5 6 7 8'
+    )""",
+]
+
+SQLITE_GATILHOS = [
+    """CREATE TRIGGER IF NOT EXISTS todo_busca_tarefa_ai AFTER INSERT ON todo_tarefa BEGIN
+        INSERT INTO todo_busca (rowid, dono, titulo, descricao, lista)
+        VALUES (new.id * 2, 'u' || new.user_id, new.titulo, coalesce(new.descricao, ''), new.lista_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS todo_busca_tarefa_au
+    AFTER UPDATE OF titulo, descricao, lista_id, user_id ON todo_tarefa BEGIN
+        UPDATE todo_busca SET dono = 'u' || new.user_id, titulo = new.titulo,
+            descricao = coalesce(new.descricao, ''), lista = new.lista_id
+        WHERE rowid = old.id * 2;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS todo_busca_tarefa_ad AFTER DELETE ON todo_tarefa BEGIN
+        DELETE FROM todo_busca WHERE rowid = old.id * 2;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS todo_busca_lista_ai AFTER INSERT ON todo_lista BEGIN
+        INSERT INTO todo_busca (rowid, dono, titulo, descricao, lista)
+        VALUES (new.id * 2 + 1, 'u' || new.usuario_id, new.titulo, new.descricao, new.id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS todo_busca_lista_au
+    AFTER UPDATE OF titulo, descricao, usuario_id ON todo_lista BEGIN
+        UPDATE todo_busca SET dono = 'u' || new.usuario_id, titulo = new.titulo, descricao = new.descricao
+        WHERE rowid = old.id * 2 + 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS todo_busca_lista_ad AFTER DELETE ON todo_lista BEGIN
+        DELETE FROM todo_busca WHERE rowid = old.id * 2 + 1;
+    END""",
+]
+
+SQLITE_PREENCHER = [
+    """INSERT INTO todo_busca (rowid, dono, titulo, descricao, lista)
+        SELECT id * 2, 'u' || user_id, titulo, coalesce(descricao, ''), lista_id FROM todo_tarefa""",
+    """INSERT INTO todo_busca (rowid, dono, titulo, descricao, lista)
+        SELECT id * 2 + 1, 'u' || usuario_id, titulo, descricao, id FROM todo_lista""",
+]
+
+SQLITE_REMOVER = [
+    'DROP TRIGGER IF EXISTS todo_busca_tarefa_ai',
+    'DROP TRIGGER IF EXISTS todo_busca_tarefa_au',
+    'DROP TRIGGER IF EXISTS todo_busca_tarefa_ad',
+    'DROP TRIGGER IF EXISTS todo_busca_lista_ai',
+    'DROP TRIGGER IF EXISTS todo_busca_lista_au',
+    'DROP TRIGGER IF EXISTS todo_busca_lista_ad',
+    'DROP TABLE IF EXISTS todo_busca',
+]
+
+
+def _indices_postgres():
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+    return [
+        ('Tarefa', GinIndex(SearchVector('titulo', 'descricao', config='portuguese'), name='tarefa_busca_gin')),
+        ('Lista', GinIndex(SearchVector('titulo', 'descricao', config='portuguese'), name='lista_busca_gin')),
+    ]
+
+
+def criar_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for sql in SQLITE_TABELA + SQLITE_GATILHOS + SQLITE_PREENCHER:
+            schema_editor.execute(sql)
+    elif vendor == 'postgresql':
+        for nome, indice in _indices_postgres():
+            schema_editor.add_index(apps.get_model('todo', nome), indice)
+
+
+def remover_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for sql in SQLITE_REMOVER:
+            schema_editor.execute(sql)
+    elif vendor == 'postgresql':
+        for nome, indice in _indices_postgres():
+            schema_editor.remove_index(apps.get_model('todo', nome), indice)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0004_tarefa_lista_venc_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
@@ -0,0 +1,55 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+# Contadores de tarefas na Lista (ver todo/contadores.py), preenchidos com uma consulta
+# agrupada por lista e status.
+# No SQLite o AddField reconstroi a tabela e apaga os triggers da busca, que são recriados
+# pelo post_migrate (garantir_indice_busca).
+
+POR_STATUS = {'pendente': 'pendentes', 'em andamento': 'em_andamento', 'concluido': 'concluidas'}
+
+
+def preencher_contadores(apps, schema_editor):
+    Lista = apps.get_model('todo', 'Lista')
+    Tarefa = apps.get_model('todo', 'Tarefa')
+    contadores = {}
+    for linha in Tarefa.objects.order_by().values('lista_id', 'status').annotate(n=Count('id')):
+        lista = contadores.setdefault(linha['lista_id'], Lista(pk=linha['lista_id'], total_tarefas=0,
+                                                                pendentes=0, em_andamento=0, concluidas=0))
+        lista.total_tarefas += linha['n']
+        if linha['status'] in POR_STATUS:
+            campo = POR_STATUS[linha['status']]
+            setattr(lista, campo, getattr(lista, campo) + linha['n'])
+    Lista.objects.bulk_update(contadores.values(), ['total_tarefas', 'pendentes', 'em_andamento', 'concluidas'],
+                              batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0005_busca'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lista',
+            name='total_tarefas',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='lista',
+            name='pendentes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='lista',
+            name='em_andamento',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='lista',
+            name='concluidas',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(preencher_contadores, migrations.RunPython.noop),
+    ]
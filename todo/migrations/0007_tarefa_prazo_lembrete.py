@@ -0,0 +1,24 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0006_lista_contadores'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tarefa',
+            name='lembrete_vencimento',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='tarefa',
+            index=models.Index(condition=models.Q(('concluido', False)), fields=['dataVencimento'], name='tarefa_abertas_venc_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:34
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0007_tarefa_prazo_lembrete'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Trabalho',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100)),
+                ('argumentos', models.JSONField(default=list)),
+                ('argumentos_nomeados', models.JSONField(default=dict)),
+                ('prioridade', models.SmallIntegerField(default=0)),
+                ('status', models.CharField(choices=[('pendente', 'pendente'), ('executando', 'executando'), ('concluido', 'concluido'), ('falhou', 'falhou')], default='pendente', max_length=20)),
+                ('executar_em', models.DateTimeField(default=django.utils.timezone.now)),
+                ('tentativas', models.PositiveSmallIntegerField(default=0)),
+                ('max_tentativas', models.PositiveSmallIntegerField(default=3)),
+                ('trabalhador', models.CharField(blank=True, default='', max_length=100)),
+                ('erro', models.TextField(blank=True, default='')),
+                ('criado_em', models.DateTimeField(default=django.utils.timezone.now)),
+                ('iniciado_em', models.DateTimeField(blank=True, null=True)),
+                ('concluido_em', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'pendente')), fields=['-prioridade', 'executar_em', 'id'], name='trabalho_fila_idx'), models.Index(condition=models.Q(('status', 'executando')), fields=['iniciado_em'], name='trabalho_executando_idx')],
+            },
+        ),
+    ]
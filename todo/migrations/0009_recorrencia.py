@@ -0,0 +1,48 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:44
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0008_trabalho'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Recorrencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('titulo', models.CharField(max_length=100)),
+                ('descricao', models.CharField(blank=True, max_length=300, null=True)),
+                ('prioridade', models.CharField(choices=[('alta', 'alta'), ('media', 'media'), ('baixa', 'baixa')], max_length=20, null=True)),
+                ('frequencia', models.CharField(choices=[('diaria', 'diaria'), ('semanal', 'semanal'), ('mensal', 'mensal'), ('rrule', 'rrule')], max_length=10)),
+                ('intervalo', models.PositiveSmallIntegerField(default=1)),
+                ('regra', models.CharField(blank=True, default='', max_length=500)),
+                ('inicio', models.DateField()),
+                ('fim', models.DateField(blank=True, null=True)),
+                ('proxima', models.DateField(blank=True, null=True)),
+                ('criada_em', models.DateTimeField(default=django.utils.timezone.now)),
+                ('lista', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recorrencias', to='todo.lista')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recorrencias', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='tarefa',
+            name='recorrencia',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tarefas', to='todo.recorrencia'),
+        ),
+        migrations.AddConstraint(
+            model_name='tarefa',
+            constraint=models.UniqueConstraint(fields=('recorrencia', 'dataVencimento'), name='unique_tarefa_recorrencia_venc'),
+        ),
+        migrations.AddIndex(
+            model_name='recorrencia',
+            index=models.Index(condition=models.Q(('proxima__isnull', False)), fields=['proxima', 'id'], name='recorrencia_proxima_idx'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0009_recorrencia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tarefa',
+            index=models.Index(fields=['user', 'dataVencimento', 'concluido'], name='tarefa_user_venc_idx'),
+        ),
+    ]
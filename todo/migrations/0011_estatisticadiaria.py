@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0010_tarefa_user_venc'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstatisticaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('concluidas', models.IntegerField(default=0)),
+                ('concluidas_atrasadas', models.IntegerField(default=0)),
+                ('dias_ate_concluir', models.IntegerField(default=0)),
+                ('alta', models.IntegerField(default=0)),
+                ('media', models.IntegerField(default=0)),
+                ('baixa', models.IntegerField(default=0)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='estatisticas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('usuario', 'dia'), name='unique_estatistica_usuario_dia')],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+import string
+
+from django.db import migrations, models
+from django.db.models import F
+
+# Ordem manual das tarefas (ver todo/posicoes.py). As tarefas existentes recebem chaves
+# espaçadas igualmente na ordem que o get_list mostrava, (dataVencimento, id). Os ids de cada
+# lista são lidos inteiros antes de gravar (no SQLite as consultas da mesma conexão não são
+# isoladas, então não se escreve na tabela enquanto um iterator ainda lê dela), em lotes de 500.
+# Como em 0006, no SQLite os triggers da busca são recriados pelo post_migrate.
+#
+# _codificar é uma copia congelada de todo.posicoes._codificar (e de LARGURA/ESPACO): como em
+# 0005, a migração não importa o codigo do app, para uma mudança futura nele não alterar o que
+# ela grava.
+
+DIGITOS = string.digits + string.ascii_lowercase
+LARGURA = 6
+ESPACO = len(DIGITOS) ** LARGURA
+
+
+def _codificar(numero):
+    digitos = []
+    for _ in range(LARGURA):
+        numero, digito = divmod(numero, len(DIGITOS))
+        digitos.append(DIGITOS[digito])
+    return ''.join(reversed(digitos)).rstrip('0')
+
+
+def preencher_posicoes(apps, schema_editor):
+    Tarefa = apps.get_model('todo', 'Tarefa')
+    lista_ids = list(Tarefa.objects.order_by('lista_id').values_list('lista_id', flat=True).distinct())
+    for lista_id in lista_ids:
+        ids = list(Tarefa.objects.filter(lista_id=lista_id)
+                   .order_by(F('dataVencimento').asc(nulls_first=True), 'id').values_list('id', flat=True))
+        passo = max(1, ESPACO // 2 // (len(ids) + 1))
+        Tarefa.objects.bulk_update([Tarefa(pk=pk, posicao=_codificar(passo * (indice + 1)))
+                                    for indice, pk in enumerate(ids)], ['posicao'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todo', '0011_estatisticadiaria'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tarefa',
+            name='posicao',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.RunPython(preencher_posicoes, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='tarefa',
+            index=models.Index(fields=['lista', 'posicao', 'id'], name='tarefa_lista_posicao_idx'),
+        ),
+    ]
@@ -1,10 +1,24 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, transaction, IntegrityError
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 import datetime
 #VALIDATORS(só pode salvar a tarefa se não existir outra tarefa com o mesmo titulo feita pelo mesmo usuario, a mesma coisa pras listas)
 
+# Campos de Lista que só mudam por F() (ver todo/contadores.py).
+CONTADORES = ('total_tarefas', 'pendentes', 'em_andamento', 'concluidas')
+
+
+def _relacoes_carregadas(objeto):
+    """
+    Chaves estrangeiras com o objeto relacionado já carregado (ex.: request.user, a lista da view).
+    O full_clean não precisa consultar o banco para saber se eles existem.
+    """
+    return [campo.name for campo in objeto._meta.concrete_fields
+            if campo.is_relation and campo.is_cached(objeto) and getattr(objeto, campo.name) is not None
+            and getattr(objeto, campo.name).pk == getattr(objeto, campo.attname)]
+
 class Lista(models.Model):
     # Referência ao usuário dono da lista.
     usuario = models.ForeignKey(User, models.CASCADE, related_name='lista')
@@ -16,6 +30,22 @@ class Lista(models.Model):
     data_criacao = models.DateTimeField('date published', null=False)
     # Data da última atualização da lista.
     data_atualizacao = models.DateTimeField('date update', null=False)
+    # Contadores das tarefas da lista, mantidos com F() a cada alteração (ver todo/contadores.py).
+    total_tarefas = models.IntegerField(default=0)
+    pendentes = models.IntegerField(default=0)
+    em_andamento = models.IntegerField(default=0)
+    concluidas = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Garante no banco que o mesmo usuario não tenha duas listas com o mesmo titulo.
+            models.UniqueConstraint(fields=['usuario', 'titulo'], name='unique_lista_usuario_titulo',
+                                    violation_error_message='O nome da lista já está em uso'),
+        ]
+        indexes = [
+            # Usado pelo index para listar as listas do usuario pela ultima atualização.
+            models.Index(fields=['usuario', 'data_atualizacao'], name='lista_usuario_atualizacao_idx'),
+        ]
 
     def __str__(self):
         """
@@ -29,21 +59,73 @@ class Lista(models.Model):
         Levanta um ValidationError se a condição for violada.
         """
         super().clean()
-        try:
-             Lista.objects.exclude(pk=self.pk).get(titulo=self.titulo, usuario=self.usuario)
-        except:
-            pass
-        else:
+        # Uma unica consulta coberta pelo indice da constraint unique_lista_usuario_titulo.
+        if self.usuario_id is not None and Lista.objects.exclude(pk=self.pk).filter(
+                titulo=self.titulo, usuario_id=self.usuario_id).exists():
             raise ValidationError('O nome da lista já está em uso')
 
     def save(self, *args, **kwargs):
         """
         Salva o objeto Lista no banco de dados após realizar as validações definidas em clean.
+        A constraint não é validada de novo aqui, o banco garante a unicidade e um IntegrityError
+        (titulo salvo por outra requisição ao mesmo tempo) vira ValidationError.
         """
-        self.full_clean()
-        super().save(*args, **kwargs)
+        self.full_clean(exclude=_relacoes_carregadas(self), validate_constraints=False)
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            # Os contadores são alterados só com F(); um save de uma lista carregada antes
+            # gravaria de volta valores antigos
+            kwargs['update_fields'] = [campo.name for campo in self._meta.concrete_fields
+                                       if not campo.primary_key and campo.name not in CONTADORES]
+        try:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+        except IntegrityError:
+            if Lista.objects.exclude(pk=self.pk).filter(titulo=self.titulo, usuario_id=self.usuario_id).exists():
+                raise ValidationError('O nome da lista já está em uso')
+            raise
 
     
+def em_breve(dias=None, hoje=None):
+    """
+    Primeiro e ultimo dia do prazo "vence em breve": de hoje até daqui a `dias` dias (padrão:
+    TODO_LEMBRETE_DIAS). Usado pelo is_due_soon, pelo queryset e pelos lembretes, que assim concordam.
+    """
+    if dias is None:
+        dias = getattr(settings, 'TODO_LEMBRETE_DIAS', 1)
+    hoje = hoje or datetime.date.today()
+    return hoje, hoje + datetime.timedelta(days=dias)
+
+
+class TarefaQuerySet(models.QuerySet):
+    """
+    Filtros e anotações de prazo. As tarefas abertas (concluido=False) são as cobertas pelo
+    indice parcial tarefa_abertas_venc_idx, então os filtros por vencimento partem delas.
+    """
+
+    def abertas(self):
+        return self.filter(concluido=False)
+
+    def atrasadas(self, hoje=None):
+        """ Tarefas não concluidas com o vencimento antes de hoje """
+        return self.abertas().filter(dataVencimento__lt=hoje or datetime.date.today())
+
+    def vencendo(self, dias=None, hoje=None):
+        """ Tarefas não concluidas que vencem de hoje até daqui a `dias` dias (padrão: TODO_LEMBRETE_DIAS) """
+        return self.abertas().filter(dataVencimento__range=em_breve(dias, hoje))
+
+    def com_prazo(self, dias=None, hoje=None):
+        """ Anota atrasada e vence_em_breve, para filtrar ou ordenar pelo prazo no banco """
+        hoje = hoje or datetime.date.today()
+        aberta = models.Q(concluido=False)
+        return self.annotate(
+            atrasada=models.ExpressionWrapper(aberta & models.Q(dataVencimento__lt=hoje),
+                                              output_field=models.BooleanField()),
+            vence_em_breve=models.ExpressionWrapper(
+                aberta & models.Q(dataVencimento__range=em_breve(dias, hoje)),
+                output_field=models.BooleanField()),
+        )
+
+
 class Tarefa(models.Model):
     # Opções para o status da tarefa.
     STATUS = (
@@ -71,6 +153,67 @@ class Tarefa(models.Model):
     lista = models.ForeignKey(Lista, on_delete=models.CASCADE, null=False)
     # Referência ao usuário dono da tarefa.
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=False)
+    # Vencimento para o qual o lembrete já foi enviado (se o vencimento mudar, um novo lembrete sai).
+    lembrete_vencimento = models.DateField(null=True, blank=True, editable=False)
+    # Serie da qual a tarefa é uma ocorrencia (ver todo/recorrencias.py).
+    recorrencia = models.ForeignKey('Recorrencia', on_delete=models.SET_NULL, null=True, blank=True,
+                                    related_name='tarefas', editable=False)
+    # Chave da ordem manual dentro da lista (ver todo/posicoes.py); as novas vão para o fim.
+    posicao = models.CharField(max_length=64, blank=True, default='', editable=False)
+
+    objects = TarefaQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # Garante no banco que o mesmo usuario não tenha duas tarefas com o mesmo titulo.
+            models.UniqueConstraint(fields=['user', 'titulo'], name='unique_tarefa_user_titulo',
+                                    violation_error_message='O nome da tarefa já está em uso'),
+            # Uma ocorrencia por data em cada serie; torna a geração das ocorrencias idempotente.
+            models.UniqueConstraint(fields=['recorrencia', 'dataVencimento'], name='unique_tarefa_recorrencia_venc'),
+        ]
+        indexes = [
+            # Usado para filtrar as tarefas de uma lista por status e vencimento.
+            models.Index(fields=['lista', 'status', 'dataVencimento'], name='tarefa_lista_status_venc_idx'),
+            # Tarefas de uma lista por (dataVencimento, id), como na API com ?lista=.
+            models.Index(fields=['lista', 'dataVencimento', 'id'], name='tarefa_lista_venc_id_idx'),
+            # Ordem manual do get_list, (posicao, id), e a maior chave da lista para as novas tarefas.
+            models.Index(fields=['lista', 'posicao', 'id'], name='tarefa_lista_posicao_idx'),
+            # Só as tarefas abertas: varredura dos lembretes e das atrasadas por faixa de vencimento.
+            models.Index(fields=['dataVencimento'], condition=models.Q(concluido=False),
+                         name='tarefa_abertas_venc_idx'),
+            # Janela de datas do calendario, com todas as listas do usuario; com concluido, as
+            # contagens por dia do mapa de calor não precisam ler a tabela.
+            models.Index(fields=['user', 'dataVencimento', 'concluido'], name='tarefa_user_venc_idx'),
+        ]
+
+    # Status, lista, data de conclusão e vencimento lidos do banco (None se a tarefa não veio do
+    # banco ou o campo foi adiado com only/defer). Usados pelos signals das metricas, dos
+    # contadores da lista e das estatisticas, e pelo clean para o vencimento.
+    _status_original = None
+    _lista_original = None
+    _conclusao_original = None
+    _vencimento_original = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._status_original = instance.__dict__.get('status')
+        instance._lista_original = instance.__dict__.get('lista_id')
+        instance._conclusao_original = instance.__dict__.get('dataConclusao')
+        instance._vencimento_original = instance.__dict__.get('dataVencimento')
+        return instance
+
+    @property
+    def is_overdue(self):
+        """ Indica se a tarefa não foi concluida e o vencimento já passou """
+        return not self.concluido and self.dataVencimento is not None and self.dataVencimento < datetime.date.today()
+
+    @property
+    def is_due_soon(self):
+        """ Indica se a tarefa não foi concluida e vence nos proximos TODO_LEMBRETE_DIAS dias """
+        inicio, fim = em_breve()
+        return not self.concluido and self.dataVencimento is not None and inicio <= self.dataVencimento <= fim
+
     def __str__(self):
         """
         Retorna uma representação em string do objeto Tarefa, combinando o título da tarefa com o título da lista associada.
@@ -83,22 +226,144 @@ class Tarefa(models.Model):
         Levanta um ValidationError se a condição for violada.
         """
         super().clean()
-        try:
-            Tarefa.objects.exclude(pk=self.pk).get(titulo=self.titulo, user=self.user)
-        except:
-            pass
-        else:
+        # Uma unica consulta coberta pelo indice da constraint unique_tarefa_user_titulo.
+        if self.user_id is not None and Tarefa.objects.exclude(pk=self.pk).filter(
+                titulo=self.titulo, user_id=self.user_id).exists():
             raise ValidationError('O nome da tarefa já está em uso')
-        
-        if self.dataVencimento<datetime.date.today():
+
+        # Só um vencimento novo precisa ser futuro: uma tarefa que já venceu (ex.: uma ocorrencia
+        # atrasada) ainda pode ser editada e concluida
+        vencimento_alterado = self._state.adding or self.dataVencimento != self._vencimento_original
+        if (self.dataVencimento is not None and vencimento_alterado
+                and self.dataVencimento < datetime.date.today()):
             raise ValidationError('Informe uma data de vencimento válida')
         
     def save(self, *args, **kwargs):
         """
         Salva o objeto Tarefa no banco de dados após realizar as validações definidas em clean.
+        Assim como em Lista, a unicidade do titulo fica a cargo da constraint do banco.
+        Tarefas novas ou que mudaram de lista vão para o fim da lista.
         """
-        self.full_clean()
-        super().save(*args, **kwargs)
+        from . import posicoes
+        self.full_clean(exclude=_relacoes_carregadas(self), validate_constraints=False)
+        try:
+            with transaction.atomic():
+                if not self.posicao or (self._lista_original is not None and self._lista_original != self.lista_id):
+                    posicoes.no_fim([self])
+                super().save(*args, **kwargs)
+        except IntegrityError:
+            if Tarefa.objects.exclude(pk=self.pk).filter(titulo=self.titulo, user_id=self.user_id).exists():
+                raise ValidationError('O nome da tarefa já está em uso')
+            raise
+        # Depois dos signals do post_save, o que foi salvo passa a ser o original
+        self._status_original, self._lista_original = self.status, self.lista_id
+        self._conclusao_original, self._vencimento_original = self.dataConclusao, self.dataVencimento
+
+
+
+class Recorrencia(models.Model):
+    """ Serie de uma tarefa que se repete; as ocorrencias são tarefas geradas por todo/recorrencias.py """
+    FREQUENCIA = (('diaria', 'diaria'), ('semanal', 'semanal'), ('mensal', 'mensal'), ('rrule', 'rrule'))
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recorrencias')
+    lista = models.ForeignKey(Lista, on_delete=models.CASCADE, related_name='recorrencias')
+    # Modelo das ocorrencias: o titulo de cada uma recebe a data como sufixo.
+    titulo = models.CharField(max_length=100)
+    descricao = models.CharField(max_length=300, null=True, blank=True)
+    prioridade = models.CharField(max_length=20, choices=Tarefa.PRIORIDADE, null=True)
+    frequencia = models.CharField(max_length=10, choices=FREQUENCIA)
+    # A cada quantos dias, semanas ou meses.
+    intervalo = models.PositiveSmallIntegerField(default=1)
+    # Regra RRULE (RFC 5545), só com frequencia rrule; precisa do python-dateutil.
+    regra = models.CharField(max_length=500, blank=True, default='')
+    # Data da primeira ocorrencia e, se houver, a ultima data possivel.
+    inicio = models.DateField()
+    fim = models.DateField(null=True, blank=True)
+    # Primeira data ainda sem tarefa; None quando a serie terminou.
+    proxima = models.DateField(null=True, blank=True)
+    criada_em = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Series com ocorrencias a gerar, na ordem da varredura do materializador.
+            models.Index(fields=['proxima', 'id'], condition=models.Q(proxima__isnull=False),
+                         name='recorrencia_proxima_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.titulo} ({self.frequencia})'
+
+    def clean(self):
+        super().clean()
+        from . import recorrencias
+        if self.intervalo < 1:
+            raise ValidationError('O intervalo precisa ser de pelo menos 1')
+        if self.fim is not None and self.fim < self.inicio:
+            raise ValidationError('A recorrencia termina antes de começar')
+        if self.frequencia == 'rrule':
+            recorrencias.validar_regra(self.regra, self.inicio)
+
+
+class Trabalho(models.Model):
+    """ Um trabalho da fila em segundo plano (ver todo/fila.py) """
+    STATUS = (
+        ('pendente', 'pendente'), ('executando', 'executando'), ('concluido', 'concluido'), ('falhou', 'falhou')
+        )
+    # Nome com que a função foi registrada em fila.trabalho.
+    nome = models.CharField(max_length=100)
+    # Argumentos posicionais e nomeados da função, em JSON.
+    argumentos = models.JSONField(default=list)
+    argumentos_nomeados = models.JSONField(default=dict)
+    # Maior prioridade sai primeiro; na mesma prioridade, o mais antigo.
+    prioridade = models.SmallIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS, default='pendente')
+    # Não sai da fila antes disso (agendamento e espera entre tentativas).
+    executar_em = models.DateTimeField(default=timezone.now)
+    tentativas = models.PositiveSmallIntegerField(default=0)
+    max_tentativas = models.PositiveSmallIntegerField(default=3)
+    # Identifica quem pegou o trabalho (processo, thread e lote).
+    trabalhador = models.CharField(max_length=100, blank=True, default='')
+    erro = models.TextField(blank=True, default='')
+    criado_em = models.DateTimeField(default=timezone.now)
+    iniciado_em = models.DateTimeField(null=True, blank=True)
+    concluido_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Só os pendentes, na ordem em que a fila os entrega.
+            models.Index(fields=['-prioridade', 'executar_em', 'id'], condition=models.Q(status='pendente'),
+                         name='trabalho_fila_idx'),
+            # Trabalhos presos em executando de um trabalhador que morreu.
+            models.Index(fields=['iniciado_em'], condition=models.Q(status='executando'),
+                         name='trabalho_executando_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.nome}#{self.pk} ({self.status})'
+
+
+class EstatisticaDiaria(models.Model):
+    """ Tarefas concluidas por um usuario num dia, somadas aos poucos (ver todo/estatisticas.py) """
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='estatisticas')
+    # Dia da conclusão (dataConclusao das tarefas).
+    dia = models.DateField()
+    concluidas = models.IntegerField(default=0)
+    # Concluidas depois do vencimento.
+    concluidas_atrasadas = models.IntegerField(default=0)
+    # Soma dos dias entre dataCriacao e dataConclusao, para a media.
+    dias_ate_concluir = models.IntegerField(default=0)
+    # Concluidas por prioridade (as sem prioridade são o que falta para concluidas).
+    alta = models.IntegerField(default=0)
+    media = models.IntegerField(default=0)
+    baixa = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Uma linha por usuario e dia; o indice da constraint atende as consultas por periodo.
+            models.UniqueConstraint(fields=['usuario', 'dia'], name='unique_estatistica_usuario_dia'),
+        ]
+
+    def __str__(self):
+        return f'{self.usuario_id} {self.dia}: {self.concluidas}'
 
 
 # Comandos SQL para testes CRUD na base de dados:
@@ -0,0 +1,82 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import F, Q
+
+# Paginação por keyset (cursor): cada pagina continua a partir da ultima linha da pagina anterior,
+# usando (campo, id) como chave de ordenação. Diferente de OFFSET, o custo de buscar uma pagina
+# não cresce com o tamanho da lista, desde que exista um indice em (lista, campo, id).
+
+SALT = 'todo.paginacao'
+
+Pagina = namedtuple('Pagina', ['itens', 'proximo'])
+
+
+def tamanho_pagina(valor=None):
+    """ Retorna o tamanho de pagina pedido, limitado entre 1 e settings.TODO_PAGE_SIZE_MAX """
+    padrao = getattr(settings, 'TODO_PAGE_SIZE', 50)
+    maximo = getattr(settings, 'TODO_PAGE_SIZE_MAX', 200)
+    try:
+        valor = int(valor)
+    except (TypeError, ValueError):
+        return padrao
+    return max(1, min(valor, maximo))
+
+
+def codificar_cursor(objeto, campo):
+    """ Gera o token assinado que aponta para depois do objeto informado """
+    valor = getattr(objeto, campo)
+    if valor is not None:
+        valor = objeto._meta.get_field(campo).value_to_string(objeto)
+    return signing.dumps([valor, objeto.pk], salt=SALT, compress=True)
+
+
+def decodificar_cursor(token, model, campo):
+    """ Le um token gerado por codificar_cursor, retorna None se ele for inválido """
+    try:
+        valor, pk = signing.loads(token, salt=SALT)
+        if valor is not None:
+            valor = model._meta.get_field(campo).to_python(valor)
+        return valor, int(pk)
+    except Exception:
+        return None
+
+
+def _consulta(queryset, campo, cursor, tamanho):
+    """ Monta a consulta de uma pagina, buscando uma linha a mais para saber se existe a proxima """
+    # NULLS FIRST só nos campos que aceitam nulo; nos outros a ordem fica a mesma do indice
+    nulo = queryset.model._meta.get_field(campo).null
+    queryset = queryset.order_by(F(campo).asc(nulls_first=True) if nulo else F(campo).asc(), 'pk')
+    posicao = decodificar_cursor(cursor, queryset.model, campo) if cursor else None
+    if posicao is not None:
+        valor, pk = posicao
+        if valor is None:
+            queryset = queryset.filter(Q(**{f'{campo}__isnull': True, 'pk__gt': pk}) |
+                                       Q(**{f'{campo}__isnull': False}))
+        else:
+            queryset = queryset.filter(Q(**{f'{campo}__gt': valor}) | Q(**{campo: valor, 'pk__gt': pk}))
+    return queryset[:tamanho + 1]
+
+
+def _pagina(itens, campo, tamanho):
+    proximo = None
+    if len(itens) > tamanho:
+        itens = itens[:tamanho]
+        proximo = codificar_cursor(itens[-1], campo)
+    return Pagina(itens, proximo)
+
+
+def paginar(queryset, campo, cursor=None, tamanho=None):
+    """
+    Retorna uma Pagina com os itens do queryset ordenados por (campo, id) depois do cursor informado
+    e o cursor da proxima pagina (None quando for a ultima). Valores nulos de campo vêm primeiro.
+    """
+    tamanho = tamanho_pagina(tamanho)
+    return _pagina(list(_consulta(queryset, campo, cursor, tamanho)), campo, tamanho)
+
+
+async def apaginar(queryset, campo, cursor=None, tamanho=None):
+    """ Versão assincrona de paginar(), para as views async """
+    tamanho = tamanho_pagina(tamanho)
+    return _pagina([item async for item in _consulta(queryset, campo, cursor, tamanho)], campo, tamanho)
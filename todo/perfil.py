@@ -0,0 +1,240 @@
+import contextvars
+import cProfile
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import threading
+import time
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template
+
+from .metricas import nome_rota
+
+# Perfil das requisições em produção, ligado por amostragem.
+# Numa requisição amostrada o PerfilMiddleware mede o tempo total, as consultas SQL (quantidade e
+# tempo, com o wrapper contar_consulta de cada conexão), o tempo de renderização de cada template e, se
+# TODO_PERFIL_CPROFILE estiver ligado, as funções mais caras com cProfile. Cada requisição vira
+# uma linha JSON no logger 'todo.perfil' (arquivo rotativo em settings.LOGGING) e entra no
+# resumo por rota mostrado na pagina de perfil, só para staff.
+#
+# TODO_PERFIL_AMOSTRA: fração das requisições amostradas (0 desliga, 1 amostra todas)
+# TODO_PERFIL_CPROFILE: roda o cProfile nas requisições amostradas (mais caro, só no caminho sincrono)
+# Usuarios staff podem forçar a amostragem de uma requisição com ?_perfil=1
+
+logger = logging.getLogger('todo.perfil')
+
+# Coleta da requisição atual, None fora de uma requisição amostrada
+_coleta = contextvars.ContextVar('todo_perfil_coleta', default=None)
+
+# Quantas medições de tempo por rota são guardadas para os percentis
+AMOSTRAS_POR_ROTA = 1000
+
+# Só um cProfile pode estar ativo por vez no processo; requisições concorrentes ficam sem ele
+_trava_cprofile = threading.Lock()
+
+
+def forcado(request):
+    """ Diz se a requisição pede para ser medida com ?_perfil=1 """
+    return request.GET.get('_perfil') == '1'
+
+
+def amostrar(request, usuario=None):
+    """ Decide se a requisição será medida. usuario substitui request.user no caminho async """
+    if forcado(request):
+        usuario = usuario or getattr(request, 'user', None)
+        return bool(usuario is not None and usuario.is_staff)
+    taxa = getattr(settings, 'TODO_PERFIL_AMOSTRA', 0)
+    return taxa > 0 and random.random() < taxa
+
+
+def usar_cprofile():
+    return getattr(settings, 'TODO_PERFIL_CPROFILE', False)
+
+
+class Coleta:
+    """ Medições de uma requisição """
+
+    def __init__(self):
+        self.consultas = 0
+        self.tempo_sql = 0.0
+        self.templates = defaultdict(float)
+
+    def executar(self, execute, sql, params, many, context):
+        """ Conta e cronometra uma consulta da requisição """
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tempo_sql += time.perf_counter() - inicio
+            self.consultas += 1
+
+    def __enter__(self):
+        self._token = _coleta.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        _coleta.reset(self._token)
+
+
+def contar_consulta(execute, sql, params, many, context):
+    """
+    Wrapper instalado em toda conexão nova (signal connection_created). A coleta vem do
+    ContextVar, que o sync_to_async copia para a thread onde o ORM async roda as consultas;
+    um wrapper posto só nas conexões da thread do event loop não veria nenhuma delas.
+    """
+    coleta = _coleta.get()
+    if coleta is None:
+        return execute(sql, params, many, context)
+    return coleta.executar(execute, sql, params, many, context)
+
+
+class TemplateComPerfil(Template):
+    """ Template que soma o tempo de render na coleta da requisição amostrada """
+
+    def render(self, context=None, request=None):
+        coleta = _coleta.get()
+        if coleta is None:
+            return super().render(context, request)
+        inicio = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            coleta.templates[self.template.name or '<string>'] += time.perf_counter() - inicio
+
+
+class TemplatesComPerfil(DjangoTemplates):
+    """ Backend DjangoTemplates que mede os templates renderizados pelas views (render, TemplateResponse) """
+
+    def from_string(self, template_code):
+        return TemplateComPerfil(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TemplateComPerfil(template.template, self)
+
+
+class Resumo:
+    """ Resumo por rota das requisições amostradas neste processo """
+
+    def __init__(self):
+        self._trava = threading.Lock()
+        self.limpar()
+
+    def limpar(self):
+        with self._trava:
+            self.inicio = time.time()
+            self.rotas = {}
+
+    def registrar(self, rota, medicao, perfil=None):
+        with self._trava:
+            dados = self.rotas.get(rota)
+            if dados is None:
+                dados = self.rotas[rota] = {
+                    'requisicoes': 0, 'tempos': deque(maxlen=AMOSTRAS_POR_ROTA), 'maximo_ms': 0.0, 'total_ms': 0.0,
+                    'consultas': 0, 'sql_ms': 0.0, 'templates': defaultdict(float), 'perfil': None,
+                }
+            dados['requisicoes'] += 1
+            dados['tempos'].append(medicao['tempo_ms'])
+            dados['maximo_ms'] = max(dados['maximo_ms'], medicao['tempo_ms'])
+            dados['total_ms'] += medicao['tempo_ms']
+            dados['consultas'] += medicao['consultas']
+            dados['sql_ms'] += medicao['sql_ms']
+            for nome, ms in medicao['templates'].items():
+                dados['templates'][nome] += ms
+            if perfil is not None:
+                if dados['perfil'] is None:
+                    dados['perfil'] = pstats.Stats(perfil)
+                else:
+                    dados['perfil'].add(perfil)
+
+    def relatorio(self, funcoes=15):
+        """ Dados agregados por rota, ordenados pelo tempo total gasto """
+        with self._trava:
+            rotas = []
+            for rota, dados in self.rotas.items():
+                tempos = sorted(dados['tempos'])
+                n = dados['requisicoes']
+                rotas.append({
+                    'rota': rota,
+                    'requisicoes': n,
+                    'p50_ms': round(tempos[len(tempos) // 2], 2),
+                    'p95_ms': round(tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))], 2),
+                    'maximo_ms': round(dados['maximo_ms'], 2),
+                    'total_ms': round(dados['total_ms'], 2),
+                    'consultas_media': round(dados['consultas'] / n, 2),
+                    'sql_media_ms': round(dados['sql_ms'] / n, 2),
+                    'templates_media_ms': {nome: round(ms / n, 2) for nome, ms in dados['templates'].items()},
+                    'perfil': _texto_perfil(dados['perfil'], funcoes),
+                })
+        rotas.sort(key=lambda r: r['total_ms'], reverse=True)
+        return {'pid': os.getpid(), 'desde': self.inicio, 'rotas': rotas}
+
+
+def _texto_perfil(estatisticas, funcoes):
+    if estatisticas is None:
+        return ''
+    saida = io.StringIO()
+    estatisticas.stream = saida
+    estatisticas.sort_stats('cumulative').print_stats(funcoes)
+    return saida.getvalue()
+
+
+resumo = Resumo()
+
+
+def finalizar(request, response, coleta, inicio, perfil=None):
+    """ Registra a medição no resumo e no log """
+    medicao = {
+        'rota': nome_rota(request),
+        'metodo': request.method,
+        'status': response.status_code,
+        'tempo_ms': round((time.perf_counter() - inicio) * 1000, 3),
+        'consultas': coleta.consultas,
+        'sql_ms': round(coleta.tempo_sql * 1000, 3),
+        'templates': {nome: round(s * 1000, 3) for nome, s in coleta.templates.items()},
+    }
+    if perfil is not None:
+        estatisticas = pstats.Stats(perfil)
+        medicao['funcoes'] = [
+            {'funcao': f'{arquivo}:{linha}({nome})', 'cumulativo_ms': round(dados[3] * 1000, 3)}
+            for (arquivo, linha, nome), dados in sorted(estatisticas.stats.items(), key=lambda item: -item[1][3])[:5]
+        ]
+    resumo.registrar(medicao['rota'], medicao, perfil)
+    logger.info(json.dumps(medicao))
+    return medicao
+
+
+def medir(request, get_response):
+    """ Executa get_response medindo a requisição, usado pelo caminho sincrono do middleware """
+    inicio = time.perf_counter()
+    perfil = None
+    if usar_cprofile() and _trava_cprofile.acquire(blocking=False):
+        perfil = cProfile.Profile()
+    try:
+        with Coleta() as coleta:
+            if perfil is not None:
+                perfil.enable()
+            try:
+                response = get_response(request)
+            finally:
+                if perfil is not None:
+                    perfil.disable()
+    finally:
+        if perfil is not None:
+            _trava_cprofile.release()
+    finalizar(request, response, coleta, inicio, perfil)
+    return response
+
+
+async def amedir(request, get_response):
+    """ Versão assincrona de medir(), sem cProfile (ele só enxergaria a thread do event loop) """
+    inicio = time.perf_counter()
+    with Coleta() as coleta:
+        response = await get_response(request)
+    finalizar(request, response, coleta, inicio)
+    return response
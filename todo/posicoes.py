@@ -0,0 +1,212 @@
+import string
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+from django.utils import timezone
+
+from .cache import invalidar
+from .models import Lista, Tarefa, Trabalho
+
+# Ordem manual das tarefas de uma lista (arrastar e soltar no get_list), guardada em
+# Tarefa.posicao como uma chave fracionaria: um numero entre 0 e 1 escrito em base 36
+# ('0'-'9' e 'a'-'z', sem o "0." e sem zeros no fim). A ordem das chaves como texto é a ordem
+# dos numeros, então o get_list ordena por (posicao, id) pelo indice (lista, posicao, id).
+#
+# Mover uma tarefa grava só a linha dela: a nova chave fica entre a da tarefa de cima e a da
+# de baixo (entre()), as outras não mudam. Cada inserção no mesmo lugar aumenta a chave; quando
+# uma chave passa de TODO_POSICAO_LIMITE caracteres, o trabalho rebalancear_posicoes reescreve
+# as chaves da lista espaçadas igualmente, na mesma ordem. Se duas tarefas vizinhas tiverem a
+# mesma chave ou a nova chave não couber no campo, o rebalanceamento é feito na hora.
+#
+# Tarefas novas vão para o fim da lista (no_fim()): save() pelo Tarefa.save, bulk_create
+# (importação, recorrencias, gerar_dados) por quem faz a operação, uma consulta por chamada.
+
+DIGITOS = string.digits + string.ascii_lowercase
+
+BASE = len(DIGITOS)
+
+# As chaves das tarefas novas e as do rebalanceamento usam LARGURA digitos, e as do fim da
+# lista andam PASSO de cada vez: 46656 tarefas no fim antes de a chave crescer.
+LARGURA = 6
+ESPACO = BASE ** LARGURA
+PASSO = BASE ** 3
+
+# Tarefas por UPDATE no rebalanceamento.
+TAMANHO_CONSULTA = 500
+
+
+def limite():
+    return getattr(settings, 'TODO_POSICAO_LIMITE', 16)
+
+
+def _codificar(numero):
+    """ Chave de LARGURA digitos do numero (entre 1 e ESPACO - 1), sem os zeros do fim """
+    digitos = []
+    for _ in range(LARGURA):
+        numero, digito = divmod(numero, BASE)
+        digitos.append(DIGITOS[digito])
+    return ''.join(reversed(digitos)).rstrip('0')
+
+
+def _numero(chave):
+    """ Os primeiros LARGURA digitos da chave como inteiro (arredondado para baixo) """
+    return int(chave[:LARGURA].ljust(LARGURA, '0'), BASE)
+
+
+def _meio(a, b):
+    """ Chave entre a ('' é o inicio) e b (None é o fim), a < b """
+    if b is not None:
+        # Prefixo comum (o fim de a conta como zeros)
+        comum = 0
+        while comum < len(b) and (a[comum] if comum < len(a) else '0') == b[comum]:
+            comum += 1
+        if comum:
+            return b[:comum] + _meio(a[comum:], b[comum:])
+    digito_a = DIGITOS.index(a[0]) if a else 0
+    digito_b = DIGITOS.index(b[0]) if b is not None else BASE
+    if digito_b - digito_a > 1:
+        return DIGITOS[(digito_a + digito_b) // 2]
+    if b is not None and len(b) > 1:
+        return b[0]
+    return DIGITOS[digito_a] + _meio(a[1:], None)
+
+
+def entre(a=None, b=None):
+    """
+    Chave entre as chaves a e b (None: inicio ou fim da lista). Antes da primeira e depois
+    da ultima, anda PASSO enquanto couber em LARGURA digitos; no meio, a chave mais curta.
+    """
+    a = a or ''
+    if b is not None and a >= b:
+        raise ValueError(f'A chave {a!r} precisa ser menor que {b!r}')
+    if b is None and _numero(a) + PASSO < ESPACO:
+        return _codificar(_numero(a) + PASSO)
+    if not a and b is not None and _numero(b) > PASSO:
+        return _codificar(_numero(b) - PASSO)
+    return _meio(a, b)
+
+
+def seguintes(ultima, quantidade):
+    """ `quantidade` chaves em ordem depois da chave ultima (None: lista vazia) """
+    chaves = []
+    for _ in range(quantidade):
+        ultima = entre(ultima, None)
+        chaves.append(ultima)
+    return chaves
+
+
+def espacadas(quantidade):
+    """ `quantidade` chaves igualmente espaçadas na primeira metade do espaço, para sobrar lugar no fim """
+    passo = max(1, ESPACO // 2 // (quantidade + 1))
+    return [_codificar(passo * (indice + 1)) for indice in range(quantidade)]
+
+
+def ultimas(lista_ids):
+    """
+    {lista_id: maior chave} das listas, numa consulta. Uma subconsulta por lista com ORDER BY
+    posicao DESC LIMIT 1 lê só a ultima entrada do indice; o MAX() com GROUP BY percorreria a lista.
+    """
+    ultima = Tarefa.objects.filter(lista_id=OuterRef('pk')).order_by('-posicao').values('posicao')[:1]
+    return dict(Lista.objects.filter(pk__in=lista_ids).annotate(ultima=Subquery(ultima))
+                .values_list('pk', 'ultima'))
+
+
+def no_fim(tarefas):
+    """ Dá às tarefas (ainda não salvas) chaves no fim das suas listas, na ordem em que vieram. Uma consulta """
+    por_lista = defaultdict(list)
+    for tarefa in tarefas:
+        por_lista[tarefa.lista_id].append(tarefa)
+    if not por_lista:
+        return
+    maiores = ultimas(por_lista)
+    for lista_id, da_lista in por_lista.items():
+        for tarefa, chave in zip(da_lista, seguintes(maiores.get(lista_id), len(da_lista))):
+            tarefa.posicao = chave
+
+
+def _nova_chave(tarefa, anterior):
+    """
+    Chave para a tarefa logo depois de anterior (None: no topo da lista), ou None se não houver
+    lugar: a proxima tarefa tem a mesma chave de anterior ou a chave não cabe no campo.
+    """
+    seguintes_ = Tarefa.objects.filter(lista_id=tarefa.lista_id).exclude(pk=tarefa.pk)
+    if anterior is not None:
+        seguintes_ = seguintes_.filter(Q(posicao__gt=anterior.posicao) |
+                                       Q(posicao=anterior.posicao, pk__gt=anterior.pk))
+    proxima = seguintes_.order_by('posicao', 'pk').values_list('posicao', flat=True).first()
+    menor = anterior.posicao if anterior is not None else None
+    if proxima is not None and (menor or '') >= proxima:
+        return None
+    chave = entre(menor, proxima)
+    if len(chave) > Tarefa._meta.get_field('posicao').max_length:
+        return None
+    return chave
+
+
+def mover(usuario_id, tarefa_id, depois_de=None):
+    """
+    Coloca a tarefa logo depois da tarefa depois_de (None: no topo da lista), as duas do
+    usuario e da mesma lista. Um UPDATE da tarefa e um da lista. Levanta ValidationError para
+    ids inválidos. Retorna a nova chave.
+    """
+    try:
+        tarefa_id = int(tarefa_id)
+        depois_de = int(depois_de) if depois_de is not None else None
+    except (TypeError, ValueError):
+        raise ValidationError('Ids de tarefa inválidos')
+    if tarefa_id == depois_de:
+        raise ValidationError('Uma tarefa não pode ir para depois dela mesma')
+    ids = {tarefa_id} if depois_de is None else {tarefa_id, depois_de}
+
+    with transaction.atomic():
+        tarefas = {tarefa.pk: tarefa for tarefa in Tarefa.objects.select_for_update()
+                   .filter(pk__in=ids, user_id=usuario_id).only('id', 'lista_id', 'posicao')}
+        if len(tarefas) != len(ids):
+            raise ValidationError('Alguma das tarefas não existe ou não pertence a você')
+        tarefa, anterior = tarefas[tarefa_id], tarefas.get(depois_de)
+        if anterior is not None and anterior.lista_id != tarefa.lista_id:
+            raise ValidationError('As tarefas precisam estar na mesma lista')
+        # O UPDATE da lista antes de ler as vizinhas trava a linha da lista, então dois
+        # movimentos na mesma lista não calculam a chave a partir das mesmas vizinhas
+        Lista.objects.filter(pk=tarefa.lista_id).update(data_atualizacao=timezone.now())
+        chave = _nova_chave(tarefa, anterior)
+        if chave is None:
+            rebalancear(tarefa.lista_id)
+            if anterior is not None:
+                anterior.posicao = Tarefa.objects.values_list('posicao', flat=True).get(pk=anterior.pk)
+            chave = _nova_chave(tarefa, anterior)
+        Tarefa.objects.filter(pk=tarefa.pk).update(posicao=chave)
+        # update() não dispara os signals que invalidam o cache
+        invalidar(usuario_id, [tarefa.lista_id])
+        if len(chave) > limite():
+            agendar(tarefa.lista_id)
+    return chave
+
+
+def agendar(lista_id):
+    """ Enfileira o rebalanceamento da lista, se ainda não houver um pendente """
+    from .trabalhos import rebalancear_posicoes
+    if not Trabalho.objects.filter(nome=rebalancear_posicoes.nome_trabalho, status='pendente',
+                                   argumentos=[lista_id]).exists():
+        rebalancear_posicoes.enfileirar(lista_id)
+
+
+def rebalancear(lista_id):
+    """
+    Reescreve as chaves da lista espaçadas igualmente, mantendo a ordem (tarefas com a mesma
+    chave ficam na ordem do id). Só as linhas cuja chave muda são gravadas, TAMANHO_CONSULTA
+    por UPDATE. Retorna quantas tarefas mudaram de chave.
+    """
+    with transaction.atomic():
+        atuais = list(Tarefa.objects.select_for_update().filter(lista_id=lista_id)
+                      .order_by('posicao', 'pk').values_list('pk', 'posicao'))
+        alteradas = [Tarefa(pk=pk, posicao=chave)
+                     for (pk, atual), chave in zip(atuais, espacadas(len(atuais))) if atual != chave]
+        Tarefa.objects.bulk_update(alteradas, ['posicao'], batch_size=TAMANHO_CONSULTA)
+        if alteradas:
+            Lista.objects.filter(pk=lista_id).update(data_atualizacao=timezone.now())
+            invalidar(lista_ids=[lista_id])
+    return len(alteradas)
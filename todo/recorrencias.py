@@ -0,0 +1,239 @@
+import calendar
+import datetime
+from collections import Counter, defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from . import contadores, metricas, posicoes
+from .cache import invalidar
+from .models import Recorrencia, Tarefa
+
+try:
+    from dateutil.rrule import rrulestr
+except ImportError:  # python-dateutil é opcional: sem ele só não há a frequencia rrule
+    rrulestr = None
+
+# Tarefas que se repetem. Uma Recorrencia é o modelo da serie (titulo, lista, frequencia) e cada
+# ocorrencia é uma Tarefa comum com recorrencia e dataVencimento preenchidos. O titulo de cada
+# ocorrencia recebe a data como sufixo, por causa da unicidade de (usuario, titulo).
+#
+# As ocorrencias não são inseridas com antecedencia. Recorrencia.proxima guarda a primeira data
+# ainda sem tarefa e as tarefas nascem de dois jeitos:
+#   - avancar(): quando a ultima ocorrencia aberta de uma serie é concluida (editar_tarefa pelo
+#     signal do save, ações em lote, API), a ocorrencia seguinte é criada
+#   - materializar(): o comando materializar_recorrencias (ou o trabalho da fila de mesmo nome)
+#     cria as ocorrencias que vencem até uma data, em lotes, com bulk_create
+# Datas que já passaram sem tarefa são puladas: uma serie diaria parada por uma semana ganha uma
+# ocorrencia hoje, não sete atrasadas. As ocorrencias futuras que o calendario mostra vêm de
+# previstas(), calculadas sem tocar no banco.
+#
+# A constraint unique_tarefa_recorrencia_venc garante uma ocorrencia por data em cada serie.
+
+# Series por lote no materializar(); cada lote usa alguns IN (...) com esses ids, abaixo do
+# limite de 999 parametros do SQLite.
+TAMANHO_LOTE = 500
+
+# Tamanho do sufixo " (dd/mm/aaaa)" do titulo das ocorrencias.
+_SUFIXO = 13
+
+
+def rrule_disponivel():
+    return rrulestr is not None
+
+
+def _regra(regra, inicio):
+    return rrulestr(regra, dtstart=datetime.datetime.combine(inicio, datetime.time()))
+
+
+def validar_regra(regra, inicio):
+    """ Levanta ValidationError se a regra RRULE não puder ser usada """
+    if rrulestr is None:
+        raise ValidationError('Regras RRULE precisam do pacote python-dateutil')
+    try:
+        _regra(regra, inicio)
+    except (ValueError, TypeError):
+        raise ValidationError('Regra RRULE inválida')
+
+
+def _somar_meses(data, meses):
+    ano, mes = divmod(data.month - 1 + meses, 12)
+    ano += data.year
+    # 31/01 + 1 mês = 28/02 (ou 29/02): o dia é limitado ao ultimo dia do mês
+    return datetime.date(ano, mes + 1, min(data.day, calendar.monthrange(ano, mes + 1)[1]))
+
+
+def datas(recorrencia, de, ate=None):
+    """ Datas das ocorrencias da serie de `de` até `ate` (inclusive; None = sem limite), sem consultar o banco """
+    inicio = recorrencia.inicio
+    de = max(de, inicio)
+    if recorrencia.fim is not None:
+        ate = recorrencia.fim if ate is None else min(ate, recorrencia.fim)
+    if ate is not None and de > ate:
+        return
+    if recorrencia.frequencia in ('diaria', 'semanal'):
+        passo = recorrencia.intervalo * (7 if recorrencia.frequencia == 'semanal' else 1)
+        # Primeira data da serie a partir de `de`, sem percorrer as anteriores
+        data = inicio + datetime.timedelta(days=-(-(de - inicio).days // passo) * passo)
+        while ate is None or data <= ate:
+            yield data
+            data += datetime.timedelta(days=passo)
+    elif recorrencia.frequencia == 'mensal':
+        meses = ((de.year - inicio.year) * 12 + de.month - inicio.month) // recorrencia.intervalo
+        while True:
+            data = _somar_meses(inicio, meses * recorrencia.intervalo)
+            if ate is not None and data > ate:
+                return
+            if data >= de:
+                yield data
+            meses += 1
+    elif rrulestr is not None:
+        regra = _regra(recorrencia.regra, inicio)
+        momento = regra.after(datetime.datetime.combine(de, datetime.time()), inc=True)
+        while momento is not None and (ate is None or momento.date() <= ate):
+            yield momento.date()
+            momento = regra.after(momento)
+
+
+def primeira(recorrencia, de):
+    """ Primeira data da serie a partir de `de`, ou None se a serie termina antes """
+    return next(datas(recorrencia, de), None)
+
+
+def titulo(recorrencia, data):
+    return f'{recorrencia.titulo[:100 - _SUFIXO]} ({data:%d/%m/%Y})'
+
+
+def criar(tarefa, frequencia, intervalo=1, regra='', fim=None):
+    """
+    Transforma a tarefa (já salva) na primeira ocorrencia de uma nova serie, que começa no
+    vencimento dela. Levanta ValidationError para frequencia, intervalo ou regra inválidos.
+    """
+    recorrencia = Recorrencia(usuario_id=tarefa.user_id, lista_id=tarefa.lista_id, titulo=tarefa.titulo,
+                              descricao=tarefa.descricao, prioridade=tarefa.prioridade, frequencia=frequencia,
+                              intervalo=intervalo, regra=regra or '', inicio=tarefa.dataVencimento, fim=fim)
+    recorrencia.full_clean(exclude=['usuario', 'lista', 'proxima'])
+    recorrencia.proxima = primeira(recorrencia, tarefa.dataVencimento + datetime.timedelta(days=1))
+    recorrencia.save()
+    Tarefa.objects.filter(pk=tarefa.pk).update(recorrencia=recorrencia)
+    tarefa.recorrencia = recorrencia
+    return recorrencia
+
+
+def _gerar(geracoes, hoje):
+    """
+    Cria as ocorrencias e grava a nova proxima de cada serie. `geracoes` são trincas
+    (recorrencia, datas, nova_proxima). Algumas consultas por chamada, independente do numero
+    de series: bulk_create e update() não passam pelos signals, então os contadores, o cache e
+    as metricas são atualizados aqui, pelas ocorrencias realmente inseridas. As series precisam
+    estar travadas com select_for_update. Retorna as tarefas criadas.
+    """
+    novas = [Tarefa(titulo=titulo(recorrencia, data), descricao=recorrencia.descricao,
+                    prioridade=recorrencia.prioridade, dataCriacao=hoje, dataVencimento=data,
+                    lista_id=recorrencia.lista_id, user_id=recorrencia.usuario_id, recorrencia=recorrencia)
+             for recorrencia, datas_serie, _ in geracoes for data in datas_serie]
+    if novas:
+        # Ocorrencias já criadas (pelo avancar() ou outro materializar()) e titulos já usados
+        # pelo usuario ficam de fora; o ignore_conflicts cobre uma corrida entre as duas consultas
+        criadas = set(Tarefa.objects.filter(
+            recorrencia_id__in={tarefa.recorrencia_id for tarefa in novas},
+            dataVencimento__in={tarefa.dataVencimento for tarefa in novas},
+        ).values_list('recorrencia_id', 'dataVencimento'))
+        usados = set(Tarefa.objects.filter(
+            user_id__in={tarefa.user_id for tarefa in novas}, titulo__in={tarefa.titulo for tarefa in novas},
+        ).values_list('user_id', 'titulo'))
+        novas = [tarefa for tarefa in novas if (tarefa.recorrencia_id, tarefa.dataVencimento) not in criadas
+                 and (tarefa.user_id, tarefa.titulo) not in usados]
+        posicoes.no_fim(novas)
+        Tarefa.objects.bulk_create(novas, ignore_conflicts=True)
+        # O ignore_conflicts descarta sem avisar o que conflitou (um titulo criado por outra
+        # transação depois da consulta acima): só contam as ocorrencias que estão no banco. As
+        # series estão travadas por quem chama (select_for_update), então nenhuma outra transação
+        # cria ocorrencias delas e as encontradas aqui são as inseridas agora
+        inseridas = {(recorrencia_id, vencimento): pk for recorrencia_id, vencimento, pk in Tarefa.objects.filter(
+            recorrencia_id__in={tarefa.recorrencia_id for tarefa in novas},
+            dataVencimento__in={tarefa.dataVencimento for tarefa in novas},
+        ).values_list('recorrencia_id', 'dataVencimento', 'pk')}
+        for tarefa in novas:
+            tarefa.pk = inseridas.get((tarefa.recorrencia_id, tarefa.dataVencimento))
+        novas = [tarefa for tarefa in novas if tarefa.pk is not None]
+
+    # Um UPDATE por nova data (no materializar() quase todas as series vão para o mesmo dia)
+    por_proxima = defaultdict(list)
+    for recorrencia, _, nova_proxima in geracoes:
+        if recorrencia.proxima != nova_proxima:
+            recorrencia.proxima = nova_proxima
+            por_proxima[nova_proxima].append(recorrencia.pk)
+    for nova_proxima, ids in por_proxima.items():
+        Recorrencia.objects.filter(pk__in=ids).update(proxima=nova_proxima)
+
+    if novas:
+        por_lista = Counter(tarefa.lista_id for tarefa in novas)
+        contadores.ajustar(contadores.diferencas(criadas=[(pk, 'pendente', n) for pk, n in por_lista.items()]),
+                           data_atualizacao=timezone.now())
+        invalidar(lista_ids=por_lista, usuario_ids={tarefa.user_id for tarefa in novas})
+        metricas.tarefas_criadas.inc(valor=len(novas))
+    return novas
+
+
+def avancar(recorrencia_ids, hoje=None):
+    """
+    Cria a proxima ocorrencia das series que não têm mais nenhuma ocorrencia aberta (chamado
+    quando ocorrencias são concluidas). Retorna as tarefas criadas.
+    """
+    hoje = hoje or datetime.date.today()
+    with transaction.atomic():
+        series = list(Recorrencia.objects.select_for_update()
+                      .filter(pk__in=set(recorrencia_ids), proxima__isnull=False))
+        if not series:
+            return []
+        abertas = set(Tarefa.objects.filter(recorrencia__in=series).exclude(status='concluido')
+                      .values_list('recorrencia_id', flat=True).distinct())
+        geracoes = []
+        for recorrencia in series:
+            if recorrencia.pk in abertas:
+                continue
+            data = primeira(recorrencia, max(recorrencia.proxima, hoje))
+            if data is None:
+                geracoes.append((recorrencia, [], None))
+            else:
+                geracoes.append((recorrencia, [data], primeira(recorrencia, data + datetime.timedelta(days=1))))
+        return _gerar(geracoes, hoje)
+
+
+def materializar(ate=None, hoje=None, lote=TAMANHO_LOTE):
+    """
+    Cria as ocorrencias de todas as series que vencem até `ate` (padrão: hoje), `lote` series
+    por vez, cada lote na sua transação. Retorna (series, tarefas) processadas.
+    """
+    hoje = hoje or datetime.date.today()
+    ate = ate or hoje
+    total_series = total_tarefas = 0
+    while True:
+        with transaction.atomic():
+            # As series processadas passam a ter proxima > ate (ou None) e saem do filtro
+            series = list(Recorrencia.objects.select_for_update()
+                          .filter(proxima__lte=ate).order_by('proxima', 'id')[:lote])
+            if not series:
+                break
+            geracoes = []
+            for recorrencia in series:
+                datas_serie = list(datas(recorrencia, max(recorrencia.proxima, hoje), ate))
+                geracoes.append((recorrencia, datas_serie, primeira(recorrencia, ate + datetime.timedelta(days=1))))
+            total_tarefas += len(_gerar(geracoes, hoje))
+            total_series += len(series)
+        if len(series) < lote:
+            break
+    return total_series, total_tarefas
+
+
+def previstas(usuario_id, de, ate):
+    """
+    Ocorrencias futuras ainda não criadas das series do usuario entre `de` e `ate`, como pares
+    (recorrencia, data), numa unica consulta. Para o calendario, nada é inserido.
+    """
+    series = Recorrencia.objects.filter(usuario_id=usuario_id, proxima__isnull=False, proxima__lte=ate)
+    return sorted(((recorrencia, data) for recorrencia in series
+                   for data in datas(recorrencia, max(de, recorrencia.proxima), ate)),
+                  key=lambda par: (par[1], par[0].pk))
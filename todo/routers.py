@@ -0,0 +1,78 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Leituras em replicas, escritas no primario ('default').
+#
+# As replicas (aliases de DATABASES listados em TODO_REPLICAS) só são usadas durante uma
+# requisição GET/HEAD marcada pelo ReplicaMiddleware. Fora de uma requisição (comandos,
+# shell, testes) e nas requisições que escrevem, tudo vai para o primario.
+#
+# Leia o que escreveu: depois de uma requisição que escreve, o middleware guarda na sessão até
+# quando as leituras do usuario ficam no primario (TODO_REPLICA_FIXAR segundos), o tempo para
+# as replicas receberem a escrita. Uma escrita no meio de um GET também passa o resto da
+# requisição para o primario.
+#
+# A sessão fica sempre no primario: é ela que diz se o usuario está fixado.
+
+_estado = ContextVar('todo_replica', default=None)
+
+# Apps cujos modelos nunca são lidos das replicas
+SEMPRE_NO_PRIMARIO = {'sessions'}
+
+
+class Estado:
+    """ Estado da requisição atual: se pode ler das replicas e se já escreveu algo """
+    __slots__ = ('replica', 'escreveu')
+
+    def __init__(self, replica):
+        self.replica = replica
+        self.escreveu = False
+
+
+def replicas():
+    return getattr(settings, 'TODO_REPLICAS', [])
+
+
+def iniciar(usar_replica):
+    """ Começa uma requisição, lendo das replicas ou não """
+    estado = Estado(usar_replica)
+    _estado.set(estado)
+    return estado
+
+
+def terminar():
+    """ Volta ao padrão (tudo no primario); chamado no request_finished, depois do streaming da resposta """
+    _estado.set(None)
+
+
+class ReplicaRouter:
+    """ Manda as leituras das requisições marcadas para uma replica e o resto para o primario """
+
+    def db_for_read(self, model, **hints):
+        estado = _estado.get()
+        if estado is None or not estado.replica or model._meta.app_label in SEMPRE_NO_PRIMARIO:
+            return 'default'
+        aliases = replicas()
+        return random.choice(aliases) if aliases else 'default'
+
+    def db_for_write(self, model, **hints):
+        estado = _estado.get()
+        if estado is not None and model._meta.app_label not in SEMPRE_NO_PRIMARIO:
+            estado.escreveu = True
+            estado.replica = False
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # As replicas são copias do primario, objetos de qualquer uma se relacionam
+        bancos = {'default', *replicas()}
+        if obj1._state.db in bancos and obj2._state.db in bancos:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # As replicas recebem o schema junto com os dados copiados do primario
+        if db in replicas():
+            return False
+        return None
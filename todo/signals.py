@@ -0,0 +1,139 @@
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in
+from django.db import connections
+from django.core.signals import request_finished
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import busca, contadores, db, estatisticas, metricas, perfil, recorrencias, routers
+from .cache import invalidar
+from .middleware import definir_expiracao
+from .models import Lista, Tarefa
+
+
+@receiver(post_save, sender=Tarefa)
+@receiver(post_delete, sender=Tarefa)
+def invalidar_cache_tarefa(sender, instance, **kwargs):
+    """ Toda alteração numa tarefa invalida o cache do dono e da lista da tarefa """
+    invalidar(instance.user_id, [instance.lista_id])
+
+
+@receiver(post_save, sender=Lista)
+@receiver(post_delete, sender=Lista)
+def invalidar_cache_lista(sender, instance, **kwargs):
+    """ Toda alteração numa lista invalida o cache do dono e da propria lista """
+    invalidar(instance.usuario_id, [instance.pk])
+
+
+@receiver(user_logged_in)
+def iniciar_expiracao_sessao(sender, request, user, **kwargs):
+    """ Começa a contar o tempo da sessão no login, conferido pelo SessionTimeoutMiddleware """
+    if request is not None and hasattr(request, 'session'):
+        definir_expiracao(request.session)
+
+
+@receiver(post_save, sender=Tarefa)
+def contar_tarefa_salva(sender, instance, created, **kwargs):
+    """ Conta as tarefas criadas e as que passaram para concluido nas metricas """
+    if created:
+        metricas.tarefas_criadas.inc()
+    if instance.status == 'concluido' and (created or instance._status_original not in (None, 'concluido')):
+        metricas.tarefas_concluidas.inc()
+
+
+@receiver(post_save, sender=Tarefa)
+def contar_tarefa_na_lista(sender, instance, created, **kwargs):
+    """
+    Atualiza os contadores e a data_atualizacao da lista quando uma tarefa é criada, muda de
+    status ou muda de lista, no mesmo UPDATE e na transação do save.
+    Tarefas sem o status ou a lista originais (only/defer) ficam para o recalcular_contadores.
+    """
+    if created:
+        contadores.ajustar(contadores.diferencas(criadas=[(instance.lista_id, instance.status, 1)]),
+                           data_atualizacao=timezone.now())
+    elif instance._lista_original is not None and instance._status_original is not None and (
+            (instance._lista_original, instance._status_original) != (instance.lista_id, instance.status)):
+        contadores.ajustar(contadores.diferencas(
+            criadas=[(instance.lista_id, instance.status, 1)],
+            removidas=[(instance._lista_original, instance._status_original, 1)]), data_atualizacao=timezone.now())
+
+
+@receiver(post_save, sender=Tarefa)
+def avancar_recorrencia(sender, instance, created, **kwargs):
+    """ Concluir a ultima ocorrencia aberta de uma serie cria a seguinte (ver todo/recorrencias.py) """
+    if (instance.recorrencia_id is not None and instance.status == 'concluido'
+            and (created or instance._status_original not in (None, 'concluido'))):
+        recorrencias.avancar([instance.recorrencia_id])
+
+
+@receiver(post_save, sender=Tarefa)
+def somar_estatisticas(sender, instance, created, **kwargs):
+    """
+    Soma a conclusão nas estatisticas diarias do usuario quando a tarefa passa a concluido e
+    desconta quando deixa de estar concluida (ou muda de data de conclusão).
+    Tarefas sem o status ou a conclusão originais (only/defer) ficam para o recalcular_estatisticas.
+    """
+    concluida = instance.dataConclusao if instance.status == 'concluido' else None
+    if created:
+        original = None
+    elif instance._status_original is None:
+        return
+    else:
+        original = instance._conclusao_original if instance._status_original == 'concluido' else None
+    if original != concluida:
+        estatisticas.ajustar(estatisticas.diferencas(
+            concluidas=[estatisticas.da_tarefa(instance)] if concluida else [],
+            reabertas=[estatisticas.da_tarefa(instance, original)] if original else []))
+
+
+@receiver(post_delete, sender=Tarefa)
+def descontar_tarefa_da_lista(sender, instance, origin=None, **kwargs):
+    """
+    Desconta a tarefa deletada sozinha e atualiza Lista.data_atualizacao, assim o ETag e o
+    Last-Modified do get_list e do index mudam. Deleções em cascata (lista deletada) ou por
+    queryset ficam a cargo de quem deletou, para não fazer um UPDATE por tarefa.
+    """
+    if origin is instance:
+        contadores.ajustar(contadores.diferencas(removidas=[(instance.lista_id, instance.status, 1)]),
+                           data_atualizacao=timezone.now())
+
+
+@receiver(post_delete, sender=Tarefa)
+def contar_tarefa_deletada(sender, instance, **kwargs):
+    """ Conta as tarefas deletadas, sozinhas (sql.delete, API) ou junto com a lista """
+    metricas.tarefas_deletadas.inc()
+
+
+@receiver(connection_created)
+def contar_consultas(sender, connection, **kwargs):
+    """ Toda conexão nova conta as suas consultas nas metricas """
+    connection.execute_wrappers.append(metricas.contar_consulta)
+
+
+@receiver(connection_created)
+def medir_consultas(sender, connection, **kwargs):
+    """ Toda conexão nova soma as suas consultas na coleta do perfil, se a requisição for amostrada """
+    connection.execute_wrappers.append(perfil.contar_consulta)
+
+
+@receiver(connection_created)
+def configurar_conexao(sender, connection, **kwargs):
+    """ Aplica os PRAGMA de TODO_SQLITE_PRAGMAS em cada conexão nova com o SQLite """
+    pragmas = getattr(settings, 'TODO_SQLITE_PRAGMAS', None)
+    if pragmas and connection.vendor == 'sqlite':
+        db.configurar_sqlite(connection, pragmas)
+
+
+@receiver(request_finished)
+def terminar_leituras_replica(sender, **kwargs):
+    """ Depois da resposta (e do streaming dela) as leituras voltam para o primario """
+    routers.terminar()
+
+
+@receiver(post_migrate)
+def garantir_indice_busca(sender, using, **kwargs):
+    """ Recria os triggers da busca que uma migração tenha apagado ao reconstruir uma tabela no SQLite """
+    if sender.name == 'todo':
+        busca.garantir_gatilhos(connections[using])
@@ -4,22 +4,24 @@ from django.contrib.auth.models import User
 from django.contrib import messages
 
 def delete(request, obj):
-    """ Essa função deleta um objeto e mostra uma mensagem dizendo que o objeto foi deletado corretamente """
+    """ Essa função deleta um objeto, mostra uma mensagem dizendo que o objeto foi deletado corretamente
+     e retorna o objeto deletado """
     object = get_object_or_404(obj, pk=request.POST.get('Deletar'))
     object.delete()
     messages.info(request, 'O objeto foi deletado com sucesso')
+    return object
 
-def error(form, url,request, rurl = 'index'):
+def error(form, url,request, rurl = 'index', **kwargs):
     """ Essa função recebe um formulario, uma url, uma HttpRequest, uma url e redirecionamento,
-     e mostra a mensagem de erro caso tenha algum erro, ou redireciona para a url informada"""
+     e mostra a mensagem de erro caso tenha algum erro, ou redireciona para a url informada.
+     O formulario é validado e salvo uma vez só; kwargs vão para o form.save"""
     try:
-        form.save(request)
+        form.save(request, **kwargs)
     except ValidationError:
         messages.error(request,f'O titulo dado já está em uso')
     except ValueError:
         messages.error(request,f'{form.errors}')
     else:
-        form.save(request)
         return redirect(rurl)
    
     context={
@@ -0,0 +1,112 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.utils import timezone
+from todo.models import Lista, Tarefa
+import datetime
+import json
+
+class ApiTest(TestCase):
+    """Testes para a API JSON de listas e tarefas"""
+
+    def setUp(self):
+        """Cria um usuario logado com uma lista e tres tarefas, e outro usuario com uma lista"""
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.outro = User.objects.create_user(username='outro', password='testpassword')
+        agora = timezone.now()
+        self.lista = Lista.objects.create(usuario=self.user, titulo='Lista', descricao='Descrição',
+                                          data_criacao=agora, data_atualizacao=agora)
+        self.lista_outro = Lista.objects.create(usuario=self.outro, titulo='Lista do outro', descricao='Descrição',
+                                                data_criacao=agora, data_atualizacao=agora)
+        hoje = datetime.date.today()
+        for i, (status, prioridade) in enumerate([('pendente', 'alta'), ('em andamento', 'baixa'),
+                                                  ('pendente', 'baixa')]):
+            Tarefa.objects.create(titulo=f'Tarefa {i}', descricao='Descrição', prioridade=prioridade, status=status,
+                                  dataCriacao=hoje, lista=self.lista, user=self.user,
+                                  dataVencimento=hoje + datetime.timedelta(days=i + 1))
+        self.client.force_login(self.user)
+
+    def _json(self, url, metodo='post', dados=None):
+        return getattr(self.client, metodo)(url, json.dumps(dados or {}), content_type='application/json')
+
+    def test_nao_autenticado(self):
+        """Sem login a API responde 401 em JSON em vez de redirecionar"""
+        self.client.logout()
+        response = self.client.get(reverse('api_tarefas'))
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('erro', response.json())
+
+    def test_listas_campos(self):
+        """?campos= retorna só os campos pedidos e as listas do usuario"""
+        response = self.client.get(reverse('api_listas'), {'campos': 'titulo'})
+        self.assertEqual(response.json()['resultados'], [{'id': self.lista.pk, 'titulo': 'Lista'}])
+        self.assertEqual(self.client.get(reverse('api_listas'), {'campos': 'senha'}).status_code, 400)
+
+    def test_tarefas_filtros(self):
+        """Filtra por status, prioridade e faixa de vencimento"""
+        hoje = datetime.date.today()
+        response = self.client.get(reverse('api_tarefas'), {'status': 'pendente', 'campos': 'titulo'})
+        self.assertEqual([t['titulo'] for t in response.json()['resultados']], ['Tarefa 0', 'Tarefa 2'])
+        response = self.client.get(reverse('api_tarefas'), {'prioridade': 'baixa',
+                                                            'vencimento_ate': str(hoje + datetime.timedelta(days=2))})
+        self.assertEqual([t['titulo'] for t in response.json()['resultados']], ['Tarefa 1'])
+        self.assertEqual(self.client.get(reverse('api_tarefas'), {'vencimento_de': 'ontem'}).status_code, 400)
+
+    def test_tarefas_cursor(self):
+        """A paginação por cursor percorre todas as tarefas sem repetir"""
+        titulos, cursor = [], None
+        while True:
+            parametros = {'tamanho': 2, 'campos': 'titulo'}
+            if cursor:
+                parametros['cursor'] = cursor
+            dados = self.client.get(reverse('api_tarefas'), parametros).json()
+            titulos += [t['titulo'] for t in dados['resultados']]
+            cursor = dados['proximo']
+            if not cursor:
+                break
+        self.assertEqual(titulos, ['Tarefa 0', 'Tarefa 1', 'Tarefa 2'])
+
+    def test_tarefas_ndjson(self):
+        """formato=ndjson devolve uma tarefa por linha em streaming"""
+        response = self.client.get(reverse('api_tarefas'), {'formato': 'ndjson', 'campos': 'titulo,lista'})
+        self.assertTrue(response.streaming)
+        linhas = [json.loads(linha) for linha in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(len(linhas), 3)
+        self.assertEqual(linhas[0], {'id': linhas[0]['id'], 'titulo': 'Tarefa 0', 'lista': self.lista.pk})
+
+    def test_criar_editar_deletar_tarefa(self):
+        """CRUD de tarefa pela API mantendo status, concluido e dataConclusao coerentes"""
+        vencimento = str(datetime.date.today() + datetime.timedelta(days=5))
+        response = self._json(reverse('api_tarefas'), dados={'lista': self.lista.pk, 'titulo': 'Nova',
+                                                             'descricao': 'Descrição', 'prioridade': 'alta', 'dataVencimento': vencimento})
+        self.assertEqual(response.status_code, 201)
+        pk = response.json()['id']
+        response = self._json(reverse('api_tarefa', args=[pk]), 'patch', {'status': 'concluido'})
+        self.assertTrue(response.json()['concluido'])
+        self.assertEqual(response.json()['dataConclusao'], str(datetime.date.today()))
+        self.assertEqual(self.client.delete(reverse('api_tarefa', args=[pk])).status_code, 204)
+        self.assertFalse(Tarefa.objects.filter(pk=pk).exists())
+
+    def test_criar_tarefa_invalida(self):
+        """Titulo repetido ou lista de outro usuario não criam a tarefa"""
+        vencimento = str(datetime.date.today() + datetime.timedelta(days=5))
+        response = self._json(reverse('api_tarefas'), dados={'lista': self.lista.pk, 'titulo': 'Tarefa 0',
+                                                             'prioridade': 'alta', 'dataVencimento': vencimento})
+        self.assertEqual(response.status_code, 400)
+        response = self._json(reverse('api_tarefas'), dados={'lista': self.lista_outro.pk, 'titulo': 'Nova',
+                                                             'prioridade': 'alta', 'dataVencimento': vencimento})
+        self.assertEqual(response.status_code, 404)
+
+    def test_lista_de_outro_usuario(self):
+        """Listas de outro usuario não podem ser lidas, alteradas ou deletadas"""
+        url = reverse('api_lista', args=[self.lista_outro.pk])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self._json(url, 'patch', {'titulo': 'x'}).status_code, 404)
+        self.assertEqual(self.client.delete(url).status_code, 404)
+        self.assertTrue(Lista.objects.filter(pk=self.lista_outro.pk).exists())
+
+    def test_criar_lista(self):
+        """POST em api/listas cria a lista do usuario logado"""
+        response = self._json(reverse('api_listas'), dados={'titulo': 'Nova', 'descricao': 'Descrição'})
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Lista.objects.filter(usuario=self.user, titulo='Nova').exists())
@@ -0,0 +1,84 @@
+from django.test import TestCase, override_settings
+from django.urls import include, path, reverse
+from django.contrib.auth.models import User
+from django.utils import timezone
+from todo import assincrono, urls as todo_urls
+from todo.middleware import CHAVE_EXPIRACAO
+from todo.models import Lista, Tarefa
+import datetime
+import json
+import time
+
+# Urls do todo com as views de leitura trocadas pelas versões assincronas, como com TODO_ASYNC_VIEWS
+ASSINCRONAS = {'index': assincrono.index, 'get_list': assincrono.getList, 'api_listas': assincrono.listas,
+               'api_lista': assincrono.lista, 'api_tarefas': assincrono.tarefas, 'api_tarefa': assincrono.tarefa}
+urlpatterns = [path('todo/', include([
+    path(str(padrao.pattern), ASSINCRONAS.get(padrao.name, padrao.callback), name=padrao.name)
+    for padrao in todo_urls.urlpatterns
+]))]
+
+
+@override_settings(ROOT_URLCONF='todo.test.test_assincrono')
+class ViewsAssincronasTest(TestCase):
+    """Testes para as views assincronas usadas sob ASGI"""
+
+    def setUp(self):
+        """Cria um usuario com uma lista e duas tarefas"""
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.lista = Lista.objects.create(usuario=self.user, titulo='Lista', descricao='Descrição',
+                                          data_criacao=timezone.now(), data_atualizacao=timezone.now())
+        for i in range(2):
+            Tarefa.objects.create(titulo=f'Tarefa {i}', descricao='Descrição', prioridade='alta',
+                                  dataCriacao=datetime.date.today(), lista=self.lista, user=self.user,
+                                  dataVencimento=datetime.date.today() + datetime.timedelta(days=i + 1))
+
+    async def test_index(self):
+        """O index async mostra as listas com os agregados"""
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['listas'][0]['total'], 2)
+        self.assertIn('ETag', response)
+
+    async def test_index_anonimo(self):
+        response = await self.async_client.get(reverse('index'))
+        self.assertTemplateUsed(response, 'todo/index.html')
+
+    async def test_get_list_e_304(self):
+        """O get_list async pagina as tarefas e responde 304 com o ETag atual"""
+        await self.async_client.aforce_login(self.user)
+        url = reverse('get_list', args=[self.lista.pk])
+        response = await self.async_client.get(url, {'tamanho': 1})
+        self.assertEqual([tarefa.titulo for tarefa in response.context['tarefas']], ['Tarefa 0'])
+        self.assertTrue(response.context['proximo'])
+        response = await self.async_client.get(url, {'tamanho': 1}, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_get_list_sem_login(self):
+        response = await self.async_client.get(reverse('get_list', args=[self.lista.pk]))
+        self.assertEqual(response.status_code, 302)
+
+    async def test_api_ndjson(self):
+        """A API async devolve NDJSON com um iterador assincrono"""
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('api_tarefas'), {'formato': 'ndjson', 'campos': 'titulo'})
+        linhas = [json.loads(linha) async for linha in response.streaming_content]
+        self.assertEqual([linha['titulo'] for linha in linhas], ['Tarefa 0', 'Tarefa 1'])
+        self.assertEqual((await self.async_client.get(reverse('api_lista', args=[0]))).status_code, 404)
+
+    async def test_api_escrita_usa_view_sincrona(self):
+        """POST na url async é atendido pela view sincrona da API"""
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.post(reverse('api_listas'), json.dumps({'titulo': 'Nova', 'descricao': 'x'}),
+                                                content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(await Lista.objects.filter(titulo='Nova', usuario=self.user).aexists())
+
+    async def test_sessao_expirada(self):
+        """O SessionTimeoutMiddleware também desloga no caminho async"""
+        await self.async_client.aforce_login(self.user)
+        session = await self.async_client.asession()
+        await session.aset(CHAVE_EXPIRACAO, time.time() - 1)
+        await session.asave()
+        response = await self.async_client.get(reverse('api_listas'))
+        self.assertEqual(response.status_code, 401)
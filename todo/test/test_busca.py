@@ -0,0 +1,92 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.db import connection
+from django.utils import timezone
+from todo.models import Lista, Tarefa
+from todo import busca
+import datetime
+
+class BuscaTest(TestCase):
+    """Testes para a busca textual em tarefas e listas"""
+
+    def setUp(self):
+        """Cria um usuario logado com uma lista e tarefas, e outro usuario com uma tarefa parecida"""
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.outro = User.objects.create_user(username='outro', password='testpassword')
+        self.lista = self.criar_lista(self.user, 'Mercado', 'Compras da semana')
+        self.leite = self.criar_tarefa(self.user, self.lista, 'Comprar leite', 'Integral')
+        self.feira = self.criar_tarefa(self.user, self.lista, 'Feira', 'Comprar frutas e verduras')
+        self.criar_tarefa(self.outro, self.criar_lista(self.outro, 'Outra', 'Descrição'), 'Comprar pão', 'Padaria')
+        self.client.force_login(self.user)
+
+    def criar_lista(self, usuario, titulo, descricao):
+        agora = timezone.now()
+        return Lista.objects.create(usuario=usuario, titulo=titulo, descricao=descricao,
+                                    data_criacao=agora, data_atualizacao=agora)
+
+    def criar_tarefa(self, usuario, lista, titulo, descricao):
+        hoje = datetime.date.today()
+        return Tarefa.objects.create(titulo=titulo, descricao=descricao, prioridade='media', dataCriacao=hoje,
+                                     dataVencimento=hoje, lista=lista, user=usuario)
+
+    def test_prefixo_ranking_e_dono(self):
+        """Busca por prefixo, titulo antes da descrição, só nos dados do usuario"""
+        resultados = busca.buscar(self.user.pk, 'compr')
+        self.assertEqual((resultados[0]['tipo'], resultados[0]['id']), ('tarefa', self.leite.pk))
+        self.assertEqual({(r['tipo'], r['id']) for r in resultados[1:]},
+                         {('tarefa', self.feira.pk), ('lista', self.lista.pk)})
+        self.assertEqual(resultados[0]['lista'], self.lista.pk)
+        self.assertEqual([r['id'] for r in busca.buscar(self.user.pk, 'compr leite')], [self.leite.pk])
+        self.assertEqual([r['tipo'] for r in busca.buscar(self.user.pk, 'compr', tipo='lista')], ['lista'])
+        self.assertEqual(busca.buscar(self.user.pk, 'padaria'), [])
+
+    def test_melhor_resultado_antigo(self):
+        """Com mais de CANDIDATOS resultados, a tarefa mais antiga com a palavra no titulo ainda vem primeiro"""
+        antiga = self.criar_tarefa(self.user, self.lista, 'Relatorio anual', 'Enviar')
+        hoje = datetime.date.today()
+        Tarefa.objects.bulk_create(
+            Tarefa(titulo=f'Reunião {i}', descricao='Levar o relatorio impresso e o relatorio digital',
+                   prioridade='media', dataCriacao=hoje, dataVencimento=hoje, lista=self.lista, user=self.user)
+            for i in range(busca.CANDIDATOS + 10))
+        resultados = busca.buscar(self.user.pk, 'relatorio')
+        self.assertEqual(resultados[0]['id'], antiga.pk)
+        self.assertEqual(len(resultados), busca.LIMITE)
+
+    def test_indice_acompanha_alteracoes(self):
+        """Os triggers mantem o indice em dia com save, update() e delete"""
+        self.leite.titulo = 'Comprar café'
+        self.leite.save()
+        self.assertEqual([r['id'] for r in busca.buscar(self.user.pk, 'cafe')], [self.leite.pk])
+        Tarefa.objects.filter(pk=self.feira.pk).update(descricao='Legumes')
+        self.assertEqual([r['id'] for r in busca.buscar(self.user.pk, 'legum')], [self.feira.pk])
+        self.leite.delete()
+        self.assertEqual(busca.buscar(self.user.pk, 'cafe'), [])
+        self.lista.delete()
+        self.assertEqual(busca.buscar(self.user.pk, 'compr'), [])
+
+    def test_destaque_seguro_e_sintaxe_ignorada(self):
+        """O destaque escapa o HTML e operadores digitados não chegam ao banco"""
+        self.criar_tarefa(self.user, self.lista, '<b>Pagar</b> conta', 'Luz')
+        resultado = busca.buscar(self.user.pk, 'pag')[0]
+        self.assertEqual(str(resultado['destaque']), '&lt;b&gt;<mark>Pagar</mark>&lt;/b&gt; conta')
+        self.assertEqual(busca.buscar(self.user.pk, '"dono:u%s OR *' % self.outro.pk), [])
+        self.assertEqual(busca.buscar(self.user.pk, '  '), [])
+
+    def test_gatilhos_recriados(self):
+        """garantir_gatilhos recria um trigger apagado por uma migração"""
+        if connection.vendor != 'sqlite':
+            self.skipTest('Triggers FTS5 só existem no SQLite')
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER todo_busca_tarefa_ai')
+        busca.garantir_gatilhos(connection)
+        self.criar_tarefa(self.user, self.lista, 'Lavar carro', 'Lava jato')
+        self.assertEqual(len(busca.buscar(self.user.pk, 'carro')), 1)
+
+    def test_view_e_api(self):
+        """A pagina e a API de busca respondem com os resultados do usuario"""
+        response = self.client.get(reverse('buscar'), {'q': 'leite'})
+        self.assertContains(response, '<mark>leite</mark>')
+        response = self.client.get(reverse('api_busca'), {'q': 'compr', 'tipo': 'tarefa'})
+        self.assertEqual({r['id'] for r in response.json()['resultados']}, {self.leite.pk, self.feira.pk})
+        self.assertEqual(self.client.get(reverse('api_busca'), {'q': 'x', 'tipo': 'outro'}).status_code, 400)
@@ -0,0 +1,117 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+from todo.models import Lista, Recorrencia, Tarefa
+from todo import calendario
+import datetime
+
+
+class CalendarioTest(TestCase):
+    """Testes para o calendario: janelas, contagens por dia, primeiras tarefas de cada dia e agenda"""
+
+    def setUp(self):
+        cache.clear()
+        self.hoje = datetime.date.today()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        agora = timezone.now()
+        self.lista = Lista.objects.create(usuario=self.user, titulo='Lista', descricao='Descrição',
+                                          data_criacao=agora, data_atualizacao=agora)
+        self.client.defaults['HTTP_HOST'] = 'localhost'
+        self.client.force_login(self.user)
+
+    def tarefas(self, dia, quantidade, concluidas=0, prefixo='T'):
+        Tarefa.objects.bulk_create(
+            Tarefa(titulo=f'{prefixo} {dia} {i}', descricao='', prioridade='media', dataCriacao=self.hoje,
+                   dataVencimento=dia, concluido=i < concluidas, status='concluido' if i < concluidas else 'pendente',
+                   lista=self.lista, user=self.user)
+            for i in range(quantidade))
+
+    def test_janelas(self):
+        """Mês em semanas inteiras de segunda a domingo; semana de segunda a domingo"""
+        d = datetime.date
+        self.assertEqual(calendario.janela('mes', d(2024, 2, 14)), (d(2024, 1, 29), d(2024, 3, 3)))
+        self.assertEqual(calendario.janela('semana', d(2024, 2, 14)), (d(2024, 2, 12), d(2024, 2, 18)))
+        self.assertEqual(calendario.navegacao('mes', d(2024, 1, 31)), (d(2023, 12, 1), d(2024, 2, 1)))
+
+    def test_dias_com_contagens_e_primeiras(self):
+        """Total e abertas de cada dia, as abertas primeiro e o resto como +N"""
+        inicio, _ = calendario.janela('mes', self.hoje)
+        self.tarefas(inicio, 5, concluidas=2)
+        self.tarefas(inicio + datetime.timedelta(days=3), 1)
+        dias = {dia.data: dia for dia in calendario.dias(self.user.pk, 'mes', self.hoje, self.hoje)}
+        primeiro = dias[inicio]
+        self.assertEqual((primeiro.total, primeiro.abertas, primeiro.mais, primeiro.nivel), (5, 3, 2, calendario.NIVEIS))
+        self.assertEqual([tarefa['concluido'] for tarefa in primeiro.tarefas], [False, False, False])
+        self.assertEqual(dias[inicio + datetime.timedelta(days=3)].nivel, 1)
+        self.assertEqual(dias[inicio + datetime.timedelta(days=1)].total, 0)
+        self.assertTrue(dias[self.hoje].hoje)
+
+    def test_mes_com_consultas_constantes(self):
+        """O numero de consultas do mês não depende de quantos dias têm tarefas"""
+        inicio, fim = calendario.janela('mes', self.hoje)
+        self.tarefas(inicio, 2)
+
+        def consultas():
+            cache.clear()
+            with self.assertNumQueries(5):
+                response = self.client.get(reverse('calendario'))
+            self.assertEqual(response.status_code, 200)
+            return response
+
+        consultas()
+        for i in range((fim - inicio).days + 1):
+            self.tarefas(inicio + datetime.timedelta(days=i), 4, prefixo='Outra')
+        response = consultas()
+        self.assertContains(response, '+3')
+
+    def test_previstas_entram_nos_dias(self):
+        """As ocorrencias futuras das recorrencias aparecem no calendario sem serem criadas"""
+        Recorrencia.objects.create(usuario=self.user, lista=self.lista, titulo='Regar', prioridade='media',
+                                   frequencia='diaria', intervalo=1, inicio=self.hoje, proxima=self.hoje)
+        dias = calendario.dias(self.user.pk, 'semana', self.hoje, self.hoje)
+        futuros = [dia for dia in dias if dia.data >= self.hoje]
+        self.assertTrue(all(dia.total == 1 and dia.tarefas[0]['prevista'] for dia in futuros))
+        self.assertFalse(Tarefa.objects.exists())
+
+    def test_agenda_paginada(self):
+        """A agenda segue o cursor e coloca as previstas só na pagina que cobre o dia"""
+        amanha = self.hoje + datetime.timedelta(days=1)
+        self.tarefas(self.hoje, 3)
+        self.tarefas(amanha + datetime.timedelta(days=1), 1)
+        Recorrencia.objects.create(usuario=self.user, lista=self.lista, titulo='Regar', prioridade='media',
+                                   frequencia='semanal', intervalo=1, inicio=amanha, proxima=amanha)
+        grupos, proximo = calendario.agenda(self.user.pk, self.hoje, tamanho=3, hoje=self.hoje)
+        self.assertEqual([(dia, len(tarefas)) for dia, tarefas in grupos], [(self.hoje, 3)])
+        grupos, proximo = calendario.agenda(self.user.pk, self.hoje, cursor=proximo, tamanho=3, hoje=self.hoje)
+        self.assertIsNone(proximo)
+        self.assertEqual(grupos[0], (amanha, grupos[0][1]))
+        self.assertTrue(grupos[0][1][0]['prevista'])
+        self.assertEqual(len(grupos[1][1]), 1)
+        response = self.client.get(reverse('calendario_visao', args=['agenda']))
+        self.assertEqual(response.status_code, 200)
+
+    def test_visao_invalida_e_api(self):
+        """Visão desconhecida dá 404; a API conta por dia e valida o intervalo"""
+        self.assertEqual(self.client.get(reverse('calendario_visao', args=['ano'])).status_code, 404)
+        self.tarefas(self.hoje, 3, concluidas=1)
+        url = reverse('api_calendario')
+        response = self.client.get(url, {'de': self.hoje.isoformat(), 'ate': self.hoje.isoformat()})
+        self.assertEqual(response.json(), {'dias': [{'data': self.hoje.isoformat(), 'total': 3, 'abertas': 2}]})
+        self.assertEqual(self.client.get(url, {'de': self.hoje.isoformat()}).status_code, 400)
+        longe = self.hoje + datetime.timedelta(days=400)
+        self.assertEqual(self.client.get(url, {'de': self.hoje.isoformat(), 'ate': longe.isoformat()}).status_code, 400)
+
+    def test_datas_nos_limites(self):
+        """Datas do começo do ano 1 e do fim do ano 9999 não estouram a janela nem a navegação"""
+        d = datetime.date
+        self.assertEqual(calendario.limitar(d(9999, 12, 31)), d(9999, 10, 30))
+        self.assertEqual(calendario.limitar(d(2024, 2, 14)), d(2024, 2, 14))
+        self.tarefas(d(9999, 12, 31), 1)
+        for visao in calendario.VISOES:
+            for data in ('9999-12-31', '9999-12-01', '0001-01-01'):
+                response = self.client.get(reverse('calendario_visao', args=[visao]), {'data': data})
+                self.assertEqual(response.status_code, 200, (visao, data))
+        response = self.client.get(reverse('api_calendario'), {'de': '9999-12-01', 'ate': '9999-12-31'})
+        self.assertEqual(response.json(), {'dias': [{'data': '9999-12-31', 'total': 1, 'abertas': 1}]})
@@ -0,0 +1,63 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.utils import timezone
+from todo.models import Lista, Tarefa
+import datetime
+
+class GetCondicionalTest(TestCase):
+    """Testes para o ETag/Last-Modified do index e do get_list"""
+
+    def setUp(self):
+        """Cria um usuario logado com uma lista e uma tarefa"""
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.lista = Lista.objects.create(usuario=self.user,
+                                          titulo='Lista',
+                                          descricao='Descrição',
+                                          data_criacao=timezone.now(),
+                                          data_atualizacao=timezone.now())
+        self.tarefa = Tarefa.objects.create(titulo='Tarefa', descricao='Descrição', prioridade='alta',
+                                            dataCriacao=timezone.now(), lista=self.lista, user=self.user,
+                                            dataVencimento=datetime.date.today() + datetime.timedelta(days=1))
+        self.client.force_login(self.user)
+
+    def test_get_list_304(self):
+        """Com o ETag atual o get_list responde 304 sem renderizar a pagina"""
+        url = reverse('get_list', args=[self.lista.pk])
+        response = self.client.get(url)
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(2):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_get_list_deletar_tarefa_muda_etag(self):
+        """Deletar uma tarefa atualiza a lista, então o ETag antigo não vale mais"""
+        url = reverse('get_list', args=[self.lista.pk])
+        etag = self.client.get(url)['ETag']
+        self.client.post(reverse('set_task'), {'Deletar': self.tarefa.pk})
+        # Consome a mensagem de sucesso da deleção
+        self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_index_304_e_deletar_lista(self):
+        """O index responde 304 até uma lista do usuario ser alterada ou deletada"""
+        etag = self.client.get(reverse('index'))['ETag']
+        self.assertEqual(self.client.get(reverse('index'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Lista.objects.create(usuario=self.user, titulo='Outra', descricao='Descrição',
+                             data_criacao=self.lista.data_criacao, data_atualizacao=self.lista.data_atualizacao)
+        self.assertEqual(self.client.get(reverse('index'), HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_mensagem_pendente_nao_gera_304(self):
+        """Uma mensagem pendente precisa ser mostrada, então a pagina é renderizada"""
+        url = reverse('get_list', args=[self.lista.pk])
+        etag = self.client.get(url)['ETag']
+        # Deleta uma tarefa de outra lista, o que só deixa uma mensagem pendente para esta
+        outra = Lista.objects.create(usuario=self.user, titulo='Outra', descricao='Descrição',
+                                     data_criacao=timezone.now(), data_atualizacao=timezone.now())
+        tarefa = Tarefa.objects.create(titulo='Outra tarefa', descricao='Descrição', prioridade='alta',
+                                       dataCriacao=timezone.now(), lista=outra, user=self.user,
+                                       dataVencimento=datetime.date.today())
+        self.client.post(reverse('set_task'), {'Deletar': tarefa.pk})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertNotEqual(response.status_code, 304)
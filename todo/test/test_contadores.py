@@ -0,0 +1,87 @@
+from io import StringIO
+from django.test import TestCase
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.contrib.auth.models import User
+from django.utils import timezone
+from todo.models import Lista, Tarefa
+from todo import contadores, lote
+from todo.importar import importar_tarefas
+import datetime
+
+class ContadoresTest(TestCase):
+    """Testes para os contadores de tarefas guardados na Lista"""
+
+    def setUp(self):
+        """Cria um usuario com duas listas e tres tarefas na primeira"""
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        agora = timezone.now()
+        self.lista = Lista.objects.create(usuario=self.user, titulo='Lista', descricao='Descrição',
+                                          data_criacao=agora, data_atualizacao=agora)
+        self.destino = Lista.objects.create(usuario=self.user, titulo='Destino', descricao='Descrição',
+                                            data_criacao=agora, data_atualizacao=agora)
+        self.tarefas = [self.criar_tarefa(f'Tarefa {i}', status) for i, status in
+                        enumerate(['pendente', 'pendente', 'em andamento'])]
+
+    def criar_tarefa(self, titulo, status='pendente', lista=None):
+        hoje = datetime.date.today()
+        return Tarefa.objects.create(titulo=titulo, descricao='Descrição', prioridade='media', status=status,
+                                     concluido=status == 'concluido', dataCriacao=hoje, dataVencimento=hoje,
+                                     lista=lista or self.lista, user=self.user)
+
+    def assertContadores(self, lista, total, pendentes, em_andamento, concluidas):
+        lista = Lista.objects.get(pk=lista.pk)
+        self.assertEqual((lista.total_tarefas, lista.pendentes, lista.em_andamento, lista.concluidas),
+                         (total, pendentes, em_andamento, concluidas))
+        self.assertEqual(contadores.recalcular(Lista.objects.all(), corrigir=False), {})
+
+    def test_criar_editar_mover_e_deletar(self):
+        """save() e delete() de uma tarefa atualizam os contadores pelos signals"""
+        self.assertContadores(self.lista, 3, 2, 1, 0)
+        tarefa = Tarefa.objects.get(pk=self.tarefas[0].pk)
+        tarefa.status = 'concluido'
+        tarefa.save()
+        tarefa.save()
+        self.assertContadores(self.lista, 3, 1, 1, 1)
+        tarefa.lista = self.destino
+        tarefa.save()
+        self.assertContadores(self.lista, 2, 1, 1, 0)
+        self.assertContadores(self.destino, 1, 0, 0, 1)
+        tarefa.delete()
+        self.assertContadores(self.destino, 0, 0, 0, 0)
+
+    def test_save_da_lista_nao_sobrescreve(self):
+        """Salvar uma lista carregada antes de uma alteração nas tarefas mantem os contadores"""
+        lista = Lista.objects.get(pk=self.lista.pk)
+        self.criar_tarefa('Nova')
+        lista.titulo = 'Renomeada'
+        lista.save()
+        self.assertContadores(self.lista, 4, 3, 1, 0)
+
+    def test_lote_e_importacao(self):
+        """Ações em lote e a importação ajustam os contadores sem os signals"""
+        ids = [tarefa.pk for tarefa in self.tarefas]
+        lote.aplicar(self.user.pk, ids[:2], 'concluir')
+        self.assertContadores(self.lista, 3, 0, 1, 2)
+        lote.aplicar(self.user.pk, ids[1:], 'status', 'pendente')
+        self.assertContadores(self.lista, 3, 2, 0, 1)
+        lote.aplicar(self.user.pk, ids[:2], 'mover', self.destino.pk)
+        self.assertContadores(self.destino, 2, 1, 0, 1)
+        lote.aplicar(self.user.pk, ids, 'deletar')
+        self.assertContadores(self.lista, 0, 0, 0, 0)
+        self.assertContadores(self.destino, 0, 0, 0, 0)
+        hoje = datetime.date.today().isoformat()
+        importar_tarefas(self.lista, [{'titulo': 'A', 'status': 'concluido', 'dataVencimento': hoje},
+                                      {'titulo': 'B', 'dataVencimento': hoje}])
+        self.assertContadores(self.lista, 2, 1, 0, 1)
+
+    def test_comando_recalcular(self):
+        """O comando aponta os contadores errados com --verificar e os corrige sem ele"""
+        Lista.objects.filter(pk=self.lista.pk).update(total_tarefas=10, pendentes=0)
+        with self.assertRaises(CommandError):
+            call_command('recalcular_contadores', '--verificar', stdout=StringIO())
+        saida = StringIO()
+        call_command('recalcular_contadores', stdout=saida)
+        self.assertIn('total_tarefas 10 -> 3', saida.getvalue())
+        self.assertContadores(self.lista, 3, 2, 1, 0)
+        call_command('recalcular_contadores', '--verificar', stdout=StringIO())
@@ -0,0 +1,28 @@
+from django.test import TestCase, override_settings
+from django.db import connection
+from todo import db
+from todo.signals import configurar_conexao
+
+class ConexaoSqliteTest(TestCase):
+    """Testes para os PRAGMA aplicados nas conexões com o SQLite"""
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('PRAGMA só existem no SQLite')
+        self.originais = db.pragmas_atuais(connection, ['busy_timeout', 'cache_size'])
+
+    def tearDown(self):
+        db.configurar_sqlite(connection, self.originais)
+
+    @override_settings(TODO_SQLITE_PRAGMAS={'cache_size': -2000, 'busy_timeout': 1234})
+    def test_conexao_nova_recebe_os_pragmas(self):
+        """O receiver do connection_created aplica TODO_SQLITE_PRAGMAS"""
+        configurar_conexao(sender=connection.__class__, connection=connection)
+        self.assertEqual(db.pragmas_atuais(connection, ['busy_timeout', 'cache_size']),
+                         {'busy_timeout': 1234, 'cache_size': -2000})
+
+    @override_settings(TODO_SQLITE_PRAGMAS={})
+    def test_sem_pragmas_nao_altera(self):
+        """Sem TODO_SQLITE_PRAGMAS (desenvolvimento) a conexão fica como o SQLite abre"""
+        configurar_conexao(sender=connection.__class__, connection=connection)
+        self.assertEqual(db.pragmas_atuais(connection, ['busy_timeout', 'cache_size']), self.originais)
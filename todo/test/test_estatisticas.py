@@ -0,0 +1,103 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.urls import reverse
+from django.utils import timezone
+from todo.models import EstatisticaDiaria, Lista, Tarefa
+from todo import estatisticas, lote
+from todo.importar import importar_tarefas
+import datetime
+import io
+
+
+class EstatisticasTest(TestCase):
+    """Testes para as estatisticas diarias: somas incrementais, backfill, series e a pagina/API"""
+
+    def setUp(self):
+        self.hoje = datetime.date.today()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        agora = timezone.now()
+        self.lista = Lista.objects.create(usuario=self.user, titulo='Lista', descricao='Descrição',
+                                          data_criacao=agora, data_atualizacao=agora)
+        self.client.defaults['HTTP_HOST'] = 'localhost'
+        self.client.force_login(self.user)
+
+    def tarefa(self, titulo, prioridade='alta', **campos):
+        return Tarefa.objects.create(titulo=titulo, descricao='Descrição', prioridade=prioridade, dataCriacao=self.hoje,
+                                     dataVencimento=self.hoje, lista=self.lista, user=self.user, **campos)
+
+    def linha(self, dia=None):
+        return EstatisticaDiaria.objects.filter(usuario=self.user, dia=dia or self.hoje).values(*estatisticas.CAMPOS).first()
+
+    def assertSemDivergencias(self):
+        self.assertEqual(estatisticas.recalcular([self.user.pk], corrigir=False), {})
+
+    def test_editar_tarefa_soma_e_desconta(self):
+        """Concluir pelo editar_tarefa soma no dia; editar de novo não soma duas vezes; reabrir desconta"""
+        tarefa = self.tarefa('Relatório')
+        dados = {'titulo': 'Relatório', 'descricao': 'Descrição', 'prioridade': 'alta',
+                 'dataVencimento': self.hoje, 'status': 'concluido'}
+        self.client.post(reverse('editar_tarefa', args=[tarefa.pk]), dados)
+        self.client.post(reverse('editar_tarefa', args=[tarefa.pk]), {**dados, 'descricao': 'Outra'})
+        self.assertEqual(self.linha(), {'concluidas': 1, 'concluidas_atrasadas': 0, 'dias_ate_concluir': 0,
+                                        'alta': 1, 'media': 0, 'baixa': 0})
+        self.assertSemDivergencias()
+        self.client.post(reverse('editar_tarefa', args=[tarefa.pk]), {**dados, 'status': 'pendente'})
+        self.assertEqual(self.linha()['concluidas'], 0)
+        self.assertSemDivergencias()
+
+    def test_lote_e_importacao(self):
+        """update() das ações em lote e bulk_create da importação ajustam as linhas como o signal"""
+        ids = [self.tarefa(f'T{i}', prioridade=('alta', 'baixa', 'media')[i % 3]).pk for i in range(6)]
+        lote.aplicar(self.user.pk, ids[:4], 'concluir')
+        lote.aplicar(self.user.pk, ids[:2], 'status', 'em andamento')
+        importar_tarefas(self.lista, [{'titulo': 'Importada', 'status': 'concluido', 'prioridade': 'media',
+                                       'dataVencimento': self.hoje.isoformat()}])
+        self.assertEqual((self.linha()['concluidas'], self.linha()['media'], self.linha()['alta']), (3, 2, 1))
+        self.assertSemDivergencias()
+
+    def test_backfill(self):
+        """O comando reconstroi as linhas das tarefas concluidas antes da tabela existir"""
+        ontem = self.hoje - datetime.timedelta(days=1)
+        Tarefa.objects.bulk_create([
+            Tarefa(titulo=f'Antiga {i}', prioridade='baixa', status='concluido', concluido=True,
+                   dataCriacao=ontem - datetime.timedelta(days=4), dataVencimento=ontem - datetime.timedelta(days=i),
+                   dataConclusao=ontem, lista=self.lista, user=self.user)
+            for i in range(3)])
+        self.assertIsNone(self.linha(ontem))
+        with self.assertRaises(CommandError):
+            call_command('recalcular_estatisticas', '--verificar', stdout=io.StringIO())
+        call_command('recalcular_estatisticas', stdout=io.StringIO())
+        self.assertEqual(self.linha(ontem), {'concluidas': 3, 'concluidas_atrasadas': 2, 'dias_ate_concluir': 12,
+                                             'alta': 0, 'media': 0, 'baixa': 3})
+        call_command('recalcular_estatisticas', '--verificar', stdout=io.StringIO())
+
+    def test_serie_por_semana_e_mes(self):
+        """Periodos sem conclusões aparecem zerados; totais e derivados de todo o intervalo"""
+        segunda = self.hoje - datetime.timedelta(days=self.hoje.weekday() + 14)
+        EstatisticaDiaria.objects.bulk_create([
+            EstatisticaDiaria(usuario=self.user, dia=segunda, concluidas=2, concluidas_atrasadas=1,
+                              dias_ate_concluir=6, alta=2),
+            EstatisticaDiaria(usuario=self.user, dia=segunda + datetime.timedelta(days=2), concluidas=2,
+                              dias_ate_concluir=2, baixa=1),
+        ])
+        with self.assertNumQueries(1):
+            periodos, totais = estatisticas.serie(self.user.pk, segunda, self.hoje, 'semana')
+        self.assertEqual([linha['concluidas'] for linha in periodos], [4, 0, 0])
+        self.assertEqual((totais['media_dias'], totais['taxa_atraso'], totais['sem_prioridade']), (2.0, 25.0, 1))
+        periodos, totais = estatisticas.serie(self.user.pk, agrupamento='mes')
+        self.assertEqual((periodos[0]['periodo'], totais['concluidas']), (segunda.replace(day=1), 4))
+
+    def test_pagina_e_api(self):
+        """A pagina e a API leem só as linhas diarias; a API valida o intervalo e o agrupamento"""
+        EstatisticaDiaria.objects.create(usuario=self.user, dia=self.hoje, concluidas=1, media=1)
+        for periodo in ('30', 'tudo'):
+            response = self.client.get(reverse('estatisticas'), {'periodo': periodo})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.context['totais']['concluidas'], 1)
+        url = reverse('api_estatisticas')
+        dados = self.client.get(url, {'agrupamento': 'mes'}).json()
+        self.assertEqual((dados['totais']['concluidas'], dados['situacao']['atrasadas']), (1, 0))
+        self.assertEqual(self.client.get(url, {'agrupamento': 'ano'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'de': '2000-01-01'}).status_code, 400)
@@ -0,0 +1,84 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.core.management import call_command, CommandError
+from django.utils import timezone
+from todo.models import Lista, Tarefa
+from todo.exportar import linhas_ics, tarefas_para_exportar
+from todo.importar import ler_linhas
+import datetime
+import io
+import os
+import tempfile
+
+class ExportarTarefasTest(TestCase):
+    """Testes para a exportação de tarefas em csv e ics"""
+
+    def setUp(self):
+        """Cria um usuario logado com duas listas e tres tarefas"""
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.listas = [Lista.objects.create(usuario=self.user, titulo=titulo, descricao='Descrição',
+                                            data_criacao=timezone.now(), data_atualizacao=timezone.now())
+                       for titulo in ('Casa', 'Trabalho')]
+        self.vencimento = datetime.date.today() + datetime.timedelta(days=3)
+        for i, lista in enumerate([self.listas[0], self.listas[0], self.listas[1]]):
+            Tarefa.objects.create(titulo=f'Tarefa {i}', descricao='Linha 1\nLinha 2, com virgula', prioridade='alta',
+                                  dataCriacao=datetime.date.today(), lista=lista, user=self.user,
+                                  dataVencimento=self.vencimento)
+        self.client.force_login(self.user)
+
+    def test_exportar_csv_streaming(self):
+        """O csv de todas as tarefas é uma resposta em streaming que pode ser reimportada"""
+        response = self.client.get(reverse('exportar_tarefas', args=['csv']))
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment', response['Content-Disposition'])
+        conteudo = b''.join(response.streaming_content).decode()
+        linhas = ler_linhas(io.StringIO(conteudo), 'csv')
+        self.assertEqual([linha['titulo'] for linha in linhas], ['Tarefa 0', 'Tarefa 1', 'Tarefa 2'])
+        self.assertEqual(linhas[0]['dataVencimento'], self.vencimento.isoformat())
+        self.assertEqual(linhas[2]['lista'], 'Trabalho')
+
+    def test_exportar_lista_ics(self):
+        """O ics de uma lista tem um VTODO por tarefa, com DUE, texto escapado e CRLF"""
+        response = self.client.get(reverse('exportar_lista', args=[self.listas[0].pk, 'ics']))
+        conteudo = b''.join(response.streaming_content).decode()
+        self.assertTrue(response['Content-Type'].startswith('text/calendar'))
+        self.assertEqual(conteudo.count('BEGIN:VTODO'), 2)
+        self.assertIn(f'DUE;VALUE=DATE:{self.vencimento:%Y%m%d}\r\n', conteudo)
+        self.assertIn('DESCRIPTION:Linha 1\\nLinha 2\\, com virgula\r\n', conteudo)
+        self.assertTrue(conteudo.endswith('END:VCALENDAR\r\n'))
+        self.assertNotIn('\n', conteudo.replace('\r\n', ''))
+
+    def test_ics_dobra_linhas_longas(self):
+        """Linhas com mais de 75 octetos são quebradas e continuam com um espaço"""
+        Tarefa.objects.filter(titulo='Tarefa 0').update(titulo='Tarefa çãõ ' * 10)
+        conteudo = ''.join(linhas_ics(tarefas_para_exportar(self.user.pk)))
+        for linha in conteudo.split('\r\n'):
+            self.assertLessEqual(len(linha.encode()), 75)
+        self.assertIn('SUMMARY:' + 'Tarefa çãõ ' * 10, conteudo.replace('\r\n ', ''))
+
+    def test_exportar_formato_invalido_e_lista_de_outro(self):
+        """Formato desconhecido é 404 e lista de outro usuario volta para o index"""
+        self.assertEqual(self.client.get(reverse('exportar_tarefas', args=['pdf'])).status_code, 404)
+        outro = User.objects.create_user(username='outro', password='testpassword')
+        lista = Lista.objects.create(usuario=outro, titulo='Outra', descricao='Descrição',
+                                     data_criacao=timezone.now(), data_atualizacao=timezone.now())
+        response = self.client.get(reverse('exportar_lista', args=[lista.pk, 'csv']))
+        self.assertRedirects(response, reverse('index'))
+
+    def test_exportar_consultas_constantes(self):
+        """A exportação faz uma unica consulta, independente da quantidade de tarefas"""
+        with self.assertNumQueries(1):
+            ''.join(linhas_ics(tarefas_para_exportar(self.user.pk), chunk_size=1))
+
+    def test_comando(self):
+        """O comando exportar_tarefas grava o arquivo de uma lista"""
+        with tempfile.TemporaryDirectory() as pasta:
+            caminho = os.path.join(pasta, 'tarefas.csv')
+            call_command('exportar_tarefas', 'testuser', '--lista', str(self.listas[1].pk), '--saida', caminho,
+                         stderr=io.StringIO())
+            with open(caminho, encoding='utf-8', newline='') as arquivo:
+                linhas = ler_linhas(arquivo, 'csv')
+        self.assertEqual([linha['titulo'] for linha in linhas], ['Tarefa 2'])
+        with self.assertRaises(CommandError):
+            call_command('exportar_tarefas', 'ninguem')
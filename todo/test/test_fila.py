@@ -0,0 +1,93 @@
+from io import StringIO
+from django.test import TestCase, override_settings
+from django.core import mail
+from django.core.management import call_command
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from todo.models import Trabalho
+from todo import fila
+
+executados = []
+
+
+@fila.trabalho('teste_anotar')
+def anotar(valor, sufixo=''):
+    executados.append(f'{valor}{sufixo}')
+
+
+@fila.trabalho('teste_falhar', max_tentativas=2)
+def falhar():
+    raise RuntimeError('servidor fora do ar')
+
+
+@override_settings(TODO_FILA_ESPERA=10)
+class FilaTest(TestCase):
+    """Testes para a fila de trabalhos em segundo plano e o comando worker"""
+
+    def setUp(self):
+        executados.clear()
+
+    def test_ordem_por_prioridade_e_agendamento(self):
+        """Maior prioridade primeiro, depois os mais antigos; os agendados para depois ficam na fila"""
+        fila.enfileirar('teste_anotar', ['baixa'], prioridade=-1)
+        anotar.enfileirar('normal', sufixo='!')
+        fila.enfileirar('teste_anotar', ['alta'], prioridade=5)
+        fila.enfileirar('teste_anotar', ['depois'], prioridade=9,
+                        executar_em=timezone.now() + timezone.timedelta(hours=1))
+        self.assertEqual(fila.processar(lote=1), 1)
+        self.assertEqual(fila.processar(lote=10), 2)
+        self.assertEqual(fila.processar(lote=10), 0)
+        self.assertEqual(executados, ['alta', 'normal!', 'baixa'])
+        self.assertEqual(Trabalho.objects.filter(status='concluido').count(), 3)
+        self.assertEqual(Trabalho.objects.get(status='pendente').argumentos, ['depois'])
+
+    def test_tentativas_com_espera_ate_falhar(self):
+        """Um trabalho que falha volta para a fila com espera e fica como falhou na ultima tentativa"""
+        trabalho = falhar.enfileirar()
+        antes = timezone.now()
+        with self.assertLogs('todo.fila', 'WARNING'):
+            self.assertEqual(fila.processar(), 1)
+        trabalho.refresh_from_db()
+        self.assertEqual((trabalho.status, trabalho.tentativas), ('pendente', 1))
+        self.assertGreaterEqual(trabalho.executar_em, antes + timezone.timedelta(seconds=10))
+        self.assertIn('servidor fora do ar', trabalho.erro)
+        # Ainda esperando: não sai da fila
+        self.assertEqual(fila.processar(), 0)
+        Trabalho.objects.filter(pk=trabalho.pk).update(executar_em=timezone.now())
+        with self.assertLogs('todo.fila', 'ERROR'):
+            self.assertEqual(fila.processar(), 1)
+        trabalho.refresh_from_db()
+        self.assertEqual((trabalho.status, trabalho.tentativas), ('falhou', 2))
+        with self.assertRaises(ValueError):
+            fila.enfileirar('nao_existe')
+
+    @override_settings(TODO_FILA_EXPIRACAO=60)
+    def test_recuperar_trabalhos_presos(self):
+        """Trabalhos em executando há mais que a expiração voltam para a fila, ou falham sem tentativas"""
+        preso = anotar.enfileirar('preso')
+        sem_tentativas = anotar.enfileirar('sem tentativas')
+        recente = anotar.enfileirar('recente')
+        self.assertEqual(len(fila.pegar(lote=3)), 3)
+        velho = timezone.now() - timezone.timedelta(minutes=5)
+        Trabalho.objects.filter(pk__in=[preso.pk, sem_tentativas.pk]).update(iniciado_em=velho)
+        Trabalho.objects.filter(pk=sem_tentativas.pk).update(tentativas=3)
+        self.assertEqual(fila.recuperar(), 2)
+        status = dict(Trabalho.objects.values_list('pk', 'status'))
+        self.assertEqual(status, {preso.pk: 'pendente', sem_tentativas.pk: 'falhou', recente.pk: 'executando'})
+
+    def test_views_enfileiram_emails_e_worker_envia(self):
+        """Cadastro e troca de senha não enviam email na requisição; o worker envia depois"""
+        cliente = self.client
+        cliente.defaults['HTTP_HOST'] = 'localhost'
+        resposta = cliente.post(reverse('register'), {'username': 'novo', 'password': 'senha123',
+                                                      'email': 'novo@example.com'})
+        self.assertEqual(resposta.status_code, 302)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(list(Trabalho.objects.values_list('nome', flat=True)), ['boas_vindas'])
+
+        saida = StringIO()
+        call_command('worker', '--uma-vez', stdout=saida)
+        self.assertIn('Trabalhos executados: 1', saida.getvalue())
+        self.assertEqual(mail.outbox[0].to, ['novo@example.com'])
+        self.assertTrue(User.objects.get(username='novo').check_password('senha123'))
@@ -0,0 +1,39 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from todo.models import Lista, Tarefa
+from todo import contadores
+import io
+
+class GerarDadosTest(TestCase):
+    """Testes para o comando gerar_dados"""
+
+    def gerar(self, **opcoes):
+        call_command('gerar_dados', usuarios=2, listas=3, tarefas=20, stdout=io.StringIO(), **opcoes)
+
+    def test_quantidades_e_consistencia(self):
+        """Gera N usuarios x M listas x K tarefas com status e conclusão coerentes"""
+        self.gerar()
+        self.assertEqual(User.objects.filter(username__startswith='bench').count(), 2)
+        self.assertEqual(Lista.objects.count(), 6)
+        self.assertEqual(Tarefa.objects.count(), 120)
+        self.assertFalse(Tarefa.objects.filter(status='concluido', concluido=False).exists())
+        self.assertFalse(Tarefa.objects.filter(concluido=True, dataConclusao__isnull=True).exists())
+        self.assertTrue(User.objects.get(username='bench0').check_password('bench'))
+        self.assertEqual(contadores.recalcular(Lista.objects.all(), corrigir=False), {})
+
+    def test_deterministico(self):
+        """A mesma semente gera os mesmos dados"""
+        self.gerar(semente=7)
+        primeira = list(Tarefa.objects.order_by('titulo', 'user__username').values_list('status', 'prioridade'))
+        self.gerar(semente=7, limpar=True)
+        segunda = list(Tarefa.objects.order_by('titulo', 'user__username').values_list('status', 'prioridade'))
+        self.assertEqual(primeira, segunda)
+
+    def test_limpar_so_apaga_usuarios_gerados(self):
+        """--limpar não apaga usuarios que só começam com o prefixo"""
+        User.objects.create_user(username='benchmark', password='x')
+        self.gerar()
+        self.gerar(limpar=True)
+        self.assertTrue(User.objects.filter(username='benchmark').exists())
+        self.assertEqual(Lista.objects.count(), 6)
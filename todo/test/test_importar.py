@@ -0,0 +1,100 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command, CommandError
+from django.utils import timezone
+from todo.models import Lista, Tarefa
+from todo import importar
+from todo.importar import importar_tarefas, ler_linhas
+from unittest import mock
+import datetime
+import io
+import tempfile
+
+class ImportarTarefasTest(TestCase):
+    """Testes para a importação de tarefas em lote"""
+
+    def setUp(self):
+        """Configura usuario, lista e uma data de vencimento valida"""
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.lista = Lista.objects.create(usuario=self.user,
+                                          titulo='Lista',
+                                          descricao='Descrição',
+                                          data_criacao=timezone.now(),
+                                          data_atualizacao=timezone.now())
+        self.vencimento = (datetime.date.today() + datetime.timedelta(days=7)).isoformat()
+
+    def linhas(self, quantidade):
+        return [{'titulo': f'Tarefa {i}', 'prioridade': 'alta', 'dataVencimento': self.vencimento}
+                for i in range(quantidade)]
+
+    def test_importa_em_lotes(self):
+        """Insere todas as tarefas com poucas consultas, independente da quantidade de linhas:
+    - 1 consulta de titulos, 1 da ultima posição da lista, INSERTs em lotes e 1 UPDATE na lista,
+    mais os savepoints (o SQLite aceita 999 parametros por consulta: 76 tarefas de 13 campos por INSERT)"""
+        with self.assertNumQueries(9):
+            total = importar_tarefas(self.lista, self.linhas(250), batch_size=100)
+        self.assertEqual(total, 250)
+        self.assertEqual(Tarefa.objects.filter(lista=self.lista).count(), 250)
+
+    def test_titulo_existente_nao_importa_nada(self):
+        """Um titulo já usado pelo usuario invalida o arquivo inteiro"""
+        importar_tarefas(self.lista, self.linhas(1))
+        with self.assertRaises(ValidationError) as contexto:
+            importar_tarefas(self.lista, self.linhas(3))
+        self.assertIn('O nome da tarefa "Tarefa 0" já está em uso', contexto.exception.messages)
+        self.assertEqual(Tarefa.objects.count(), 1)
+
+    def test_titulo_criado_durante_a_importacao(self):
+        """Um titulo criado entre a validação e o INSERT vira ValidationError e nada é importado"""
+        importar_tarefas(self.lista, self.linhas(1))
+        # A validação não vê a tarefa que já existe, como se ela tivesse sido criada logo depois
+        with mock.patch.object(importar, '_titulos_existentes', side_effect=[set(), {'Tarefa 0'}]):
+            with self.assertRaises(ValidationError) as contexto:
+                importar_tarefas(self.lista, self.linhas(3))
+        self.assertIn('durante a importação', contexto.exception.messages[0])
+        self.assertEqual(Tarefa.objects.count(), 1)
+        self.assertEqual(Lista.objects.get(pk=self.lista.pk).total_tarefas, 1)
+
+    def test_erros_por_linha(self):
+        """Reporta titulos repetidos no arquivo e datas vencidas com o numero da linha"""
+        linhas = self.linhas(2) + [{'titulo': 'Tarefa 0', 'dataVencimento': '01/01/2000'}]
+        with self.assertRaises(ValidationError) as contexto:
+            importar_tarefas(self.lista, linhas)
+        self.assertIn('Linha 3: o titulo "Tarefa 0" está repetido no arquivo', contexto.exception.messages)
+        self.assertIn('Linha 3: informe uma data de vencimento válida', contexto.exception.messages)
+
+    def test_ler_jsonl(self):
+        """Le um arquivo jsonl ignorando linhas em branco"""
+        arquivo = ['{"titulo": "A", "dataVencimento": "%s"}' % self.vencimento, '', '{"titulo": "B"}']
+        self.assertEqual([linha['titulo'] for linha in ler_linhas(arquivo, 'jsonl')], ['A', 'B'])
+
+    def test_view_importa_csv(self):
+        """Importa um csv enviado pela view e redireciona para a lista"""
+        self.client.login(username='testuser', password='testpassword')
+        conteudo = f'titulo,prioridade,dataVencimento\nTarefa A,alta,{self.vencimento}\nTarefa B,baixa,{self.vencimento}\n'
+        response = self.client.post(reverse('importar_tarefas', args=[self.lista.pk]), {
+            'formato': 'csv',
+            'arquivo': SimpleUploadedFile('tarefas.csv', conteudo.encode('utf-8')),
+        })
+        self.assertRedirects(response, reverse('get_list', args=[self.lista.pk]))
+        self.assertEqual(Tarefa.objects.filter(lista=self.lista).count(), 2)
+
+    def test_view_lista_de_outro_usuario(self):
+        """Impede importar para a lista de outro usuario"""
+        User.objects.create_user(username='testuser2', password='testpassword')
+        self.client.login(username='testuser2', password='testpassword')
+        response = self.client.get(reverse('importar_tarefas', args=[self.lista.pk]))
+        self.assertRedirects(response, reverse('index'))
+
+    def test_comando(self):
+        """Importa um arquivo jsonl pelo comando importar_tarefas"""
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', encoding='utf-8') as arquivo:
+            arquivo.write('{"titulo": "Comando", "dataVencimento": "%s"}\n' % self.vencimento)
+            arquivo.flush()
+            call_command('importar_tarefas', self.lista.pk, arquivo.name, stdout=io.StringIO())
+            with self.assertRaises(CommandError):
+                call_command('importar_tarefas', self.lista.pk, arquivo.name)
+        self.assertTrue(Tarefa.objects.filter(titulo='Comando').exists())
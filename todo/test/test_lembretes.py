@@ -0,0 +1,79 @@
+from io import StringIO
+from django.test import TestCase, override_settings
+from django.core import mail
+from django.core.management import call_command
+from django.contrib.auth.models import User
+from django.utils import timezone
+from todo.models import Lista, Tarefa
+from todo import lembretes
+import datetime
+
+class LembretesTest(TestCase):
+    """Testes para o prazo das tarefas e os lembretes das que vencem em breve"""
+
+    def setUp(self):
+        """Cria dois usuarios com email e um sem, com tarefas vencendo hoje, amanhã e daqui a uma semana"""
+        self.hoje = datetime.date.today()
+        self.ana = User.objects.create_user(username='ana', password='x', email='ana@example.com')
+        self.bia = User.objects.create_user(username='bia', password='x', email='bia@example.com')
+        self.sem_email = User.objects.create_user(username='sememail', password='x')
+        self.hoje_ana = self.criar_tarefa(self.ana, 'Hoje', 0)
+        self.amanha_ana = self.criar_tarefa(self.ana, 'Amanhã', 1)
+        self.semana_ana = self.criar_tarefa(self.ana, 'Semana', 7)
+        self.hoje_bia = self.criar_tarefa(self.bia, 'Hoje bia', 0)
+        self.criar_tarefa(self.sem_email, 'Sem email', 0)
+
+    def criar_tarefa(self, usuario, titulo, dias):
+        agora = timezone.now()
+        lista, _ = Lista.objects.get_or_create(usuario=usuario, titulo='Lista', defaults={
+            'descricao': 'Descrição', 'data_criacao': agora, 'data_atualizacao': agora})
+        return Tarefa.objects.create(titulo=titulo, descricao='Descrição', prioridade='media', dataCriacao=self.hoje,
+                                     dataVencimento=self.hoje + datetime.timedelta(days=dias), lista=lista, user=usuario)
+
+    def test_prazo_no_modelo_e_no_queryset(self):
+        """is_overdue/is_due_soon e os filtros e anotações do queryset concordam"""
+        Tarefa.objects.filter(pk=self.semana_ana.pk).update(dataVencimento=self.hoje - datetime.timedelta(days=2))
+        vencida = Tarefa.objects.get(pk=self.semana_ana.pk)
+        self.assertTrue(vencida.is_overdue)
+        self.assertFalse(vencida.is_due_soon)
+        self.assertTrue(Tarefa.objects.get(pk=self.amanha_ana.pk).is_due_soon)
+        self.assertEqual(list(Tarefa.objects.atrasadas()), [vencida])
+        self.assertEqual(Tarefa.objects.vencendo(dias=1).count(), 4)
+        anotadas = {tarefa.pk: (tarefa.atrasada, tarefa.vence_em_breve) for tarefa in Tarefa.objects.com_prazo()}
+        self.assertEqual(anotadas[vencida.pk], (True, False))
+        self.assertEqual(anotadas[self.hoje_bia.pk], (False, True))
+        Tarefa.objects.filter(pk=vencida.pk).update(concluido=True)
+        self.assertFalse(Tarefa.objects.get(pk=vencida.pk).is_overdue)
+        self.assertFalse(Tarefa.objects.atrasadas().exists())
+
+    @override_settings(TODO_LEMBRETE_DIAS=7)
+    def test_prazo_segue_o_setting(self):
+        """is_due_soon, vencendo() e com_prazo() usam o mesmo TODO_LEMBRETE_DIAS por padrão"""
+        self.assertTrue(Tarefa.objects.get(pk=self.semana_ana.pk).is_due_soon)
+        self.assertEqual(Tarefa.objects.vencendo().count(), 5)
+        self.assertTrue(Tarefa.objects.com_prazo().get(pk=self.semana_ana.pk).vence_em_breve)
+        self.assertEqual(Tarefa.objects.vencendo(dias=1).count(), 4)
+
+    def test_um_email_por_usuario_uma_vez_por_vencimento(self):
+        """Cada usuario com email recebe um lembrete com as suas tarefas, que não se repete"""
+        self.assertEqual(lembretes.enviar(dias=1), (2, 3))
+        self.assertEqual(sorted(email.to[0] for email in mail.outbox), ['ana@example.com', 'bia@example.com'])
+        email_ana = next(email for email in mail.outbox if email.to == ['ana@example.com'])
+        self.assertIn('Hoje (Lista), vence hoje', email_ana.body)
+        self.assertNotIn('Semana', email_ana.body)
+        self.assertEqual(lembretes.enviar(dias=1), (0, 0))
+        Tarefa.objects.filter(pk=self.hoje_ana.pk).update(dataVencimento=self.hoje + datetime.timedelta(days=1))
+        self.assertEqual(lembretes.enviar(dias=1), (1, 1))
+
+    def test_consultas_nao_dependem_dos_usuarios(self):
+        """Uma consulta para achar os lembretes e um UPDATE por lote, independente de quantos usuarios"""
+        with self.assertNumQueries(2):
+            lembretes.enviar(dias=7)
+
+    def test_comando_simular(self):
+        """--simular conta os lembretes sem enviar nem marcar"""
+        saida = StringIO()
+        call_command('enviar_lembretes', '--simular', '--dias', '1', stdout=saida)
+        self.assertIn('2 usuarios, 3 tarefas', saida.getvalue())
+        self.assertEqual(mail.outbox, [])
+        self.assertFalse(Tarefa.objects.filter(lembrete_vencimento__isnull=False).exists())
@@ -0,0 +1,94 @@
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from todo.models import Lista, Tarefa
+from todo import contadores, lote
+import datetime
+import json
+
+class LoteTest(TestCase):
+    """Testes para as ações em lote nas tarefas"""
+
+    def setUp(self):
+        """Cria um usuario logado com duas listas, 30 tarefas na primeira e outro usuario com uma tarefa"""
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.outro = User.objects.create_user(username='outro', password='testpassword')
+        self.ontem = timezone.now() - datetime.timedelta(days=1)
+        self.lista = self.criar_lista(self.user, 'Lista')
+        self.destino = self.criar_lista(self.user, 'Destino')
+        hoje = datetime.date.today()
+        self.tarefas = Tarefa.objects.bulk_create([
+            Tarefa(titulo=f'Tarefa {i}', descricao='Descrição', prioridade='baixa', status='pendente',
+                   dataCriacao=hoje, dataVencimento=hoje, lista=self.lista, user=self.user)
+            for i in range(30)
+        ])
+        self.ids = [tarefa.pk for tarefa in self.tarefas]
+        # bulk_create não passa pelos signals que mantem os contadores da lista
+        contadores.recalcular(Lista.objects.filter(pk=self.lista.pk))
+        lista_outro = self.criar_lista(self.outro, 'Lista do outro')
+        self.tarefa_outro = Tarefa.objects.create(titulo='Do outro', descricao='Descrição', prioridade='baixa',
+                                                  dataCriacao=hoje, dataVencimento=hoje,
+                                                  lista=lista_outro, user=self.outro)
+        self.client.force_login(self.user)
+
+    def criar_lista(self, usuario, titulo):
+        return Lista.objects.create(usuario=usuario, titulo=titulo, descricao='Descrição',
+                                    data_criacao=self.ontem, data_atualizacao=self.ontem)
+
+    def test_concluir(self):
+        """Concluir mantem concluido e dataConclusao coerentes e atualiza a lista"""
+        self.assertEqual(lote.aplicar(self.user.pk, self.ids[:10], 'concluir'), 10)
+        self.assertEqual(Tarefa.objects.filter(status='concluido', concluido=True,
+                                               dataConclusao=datetime.date.today()).count(), 10)
+        self.lista.refresh_from_db()
+        self.assertGreater(self.lista.data_atualizacao, self.ontem)
+        # Voltar para pendente limpa a conclusão
+        lote.aplicar(self.user.pk, self.ids[:10], 'status', 'pendente')
+        self.assertFalse(Tarefa.objects.filter(concluido=True).exists())
+        self.assertFalse(Tarefa.objects.filter(dataConclusao__isnull=False).exists())
+
+    def test_mover_e_prioridade(self):
+        """Mover troca a lista das tarefas e atualiza as duas listas"""
+        lote.aplicar(self.user.pk, self.ids[:5], 'prioridade', 'alta')
+        self.assertEqual(Tarefa.objects.filter(prioridade='alta').count(), 5)
+        self.assertEqual(lote.aplicar(self.user.pk, self.ids[:5], 'mover', self.destino.pk), 5)
+        self.assertEqual(Tarefa.objects.filter(lista=self.destino).count(), 5)
+        self.destino.refresh_from_db()
+        self.assertGreater(self.destino.data_atualizacao, self.ontem)
+        with self.assertRaises(ValidationError):
+            lote.aplicar(self.user.pk, self.ids[:5], 'mover', self.tarefa_outro.lista_id)
+
+    def test_posse_conferida(self):
+        """Uma tarefa de outro usuario no meio cancela a ação inteira"""
+        with self.assertRaises(ValidationError):
+            lote.aplicar(self.user.pk, self.ids[:3] + [self.tarefa_outro.pk], 'deletar')
+        self.assertEqual(Tarefa.objects.count(), 31)
+        with self.assertRaises(ValidationError):
+            lote.aplicar(self.user.pk, self.ids[:3], 'prioridade', 'urgente')
+
+    def test_consultas_nao_dependem_da_quantidade(self):
+        """Alterar 3 ou 30 tarefas custa as mesmas consultas"""
+        # A primeira conclusão do dia ainda cria a linha das estatisticas diarias
+        lote.aplicar(self.user.pk, self.ids[:1], 'concluir')
+        with CaptureQueriesContext(connection) as poucas:
+            lote.aplicar(self.user.pk, self.ids[1:4], 'concluir')
+        with CaptureQueriesContext(connection) as muitas:
+            lote.aplicar(self.user.pk, self.ids[4:], 'concluir')
+        self.assertEqual(len(poucas), len(muitas))
+
+    def test_view_e_api(self):
+        """O formulario do get_list e a API aplicam a ação e respondem de acordo"""
+        response = self.client.post(reverse('tarefas_lote'), {'ids': self.ids[:2], 'operacao': 'deletar',
+                                                              'lista': self.lista.pk})
+        self.assertRedirects(response, reverse('get_list', args=[self.lista.pk]))
+        self.assertEqual(Tarefa.objects.filter(lista=self.lista).count(), 28)
+        response = self.client.post(reverse('api_tarefas_lote'), json.dumps(
+            {'ids': self.ids[2:6], 'operacao': 'status', 'valor': 'em andamento'}), content_type='application/json')
+        self.assertEqual(response.json(), {'alteradas': 4})
+        response = self.client.post(reverse('api_tarefas_lote'), json.dumps(
+            {'ids': [self.tarefa_outro.pk], 'operacao': 'concluir'}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,91 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.utils import timezone
+from todo.models import Lista, Tarefa
+from todo import metricas
+import datetime
+import json
+import os
+import tempfile
+
+def valor(nome, *rotulos):
+    """Valor atual de uma metrica neste processo"""
+    return metricas.instantaneo().get((nome, rotulos), 0)
+
+class MetricasTest(TestCase):
+    """Testes para as metricas do /metrics"""
+
+    def setUp(self):
+        """Cria um usuario logado com uma lista"""
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        agora = timezone.now()
+        self.lista = Lista.objects.create(usuario=self.user, titulo='Lista', descricao='Descrição',
+                                          data_criacao=agora, data_atualizacao=agora)
+        self.client.force_login(self.user)
+
+    def test_contadores_de_tarefas(self):
+        """Criar, concluir e deletar uma tarefa soma nos contadores, uma vez cada"""
+        antes = [valor(f'todo_tarefas_{nome}_total') for nome in ('criadas', 'concluidas', 'deletadas')]
+        tarefa = Tarefa.objects.create(titulo='Tarefa', descricao='Descrição', prioridade='alta',
+                                       dataCriacao=datetime.date.today(), dataVencimento=datetime.date.today(),
+                                       lista=self.lista, user=self.user)
+        tarefa = Tarefa.objects.get(pk=tarefa.pk)
+        tarefa.status = 'concluido'
+        tarefa.save()
+        tarefa.save()
+        self.client.post(reverse('get_list', args=[self.lista.pk]), {'Deletar': tarefa.pk})
+        depois = [valor(f'todo_tarefas_{nome}_total') for nome in ('criadas', 'concluidas', 'deletadas')]
+        self.assertEqual([d - a for a, d in zip(antes, depois)], [1, 1, 1])
+
+    def test_logins(self):
+        """O formulario de login conta sucessos e falhas"""
+        sucesso, falha = valor('todo_logins_total', 'sucesso'), valor('todo_logins_total', 'falha')
+        self.client.post(reverse('login'), {'user': 'testuser', 'password': 'errada'})
+        self.client.post(reverse('login'), {'user': 'testuser', 'password': 'testpassword'})
+        self.assertEqual(valor('todo_logins_total', 'sucesso'), sucesso + 1)
+        self.assertEqual(valor('todo_logins_total', 'falha'), falha + 1)
+
+    def test_latencia_e_consultas_por_rota(self):
+        """Cada requisição entra no histograma e no contador de consultas da sua rota"""
+        antes = metricas.instantaneo().get(('todo_requisicao_segundos', ('get_list', 'GET')), [0] * 14)
+        consultas = valor('todo_db_consultas_total', 'get_list')
+        self.client.get(reverse('get_list', args=[self.lista.pk]))
+        depois = metricas.instantaneo()[('todo_requisicao_segundos', ('get_list', 'GET'))]
+        self.assertEqual(depois[-1], antes[-1] + 1)
+        self.assertGreater(valor('todo_db_consultas_total', 'get_list'), consultas)
+
+    def test_acesso(self):
+        """O /metrics é só para staff ou para quem tem o token"""
+        self.assertEqual(self.client.get(reverse('metricas')).status_code, 403)
+        with override_settings(TODO_METRICAS_TOKEN='segredo'):
+            response = self.client.get(reverse('metricas'), HTTP_AUTHORIZATION='Bearer segredo')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('# TYPE todo_requisicao_segundos histogram', response.content.decode())
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('metricas')).status_code, 200)
+
+    def test_formato_texto(self):
+        """Buckets acumulados, +Inf, soma e total no formato do Prometheus"""
+        texto = metricas.texto({
+            ('todo_requisicao_segundos', ('index', 'GET')): [1, 0, 2] + [0] * 9 + [0.5, 3],
+            ('todo_logins_total', ('fa"lha',)): 2,
+        })
+        self.assertIn('todo_requisicao_segundos_bucket{rota="index",metodo="GET",le="0.005"} 1', texto)
+        self.assertIn('todo_requisicao_segundos_bucket{rota="index",metodo="GET",le="0.025"} 3', texto)
+        self.assertIn('todo_requisicao_segundos_bucket{rota="index",metodo="GET",le="+Inf"} 3', texto)
+        self.assertIn('todo_requisicao_segundos_count{rota="index",metodo="GET"} 3', texto)
+        self.assertIn('todo_logins_total{resultado="fa\\"lha"} 2', texto)
+        self.assertIn('todo_tarefas_criadas_total 0', texto)
+
+    def test_multiprocesso(self):
+        """Com TODO_METRICAS_DIR o /metrics soma os snapshots dos outros processos"""
+        with tempfile.TemporaryDirectory() as diretorio, override_settings(TODO_METRICAS_DIR=diretorio):
+            with open(os.path.join(diretorio, '1-0.json'), 'w') as arquivo:
+                json.dump([['todo_logins_total', ['sucesso'], 5]], arquivo)
+            local = valor('todo_logins_total', 'sucesso')
+            total = metricas.agregado()
+            self.assertEqual(total[('todo_logins_total', ('sucesso',))], local + 5)
+            self.assertEqual(len(os.listdir(diretorio)), 2)
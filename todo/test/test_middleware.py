@@ -0,0 +1,53 @@
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+from django.contrib.auth.models import User
+from todo.middleware import CHAVE_EXPIRACAO
+import time
+
+class SessionTimeoutMiddlewareTest(TestCase):
+    """Testes para a expiração do login guardada na sessão"""
+
+    def setUp(self):
+        """Cria um usuario logado"""
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.client.force_login(self.user)
+
+    def expirar(self, client, segundos=0):
+        """Muda a expiração gravada na sessão do client"""
+        session = client.session
+        session[CHAVE_EXPIRACAO] = time.time() + segundos
+        session.save()
+
+    def test_login_define_expiracao(self):
+        """O login grava na sessão quando ele expira"""
+        expira = self.client.session[CHAVE_EXPIRACAO]
+        self.assertAlmostEqual(expira, time.time() + 3600, delta=60)
+
+    def test_sessao_expirada_desloga(self):
+        """Com a sessão expirada o usuario é deslogado e avisado"""
+        self.expirar(self.client, -1)
+        response = self.client.get(reverse('user_info'), follow=True)
+        self.assertFalse(response.context['user'].is_authenticated)
+        self.assertIn('Seu login expirou', [str(m) for m in response.context['messages']])
+
+    def test_absoluto_nao_renova(self):
+        """No modo absoluto as requisições não adiam a expiração"""
+        self.expirar(self.client, 100)
+        antes = self.client.session[CHAVE_EXPIRACAO]
+        self.client.get(reverse('user_info'))
+        self.assertEqual(self.client.session[CHAVE_EXPIRACAO], antes)
+
+    @override_settings(TODO_SESSION_TIMEOUT_MODO='deslizante')
+    def test_deslizante_renova(self):
+        """No modo deslizante cada requisição adia a expiração"""
+        self.expirar(self.client, 100)
+        self.client.get(reverse('user_info'))
+        self.assertAlmostEqual(self.client.session[CHAVE_EXPIRACAO], time.time() + 3600, delta=60)
+
+    def test_sessoes_independentes(self):
+        """A expiração é por sessão: expirar um navegador não desloga o outro"""
+        outro = Client()
+        outro.force_login(self.user)
+        self.expirar(self.client, -1)
+        self.client.get(reverse('user_info'))
+        self.assertEqual(outro.get(reverse('user_info')).status_code, 200)
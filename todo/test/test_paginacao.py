@@ -0,0 +1,62 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.utils import timezone
+from todo.models import Lista, Tarefa
+from todo.paginacao import paginar, tamanho_pagina
+import datetime
+
+class PaginacaoTest(TestCase):
+    """Testes para a paginação por cursor das tarefas do get_list"""
+
+    def setUp(self):
+        """Cria uma lista com tarefas que repetem a mesma data de vencimento"""
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.lista = Lista.objects.create(usuario=self.user,
+                                          titulo='Lista',
+                                          descricao='Descrição',
+                                          data_criacao=timezone.now(),
+                                          data_atualizacao=timezone.now())
+        hoje = datetime.date.today()
+        Tarefa.objects.bulk_create([
+            Tarefa(titulo=f'Tarefa {i}', dataCriacao=hoje, dataVencimento=hoje + datetime.timedelta(days=i % 3),
+                   lista=self.lista, user=self.user)
+            for i in range(10)
+        ])
+        self.queryset = Tarefa.objects.filter(lista=self.lista)
+
+    def test_paginas_cobrem_todas_as_tarefas_em_ordem(self):
+        """Percorre todas as paginas sem repetir nem pular tarefas, na ordem (dataVencimento, id)"""
+        vistas = []
+        cursor = None
+        while True:
+            pagina = paginar(self.queryset, 'dataVencimento', cursor, 3)
+            vistas.extend(pagina.itens)
+            cursor = pagina.proximo
+            if cursor is None:
+                break
+        esperado = list(self.queryset.order_by('dataVencimento', 'id'))
+        self.assertEqual(vistas, esperado)
+
+    def test_cursor_invalido_volta_para_primeira_pagina(self):
+        """Um cursor adulterado é ignorado"""
+        pagina = paginar(self.queryset, 'dataVencimento', 'invalido', 3)
+        self.assertEqual(pagina.itens, paginar(self.queryset, 'dataVencimento', None, 3).itens)
+
+    def test_tamanho_limitado(self):
+        """O tamanho da pagina respeita os limites das configurações"""
+        with self.settings(TODO_PAGE_SIZE=50, TODO_PAGE_SIZE_MAX=200):
+            self.assertEqual(tamanho_pagina('abc'), 50)
+            self.assertEqual(tamanho_pagina('1000'), 200)
+            self.assertEqual(tamanho_pagina('0'), 1)
+
+    def test_view_fragmento(self):
+        """O get_list com fragmento=1 renderiza só os cards e informa o proximo cursor no cabeçalho"""
+        self.client.login(username='testuser', password='testpassword')
+        response = self.client.get(reverse('get_list', args=[self.lista.pk]), {'tamanho': 4})
+        self.assertEqual(len(response.context['tarefas']), 4)
+        response = self.client.get(reverse('get_list', args=[self.lista.pk]),
+                                   {'tamanho': 4, 'cursor': response.context['proximo'], 'fragmento': 1})
+        self.assertTemplateUsed(response, 'todo/tarefas.html')
+        self.assertTemplateNotUsed(response, 'todo/get_list.html')
+        self.assertTrue(response['X-Proximo-Cursor'])
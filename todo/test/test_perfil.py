@@ -0,0 +1,76 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.contrib.auth.models import User
+from todo.models import Lista
+from todo import perfil
+from django.utils import timezone
+import json
+
+@override_settings(TODO_PERFIL_AMOSTRA=1)
+class PerfilMiddlewareTest(TestCase):
+    """Testes para o perfil por amostragem das requisições"""
+
+    def setUp(self):
+        """Cria um usuario comum com uma lista e um usuario staff"""
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.staff = User.objects.create_user(username='staff', password='testpassword', is_staff=True)
+        agora = timezone.now()
+        self.lista = Lista.objects.create(usuario=self.user, titulo='Lista', descricao='Descricao',
+                                          data_criacao=agora, data_atualizacao=agora)
+        perfil.resumo.limpar()
+
+    def test_mede_consultas_e_templates(self):
+        """A requisição amostrada vira uma linha JSON com consultas e templates"""
+        self.client.force_login(self.user)
+        with self.assertLogs('todo.perfil', 'INFO') as logs:
+            self.client.get(reverse('get_list', args=[self.lista.pk]))
+        medicao = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(medicao['rota'], 'get_list')
+        self.assertEqual(medicao['status'], 200)
+        self.assertGreater(medicao['consultas'], 0)
+        self.assertIn('todo/get_list.html', medicao['templates'])
+        rotas = {rota['rota']: rota for rota in perfil.resumo.relatorio()['rotas']}
+        self.assertEqual(rotas['get_list']['requisicoes'], 1)
+
+    @override_settings(ROOT_URLCONF='todo.test.test_assincrono')
+    async def test_mede_consultas_async(self):
+        """Na view async as consultas rodam na thread do sync_to_async e também são contadas"""
+        await self.async_client.aforce_login(self.user)
+        with self.assertLogs('todo.perfil', 'INFO') as logs:
+            response = await self.async_client.get(reverse('get_list', args=[self.lista.pk]))
+        self.assertEqual(response.status_code, 200)
+        medicao = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(medicao['rota'], 'get_list')
+        self.assertGreater(medicao['consultas'], 0)
+        self.assertGreater(medicao['sql_ms'], 0)
+
+    @override_settings(TODO_PERFIL_AMOSTRA=0)
+    def test_forcar_so_para_staff(self):
+        """?_perfil=1 só força a medição para usuarios staff"""
+        self.client.force_login(self.user)
+        self.client.get(reverse('index'), {'_perfil': 1})
+        self.assertEqual(perfil.resumo.relatorio()['rotas'], [])
+        self.client.force_login(self.staff)
+        with self.assertLogs('todo.perfil', 'INFO'):
+            self.client.get(reverse('index'), {'_perfil': 1})
+        self.assertEqual([rota['rota'] for rota in perfil.resumo.relatorio()['rotas']], ['index'])
+
+    def test_pagina_so_para_staff(self):
+        """Usuarios comuns são redirecionados da pagina de perfil"""
+        self.client.force_login(self.user)
+        with self.assertLogs('todo.perfil', 'INFO'):
+            response = self.client.get(reverse('perfil'))
+        self.assertEqual(response.status_code, 302)
+
+    def test_pagina_json_e_limpar(self):
+        """A pagina mostra o resumo em HTML ou JSON e o POST limpa o resumo"""
+        self.client.force_login(self.staff)
+        with self.assertLogs('todo.perfil', 'INFO'):
+            self.client.get(reverse('index'))
+            response = self.client.get(reverse('perfil'))
+            self.assertContains(response, 'Perfil das Requisições')
+            dados = self.client.get(reverse('perfil'), {'formato': 'json'}).json()
+            self.assertIn('index', [rota['rota'] for rota in dados['rotas']])
+            response = self.client.post(reverse('perfil'))
+        self.assertRedirects(response, reverse('perfil'))
+        self.assertNotIn('index', [rota['rota'] for rota in perfil.resumo.relatorio()['rotas']])
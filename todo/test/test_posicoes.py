@@ -0,0 +1,113 @@
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.urls import reverse
+from django.utils import timezone
+from todo.models import Lista, Tarefa, Trabalho
+from todo import fila, lote, posicoes
+import datetime
+import random
+
+
+class PosicoesTest(TestCase):
+    """Testes para a ordem manual das tarefas: chaves fracionarias, mover, rebalancear e a API"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        self.lista = self.criar_lista('Lista')
+        self.tarefas = [self.tarefa(f'T{i}') for i in range(5)]
+        self.client.defaults['HTTP_HOST'] = 'localhost'
+        self.client.force_login(self.user)
+
+    def criar_lista(self, titulo, usuario=None):
+        agora = timezone.now()
+        return Lista.objects.create(usuario=usuario or self.user, titulo=titulo, descricao='Descrição',
+                                    data_criacao=agora, data_atualizacao=agora)
+
+    def tarefa(self, titulo, lista=None):
+        lista = lista or self.lista
+        return Tarefa.objects.create(titulo=titulo, descricao='Descrição', prioridade='media',
+                                     dataCriacao=datetime.date.today(), dataVencimento=datetime.date.today(),
+                                     lista=lista, user=lista.usuario)
+
+    def ordem(self, lista=None):
+        return list(Tarefa.objects.filter(lista=lista or self.lista).order_by('posicao', 'pk')
+                    .values_list('titulo', flat=True))
+
+    def test_entre_mantem_a_ordem(self):
+        """Inserções aleatórias entre chaves vizinhas sempre caem entre elas"""
+        gerador = random.Random(7)
+        chaves = posicoes.seguintes(None, 3)
+        for _ in range(500):
+            indice = gerador.randint(0, len(chaves))
+            a = chaves[indice - 1] if indice else None
+            b = chaves[indice] if indice < len(chaves) else None
+            nova = posicoes.entre(a, b)
+            self.assertTrue((a or '') < nova and (b is None or nova < b), (a, nova, b))
+            self.assertFalse(nova.endswith('0'))
+            chaves.insert(indice, nova)
+        self.assertEqual(chaves, sorted(chaves))
+        self.assertEqual(posicoes.espacadas(4), sorted(set(posicoes.espacadas(4))))
+
+    def test_tarefas_novas_no_fim(self):
+        """save() e as importações/movimentos em lote colocam as tarefas no fim da lista"""
+        self.assertEqual(self.ordem(), ['T0', 'T1', 'T2', 'T3', 'T4'])
+        outra = self.criar_lista('Outra')
+        self.tarefa('O0', lista=outra)
+        lote.aplicar(self.user.pk, [self.tarefas[3].pk, self.tarefas[1].pk], 'mover', outra.pk)
+        self.assertEqual(self.ordem(outra), ['O0', 'T1', 'T3'])
+
+    def test_mover_grava_uma_linha(self):
+        """Mover para o topo, para o meio e para o fim muda só a chave da tarefa movida"""
+        antes = dict(Tarefa.objects.values_list('pk', 'posicao'))
+        t0, t1, t2, t3, t4 = self.tarefas
+        with self.assertNumQueries(6):
+            posicoes.mover(self.user.pk, t4.pk, None)
+        posicoes.mover(self.user.pk, t0.pk, t2.pk)
+        posicoes.mover(self.user.pk, t1.pk, t3.pk)
+        self.assertEqual(self.ordem(), ['T4', 'T2', 'T0', 'T3', 'T1'])
+        depois = dict(Tarefa.objects.values_list('pk', 'posicao'))
+        self.assertEqual({pk for pk in antes if antes[pk] != depois[pk]}, {t0.pk, t1.pk, t4.pk})
+
+    @override_settings(TODO_POSICAO_LIMITE=8)
+    def test_chaves_longas_agendam_rebalanceamento(self):
+        """Inserir sempre no mesmo lugar alonga a chave; o trabalho da fila reescreve a lista na mesma ordem"""
+        t0, t1 = self.tarefas[:2]
+        for tarefa in self.tarefas[2:]:
+            posicoes.mover(self.user.pk, tarefa.pk, t0.pk)
+        for _ in range(40):
+            posicoes.mover(self.user.pk, self.tarefas[2].pk, t0.pk)
+            posicoes.mover(self.user.pk, self.tarefas[3].pk, t0.pk)
+        ordem = self.ordem()
+        self.assertEqual(Trabalho.objects.filter(nome='rebalancear_posicoes', status='pendente').count(), 1)
+        fila.processar()
+        self.assertEqual(self.ordem(), ordem)
+        self.assertTrue(all(len(chave) <= posicoes.LARGURA for chave in
+                            Tarefa.objects.values_list('posicao', flat=True)))
+
+    def test_empates_rebalanceiam_na_hora(self):
+        """Chaves repetidas (ou vazias, de um bulk_create) são reescritas antes do movimento"""
+        Tarefa.objects.filter(lista=self.lista).update(posicao='')
+        t0, t1, t2, t3, t4 = self.tarefas
+        posicoes.mover(self.user.pk, t4.pk, t1.pk)
+        self.assertEqual(self.ordem(), ['T0', 'T1', 'T4', 'T2', 'T3'])
+
+    def test_api_e_get_list(self):
+        """A API move só tarefas do usuario na mesma lista; o get_list mostra a nova ordem"""
+        t0, t1, t2, _, t4 = self.tarefas
+        url = reverse('api_tarefa_posicao', args=[t4.pk])
+        self.client.get(reverse('get_list', args=[self.lista.pk]))
+        resposta = self.client.post(url, {'depois_de': t0.pk}, content_type='application/json')
+        self.assertEqual(resposta.status_code, 200)
+        response = self.client.get(reverse('get_list', args=[self.lista.pk]))
+        self.assertEqual([tarefa.titulo for tarefa in response.context['tarefas']], ['T0', 'T4', 'T1', 'T2', 'T3'])
+
+        estranho = User.objects.create_user(username='outro', password='x')
+        alheia = self.tarefa('Alheia', lista=self.criar_lista('Dele', usuario=estranho))
+        separada = self.tarefa('Separada', lista=self.criar_lista('Outra'))
+        for depois_de in (alheia.pk, separada.pk, t4.pk):
+            self.assertEqual(self.client.post(url, {'depois_de': depois_de}, content_type='application/json')
+                             .status_code, 400)
+        self.assertEqual(self.client.post(url, {}, content_type='application/json').status_code, 400)
+        with self.assertRaises(ValidationError):
+            posicoes.mover(estranho.pk, t1.pk, None)
@@ -0,0 +1,181 @@
+from contextlib import contextmanager
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.utils import timezone
+from todo.models import Lista, Tarefa
+from todo import contadores, posicoes
+import datetime
+
+class QueryBudgetTest(TestCase):
+    """
+    Orçamento de consultas SQL por view. Cada teste falha quando a view passa a fazer mais
+    consultas do que o orçamento, o que normalmente indica um N+1 novo.
+    """
+
+    def setUp(self):
+        """Cria um usuario logado com uma lista cheia de tarefas"""
+        self.user = User.objects.create_user(username='testuser', password='testpassword', email='test@gmail.com')
+        self.lista = Lista.objects.create(usuario=self.user,
+                                          titulo='Lista',
+                                          descricao='Descrição',
+                                          data_criacao=timezone.now(),
+                                          data_atualizacao=timezone.now())
+        self.vencimento = datetime.date.today() + datetime.timedelta(days=1)
+        self.tarefas = Tarefa.objects.bulk_create([
+            Tarefa(titulo=f'Tarefa {i}', descricao='Descrição', prioridade='alta', dataCriacao=datetime.date.today(),
+                   dataVencimento=self.vencimento, lista=self.lista, user=self.user, posicao=chave)
+            for i, chave in enumerate(posicoes.espacadas(30))
+        ])
+        # bulk_create não passa pelos signals que mantem os contadores da lista
+        contadores.recalcular(Lista.objects.all())
+        self.client.force_login(self.user)
+
+    @contextmanager
+    def assertMaxQueries(self, orcamento):
+        """Falha se o bloco fizer mais que `orcamento` consultas, mostrando as consultas feitas"""
+        with CaptureQueriesContext(connection) as contexto:
+            yield contexto
+        consultas = '\n'.join(consulta['sql'] for consulta in contexto.captured_queries)
+        self.assertLessEqual(len(contexto), orcamento,
+                             f'{len(contexto)} consultas, orçamento de {orcamento}:\n{consultas}')
+
+    def test_index_anonimo(self):
+        self.client.logout()
+        with self.assertMaxQueries(0):
+            self.client.get(reverse('index'))
+
+    def test_index_logado(self):
+        """Usuario, validador do GET condicional e uma unica consulta agregada para as listas (a sessão vem do cache)"""
+        for i in range(5):
+            Lista.objects.create(usuario=self.user, titulo=f'Outra {i}', descricao='Descrição',
+                                 data_criacao=timezone.now(), data_atualizacao=timezone.now())
+        with self.assertMaxQueries(3):
+            response = self.client.get(reverse('index'))
+        self.assertEqual(response.context['listas'][0]['total'], 0)
+
+    def test_index_contagens(self):
+        """Os totais e o percentual vêm dos contadores da lista, as atrasadas da subconsulta"""
+        tarefa = Tarefa.objects.get(pk=self.tarefas[0].pk)
+        tarefa.status, tarefa.concluido = 'concluido', True
+        tarefa.save()
+        Tarefa.objects.filter(pk=self.tarefas[1].pk).update(dataVencimento=datetime.date.today() - datetime.timedelta(days=1))
+        lista = self.client.get(reverse('index')).context['listas'][0]
+        self.assertEqual((lista['total'], lista['concluidas'], lista['atrasadas'], lista['percentual']), (30, 1, 1, 3))
+
+    def test_login(self):
+        self.client.logout()
+        with self.assertMaxQueries(0):
+            self.client.get(reverse('login'))
+        with self.assertMaxQueries(9):
+            self.client.post(reverse('login'), {'user': 'testuser', 'password': 'testpassword'})
+
+    def test_register(self):
+        self.client.logout()
+        with self.assertMaxQueries(0):
+            self.client.get(reverse('register'))
+        # +1: o INSERT do email de boas-vindas na fila
+        with self.assertMaxQueries(3):
+            self.client.post(reverse('register'), {'username': 'novo', 'password': 'senha', 'email': 'novo@example.com'})
+
+    def test_mudar_senha(self):
+        with self.assertMaxQueries(0):
+            self.client.get(reverse('mudarSenha'))
+        # +1: o INSERT do aviso de senha alterada na fila
+        with self.assertMaxQueries(4):
+            self.client.post(reverse('mudarSenha'), {'usuario': 'testuser', 'password': 'nova', 'password_repeat': 'nova',
+                                                     'email': 'test@gmail.com'})
+
+    def test_user_info(self):
+        with self.assertMaxQueries(1):
+            self.client.get(reverse('user_info'))
+
+    def test_logout(self):
+        with self.assertMaxQueries(3):
+            self.client.get(reverse('logout'))
+
+    def test_set_list(self):
+        """Usuario, titulo repetido e o INSERT numa transação; o formulario é salvo uma vez só"""
+        with self.assertMaxQueries(1):
+            self.client.get(reverse('set_list'))
+        with self.assertMaxQueries(5):
+            self.client.post(reverse('set_list'), {'titulo': 'Nova', 'descricao': 'Descrição'})
+
+    def test_get_list(self):
+        """A quantidade de consultas não depende da quantidade de tarefas na pagina"""
+        with self.assertMaxQueries(4):
+            response = self.client.get(reverse('get_list', args=[self.lista.pk]))
+        self.assertEqual(len(response.context['tarefas']), 30)
+
+    def test_get_list_deletar(self):
+        """Os receivers de post_delete de Tarefa fazem o cascade buscar as tarefas da lista (1 consulta),
+        mais 1 para as recorrencias da lista"""
+        with self.assertMaxQueries(6):
+            self.client.post(reverse('get_list', args=[self.lista.pk]), {'Deletar': self.lista.pk})
+
+    def test_set_task(self):
+        """Usuario, lista, titulo repetido, a ultima posição da lista, e o INSERT com o UPDATE da lista numa transação"""
+        with self.assertMaxQueries(1):
+            self.client.get(reverse('set_task'))
+        with self.assertMaxQueries(8):
+            response = self.client.post(reverse('set_task') + f'?Enviar={self.lista.pk}',
+                                        {'titulo': 'Nova', 'descricao': 'Descrição', 'prioridade': 'alta',
+                                         'dataVencimento': self.vencimento})
+        self.assertRedirects(response, reverse('get_list', args=[self.lista.pk]), fetch_redirect_response=False)
+        self.assertEqual(Lista.objects.get(pk=self.lista.pk).total_tarefas, 31)
+
+    def test_set_task_titulo_repetido(self):
+        """Uma tarefa que não foi salva não altera a lista"""
+        antes = Lista.objects.get(pk=self.lista.pk).data_atualizacao
+        self.client.post(reverse('set_task') + f'?Enviar={self.lista.pk}',
+                         {'titulo': 'Tarefa 0', 'descricao': 'Descrição', 'prioridade': 'alta',
+                          'dataVencimento': self.vencimento})
+        self.assertEqual(Lista.objects.get(pk=self.lista.pk).data_atualizacao, antes)
+        self.assertEqual(Tarefa.objects.filter(lista=self.lista).count(), 30)
+
+    def test_set_task_deletar(self):
+        """O delete desconta a tarefa dos contadores e atualiza a lista no mesmo UPDATE"""
+        with self.assertMaxQueries(4):
+            self.client.post(reverse('set_task'), {'Deletar': self.tarefas[0].pk})
+
+    def test_editar_lista(self):
+        with self.assertMaxQueries(2):
+            self.client.get(reverse('editar_lista', args=[self.lista.pk]))
+        with self.assertMaxQueries(9):
+            self.client.post(reverse('editar_lista', args=[self.lista.pk]), {'titulo': 'Editada', 'descricao': 'Descrição'})
+
+    def test_editar_tarefa(self):
+        """
+        A troca de status move a tarefa entre os contadores da lista (1 UPDATE) e soma a conclusão
+        nas estatisticas diarias (1 UPDATE; a primeira do dia insere a linha antes, mais 2)
+        """
+        tarefa = self.tarefas[0]
+        with self.assertMaxQueries(2):
+            self.client.get(reverse('editar_tarefa', args=[tarefa.pk]))
+        with self.assertMaxQueries(14):
+            self.client.post(reverse('editar_tarefa', args=[tarefa.pk]),
+                             {'titulo': 'Editada', 'descricao': 'Descrição', 'prioridade': 'alta',
+                              'dataVencimento': self.vencimento, 'status': 'concluido'})
+
+    def test_importar(self):
+        with self.assertMaxQueries(2):
+            self.client.get(reverse('importar_tarefas', args=[self.lista.pk]))
+
+    def test_index_e_get_list_em_cache(self):
+        """A segunda visita ao index e ao get_list só consulta o usuario e o validador do GET condicional"""
+        self.client.get(reverse('index'))
+        self.client.get(reverse('get_list', args=[self.lista.pk]))
+        with self.assertMaxQueries(2):
+            self.client.get(reverse('index'))
+        with self.assertMaxQueries(2):
+            self.client.get(reverse('get_list', args=[self.lista.pk]))
+
+    def test_cache_invalidado_pelos_signals(self):
+        """Criar, editar ou deletar uma tarefa troca a versão do cache do usuario e da lista"""
+        self.assertEqual(self.client.get(reverse('index')).context['listas'][0]['total'], 30)
+        self.client.post(reverse('set_task'), {'Deletar': self.tarefas[0].pk})
+        self.assertEqual(self.client.get(reverse('index')).context['listas'][0]['total'], 29)
+        response = self.client.get(reverse('get_list', args=[self.lista.pk]))
+        self.assertNotIn(self.tarefas[0].pk, [tarefa.pk for tarefa in response.context['tarefas']])
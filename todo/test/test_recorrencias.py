@@ -0,0 +1,143 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+from todo.models import Lista, Recorrencia, Tarefa
+from todo import contadores, recorrencias
+import datetime
+import unittest
+
+
+class RecorrenciasTest(TestCase):
+    """Testes para as tarefas recorrentes: datas, criação da proxima ocorrencia e materialização em lote"""
+
+    def setUp(self):
+        self.hoje = datetime.date.today()
+        self.user = User.objects.create_user(username='testuser', password='testpassword')
+        agora = timezone.now()
+        self.lista = Lista.objects.create(usuario=self.user, titulo='Rotina', descricao='Descrição',
+                                          data_criacao=agora, data_atualizacao=agora)
+        self.client.defaults['HTTP_HOST'] = 'localhost'
+        self.client.force_login(self.user)
+
+    def serie(self, frequencia, inicio, intervalo=1, fim=None, usuario=None, lista=None):
+        usuario = usuario or self.user
+        return Recorrencia.objects.create(usuario=usuario, lista=lista or self.lista, titulo=f'Serie {frequencia}',
+                                          prioridade='media', frequencia=frequencia, intervalo=intervalo,
+                                          inicio=inicio, fim=fim, proxima=inicio)
+
+    def test_datas_das_frequencias(self):
+        """Datas calculadas sem consultar o banco, a partir de qualquer dia, respeitando o fim"""
+        d = datetime.date
+        with self.assertNumQueries(0):
+            diaria = Recorrencia(frequencia='diaria', intervalo=2, inicio=d(2024, 1, 1), fim=d(2024, 1, 9))
+            self.assertEqual(list(recorrencias.datas(diaria, d(2024, 1, 4))),
+                             [d(2024, 1, 5), d(2024, 1, 7), d(2024, 1, 9)])
+            semanal = Recorrencia(frequencia='semanal', intervalo=1, inicio=d(2024, 1, 1))
+            self.assertEqual(list(recorrencias.datas(semanal, d(2024, 1, 2), d(2024, 1, 22))),
+                             [d(2024, 1, 8), d(2024, 1, 15), d(2024, 1, 22)])
+            mensal = Recorrencia(frequencia='mensal', intervalo=1, inicio=d(2024, 1, 31))
+            self.assertEqual(list(recorrencias.datas(mensal, d(2024, 2, 1), d(2024, 4, 30))),
+                             [d(2024, 2, 29), d(2024, 3, 31), d(2024, 4, 30)])
+            self.assertIsNone(recorrencias.primeira(diaria, d(2024, 1, 10)))
+
+    def test_concluir_ocorrencia_cria_a_proxima(self):
+        """set_task com repetir cria a serie; concluir a ocorrencia no editar_tarefa cria a seguinte uma vez só"""
+        response = self.client.post(reverse('set_task') + f'?Enviar={self.lista.pk}', {
+            'titulo': 'Regar', 'descricao': 'Plantas', 'prioridade': 'media', 'dataVencimento': self.hoje,
+            'repetir': 'semanal', 'intervalo': 1})
+        self.assertEqual(response.status_code, 302)
+        primeira = Tarefa.objects.get(titulo='Regar')
+        serie = primeira.recorrencia
+        self.assertEqual((serie.frequencia, serie.inicio, serie.proxima),
+                         ('semanal', self.hoje, self.hoje + datetime.timedelta(days=7)))
+
+        dados = {'titulo': 'Regar', 'descricao': 'Plantas', 'prioridade': 'media',
+                 'dataVencimento': self.hoje, 'status': 'concluido'}
+        self.client.post(reverse('editar_tarefa', args=[primeira.pk]), dados)
+        self.client.post(reverse('editar_tarefa', args=[primeira.pk]), dados)
+        proxima = self.hoje + datetime.timedelta(days=7)
+        ocorrencias = list(serie.tarefas.order_by('dataVencimento').values_list('titulo', 'dataVencimento', 'status'))
+        self.assertEqual(ocorrencias, [('Regar', self.hoje, 'concluido'),
+                                       (f'Regar ({proxima:%d/%m/%Y})', proxima, 'pendente')])
+        serie.refresh_from_db()
+        self.assertEqual(serie.proxima, self.hoje + datetime.timedelta(days=14))
+        self.assertEqual(contadores.recalcular(Lista.objects.all(), corrigir=False), {})
+
+    def test_concluir_ocorrencia_atrasada(self):
+        """Uma ocorrencia já vencida pode ser concluida no editar_tarefa e a serie continua"""
+        ontem = self.hoje - datetime.timedelta(days=1)
+        serie = self.serie('diaria', ontem)
+        atrasada = Tarefa.objects.create(titulo='Atrasada', descricao='Descrição', prioridade='media',
+                                         dataCriacao=ontem, dataVencimento=self.hoje, lista=self.lista,
+                                         user=self.user, recorrencia=serie)
+        Tarefa.objects.filter(pk=atrasada.pk).update(dataVencimento=ontem)
+        Recorrencia.objects.filter(pk=serie.pk).update(proxima=self.hoje)
+        response = self.client.post(reverse('editar_tarefa', args=[atrasada.pk]), {
+            'titulo': 'Atrasada', 'descricao': 'Descrição', 'prioridade': 'media',
+            'dataVencimento': ontem, 'status': 'concluido'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(list(serie.tarefas.order_by('dataVencimento').values_list('dataVencimento', 'status')),
+                         [(ontem, 'concluido'), (self.hoje, 'pendente')])
+        # Mudar para uma data passada continua proibido
+        response = self.client.post(reverse('editar_tarefa', args=[atrasada.pk]), {
+            'titulo': 'Atrasada', 'descricao': 'Descrição', 'prioridade': 'media',
+            'dataVencimento': ontem - datetime.timedelta(days=1), 'status': 'concluido'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_conflito_no_insert_nao_conta(self):
+        """Ocorrencias descartadas pelo ignore_conflicts não entram nos contadores nem no retorno"""
+        # Duas series do usuario com o mesmo titulo geram ocorrencias com o mesmo titulo no mesmo dia
+        self.serie('diaria', self.hoje)
+        self.serie('diaria', self.hoje)
+        self.assertEqual(recorrencias.materializar(), (2, 1))
+        self.assertEqual(Tarefa.objects.count(), 1)
+        self.assertEqual(contadores.recalcular(Lista.objects.all(), corrigir=False), {})
+
+    def test_materializar_em_lote(self):
+        """Consultas constantes por lote, idempotente, pula as datas passadas e ajusta os contadores"""
+        def criar_series(n, prefixo):
+            for i in range(n):
+                usuario = User.objects.create_user(username=f'{prefixo}{i}', password='x')
+                lista = Lista.objects.create(usuario=usuario, titulo='Lista', descricao='Descrição',
+                                             data_criacao=timezone.now(), data_atualizacao=timezone.now())
+                self.serie('diaria', self.hoje - datetime.timedelta(days=3), usuario=usuario, lista=lista)
+
+        criar_series(3, 'poucas')
+        with self.assertNumQueries(10) as poucas:
+            self.assertEqual(recorrencias.materializar(), (3, 3))
+        criar_series(30, 'muitas')
+        with self.assertNumQueries(len(poucas)):
+            self.assertEqual(recorrencias.materializar(), (30, 30))
+
+        self.assertEqual(set(Tarefa.objects.values_list('dataVencimento', flat=True)), {self.hoje})
+        self.assertFalse(Recorrencia.objects.exclude(proxima=self.hoje + datetime.timedelta(days=1)).exists())
+        self.assertEqual(recorrencias.materializar(), (0, 0))
+        Recorrencia.objects.update(proxima=self.hoje)
+        self.assertEqual(recorrencias.materializar(), (33, 0))
+        self.assertEqual(Tarefa.objects.count(), 33)
+        self.assertEqual(contadores.recalcular(Lista.objects.all(), corrigir=False), {})
+
+    def test_previstas_nao_inserem(self):
+        """As ocorrencias futuras do calendario são calculadas, não inseridas"""
+        semanal = self.serie('semanal', self.hoje)
+        self.serie('mensal', self.hoje, fim=self.hoje)
+        outro = User.objects.create_user(username='outro', password='x')
+        self.serie('diaria', self.hoje, usuario=outro,
+                   lista=Lista.objects.create(usuario=outro, titulo='Outra', descricao='Descrição',
+                                              data_criacao=timezone.now(), data_atualizacao=timezone.now()))
+        with self.assertNumQueries(1):
+            previstas = recorrencias.previstas(self.user.pk, self.hoje, self.hoje + datetime.timedelta(days=14))
+        self.assertEqual([data for _, data in previstas],
+                         [self.hoje, self.hoje, self.hoje + datetime.timedelta(days=7),
+                          self.hoje + datetime.timedelta(days=14)])
+        self.assertEqual({serie.pk for serie, _ in previstas[2:]}, {semanal.pk})
+        self.assertFalse(Tarefa.objects.exists())
+
+    @unittest.skipIf(recorrencias.rrule_disponivel(), 'python-dateutil instalado')
+    def test_rrule_sem_dateutil(self):
+        """Sem o python-dateutil a frequencia rrule não é oferecida nem aceita"""
+        serie = Recorrencia(usuario=self.user, lista=self.lista, titulo='Regra', frequencia='rrule',
+                            regra='FREQ=WEEKLY;BYDAY=MO', inicio=self.hoje)
+        with self.assertRaisesMessage(Exception, 'python-dateutil'):
+            serie.full_clean()
@@ -0,0 +1,73 @@
+from django.test import SimpleTestCase, RequestFactory, override_settings
+from django.contrib.sessions.backends.cache import SessionStore
+from django.contrib.auth.models import AnonymousUser, User
+from django.contrib.sessions.models import Session
+from todo.middleware import CHAVE_PRIMARIO, ReplicaMiddleware
+from todo.models import Tarefa
+from todo import routers
+import time
+
+@override_settings(TODO_REPLICAS=['replica'], TODO_REPLICA_FIXAR=5)
+class ReplicaRouterTest(SimpleTestCase):
+    """Testes para o roteamento das leituras para as replicas"""
+
+    def setUp(self):
+        self.router = routers.ReplicaRouter()
+        self.session = SessionStore()
+        self.addCleanup(routers.terminar)
+
+    def requisicao(self, metodo='get', escrever=False, usuario=None, limpar=False):
+        """Passa uma requisição pelo middleware e retorna para onde a view leria as tarefas"""
+        def view(request):
+            lido = self.router.db_for_read(Tarefa)
+            if escrever:
+                self.router.db_for_write(Tarefa)
+            if limpar:
+                request.session.flush()
+            return lido, self.router.db_for_read(Tarefa)
+        request = getattr(RequestFactory(), metodo)('/')
+        request.session = self.session
+        # Como o AuthenticationMiddleware, que fica depois do ReplicaMiddleware
+        request.user = usuario or User(pk=1)
+        return ReplicaMiddleware(view)(request)
+
+    def test_fora_de_requisicao_tudo_no_primario(self):
+        """Comandos e o shell leem e escrevem no primario"""
+        self.assertEqual(self.router.db_for_read(Tarefa), 'default')
+        self.assertEqual(self.router.db_for_write(Tarefa), 'default')
+        self.assertFalse(self.router.allow_migrate('replica', 'todo'))
+
+    def test_leia_o_que_escreveu(self):
+        """Depois de um POST as leituras do usuario ficam no primario até o prazo acabar"""
+        self.assertEqual(self.requisicao(), ('replica', 'replica'))
+        self.assertEqual(self.requisicao('post'), ('default', 'default'))
+        self.assertEqual(self.requisicao(), ('default', 'default'))
+        self.session[CHAVE_PRIMARIO] = time.time() - 1
+        self.assertEqual(self.requisicao(), ('replica', 'replica'))
+
+    def test_escrita_num_get(self):
+        """Uma escrita no meio de um GET passa o resto dele e as proximas leituras para o primario"""
+        self.assertEqual(self.requisicao(escrever=True), ('replica', 'default'))
+        self.assertGreater(self.session[CHAVE_PRIMARIO], time.time())
+
+    def test_post_anonimo_nao_cria_sessao(self):
+        """Um POST anonimo que não escreveu (login errado) não grava nada na sessão"""
+        self.requisicao('post', usuario=AnonymousUser())
+        self.assertNotIn(CHAVE_PRIMARIO, self.session)
+        self.assertFalse(self.session.modified)
+        self.requisicao('post', usuario=AnonymousUser(), escrever=True)
+        self.assertIn(CHAVE_PRIMARIO, self.session)
+
+    def test_sessao_limpa_nao_e_marcada(self):
+        """Depois do flush() do logout a sessão nova continua vazia"""
+        self.session.save()
+        self.requisicao('post', limpar=True)
+        self.assertIsNone(self.session.session_key)
+        self.assertNotIn(CHAVE_PRIMARIO, self.session)
+
+    def test_sessao_sempre_no_primario(self):
+        """A sessão, que diz se o usuario está fixado, nunca é lida das replicas"""
+        routers.iniciar(True)
+        self.assertEqual(self.router.db_for_read(Session), 'default')
+        self.router.db_for_write(Session)
+        self.assertEqual(self.router.db_for_read(Tarefa), 'replica')
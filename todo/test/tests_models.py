@@ -2,6 +2,7 @@ from django.test import TestCase
 from django.contrib.auth.models import User
 from ..models import Lista, Tarefa
 from django.core.exceptions import ValidationError
+from django.db import IntegrityError
 from django.utils import timezone
 import datetime
 class ListaModelTest(TestCase):
@@ -52,6 +53,20 @@ class ListaModelTest(TestCase):
             lista = Lista(**self.lista_data)
             lista.full_clean()
 
+    def test_constraint_titulo_duplicado_no_banco(self):
+        """Garante que o banco rejeita titulos duplicados mesmo sem passar pelo clean"""
+        Lista.objects.create(**self.lista_data)
+        with self.assertRaises(IntegrityError):
+            Lista.objects.bulk_create([Lista(**self.lista_data)])
+
+    def test_save_titulo_duplicado_sem_clean(self):
+        """Verifica que o IntegrityError do save vira ValidationError quando o clean é ignorado"""
+        Lista.objects.create(**self.lista_data)
+        lista = Lista(**self.lista_data)
+        lista.clean = lambda: None
+        with self.assertRaises(ValidationError):
+            lista.save()
+
     def test_data_atualizacao(self):
         """Garante que o campo data_atualizacao só aceite valores datetime válidos"""
         lista = Lista(**self.lista_data)
@@ -124,7 +139,7 @@ class TarefaModelTest(TestCase):
     # --- Testes de Métodos do Modelo ---
     def test_save_chama_full_clean(self):
         """Garante que o método save() chama a validação completa"""
-        with self.assertRaises(TypeError):
+        with self.assertRaises(ValidationError):
             tarefa = Tarefa(user=self.user, lista=self.lista)
             tarefa.save()
 
@@ -0,0 +1,72 @@
+import datetime
+
+from django.contrib.auth.models import User
+from django.core.mail import send_mail
+
+from . import contadores, estatisticas, lembretes, posicoes, recorrencias
+from .fila import trabalho
+from .models import Lista
+
+# Trabalhos da fila (todo/fila.py) usados pelo app. Os argumentos são guardados em JSON, então
+# recebem ids e textos, nunca objetos do modelo.
+
+
+@trabalho('email', prioridade=10)
+def enviar_email(assunto, corpo, para):
+    """ Envia um email simples; a fila tenta de novo se o servidor SMTP falhar """
+    send_mail(assunto, corpo, None, para)
+
+
+@trabalho('boas_vindas', prioridade=10)
+def boas_vindas(usuario_id):
+    """ Email de boas-vindas depois do cadastro """
+    usuario = User.objects.filter(pk=usuario_id).exclude(email='').first()
+    if usuario is not None:
+        send_mail('Bem-vindo ao Todo', f'Olá {usuario.username},\n\nSeu cadastro foi concluido.\n',
+                  None, [usuario.email])
+
+
+@trabalho('senha_alterada', prioridade=20)
+def senha_alterada(usuario_id):
+    """ Avisa o usuario por email que a senha dele foi alterada """
+    usuario = User.objects.filter(pk=usuario_id).exclude(email='').first()
+    if usuario is not None:
+        send_mail('Sua senha foi alterada',
+                  f'Olá {usuario.username},\n\nA senha da sua conta foi alterada. '
+                  'Se não foi você, procure o suporte.\n', None, [usuario.email])
+
+
+@trabalho('lembretes')
+def enviar_lembretes(dias=None):
+    """ Mesmo que o comando enviar_lembretes, para agendar pela fila """
+    lembretes.enviar(dias)
+
+
+@trabalho('recalcular_contadores', prioridade=-10)
+def recalcular_contadores(usuario_id=None):
+    """ Recalcula os contadores das listas (todas ou as de um usuario) """
+    listas = Lista.objects.all()
+    if usuario_id is not None:
+        listas = listas.filter(usuario_id=usuario_id)
+    contadores.recalcular(listas)
+
+
+@trabalho('recalcular_estatisticas', prioridade=-10)
+def recalcular_estatisticas(usuario_id=None):
+    """ Mesmo que o comando recalcular_estatisticas, para um usuario ou todos """
+    usuarios = User.objects.all()
+    if usuario_id is not None:
+        usuarios = usuarios.filter(pk=usuario_id)
+    estatisticas.recalcular_usuarios(usuarios)
+
+
+@trabalho('materializar_recorrencias')
+def materializar_recorrencias(dias=0):
+    """ Mesmo que o comando materializar_recorrencias """
+    recorrencias.materializar(ate=datetime.date.today() + datetime.timedelta(days=dias))
+
+
+@trabalho('rebalancear_posicoes', prioridade=-5)
+def rebalancear_posicoes(lista_id):
+    """ Reescreve as chaves de posição de uma lista que ficaram longas (ver todo/posicoes.py) """
+    posicoes.rebalancear(lista_id)
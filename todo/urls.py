@@ -1,8 +1,16 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import api, views
+
+# Sob ASGI as views de leitura mais acessadas usam as versões assincronas de todo/assincrono.py
+if getattr(settings, 'TODO_ASYNC_VIEWS', False):
+    from . import assincrono
+    leitura = api_leitura = assincrono
+else:
+    leitura, api_leitura = views, api
 
 urlpatterns = [
-    path('', views.index, name='index'),
+    path('', leitura.index, name='index'),
     path('login',views.custom_login, name='login'),
     path('register', views.register, name='register'),
     path('mudarSenha', views.mudarSenha, name='mudarSenha'),
@@ -12,8 +20,29 @@ urlpatterns = [
     path('logout',views.custom_logout, name='logout'),
     path('user_inf',views.user_info,name='user_info'),
     path('set_list',views.set_list, name='set_list'),
-    path('get_list/<int:pk>', views.getList, name='get_list'),
+    path('get_list/<int:pk>', leitura.getList, name='get_list'),
     path('set_task',views.set_task, name='set_task'),
+    path('importar/<int:pk>', views.importar, name='importar_tarefas'),
+    path('exportar/<str:formato>', views.exportar_tarefas, name='exportar_tarefas'),
+    path('exportar/<int:pk>/<str:formato>', views.exportar_lista, name='exportar_lista'),
     path('editar_lista/<int:pk>', views.editar_lista, name='editar_lista'),
-    path('editar_tarefa/<int:pk>', views.editar_tarefa, name='editar_tarefa')
+    path('editar_tarefa/<int:pk>', views.editar_tarefa, name='editar_tarefa'),
+    path('tarefas/lote', views.tarefas_lote, name='tarefas_lote'),
+    path('busca', views.buscar, name='buscar'),
+    path('calendario', views.calendario, name='calendario'),
+    path('calendario/<str:visao>', views.calendario, name='calendario_visao'),
+    path('estatisticas', views.estatisticas, name='estatisticas'),
+    path('perfil', views.perfil, name='perfil'),
+    path('metrics', views.metricas, name='metricas'),
+
+    # API JSON
+    path('api/listas', api_leitura.listas, name='api_listas'),
+    path('api/listas/<int:pk>', api_leitura.lista, name='api_lista'),
+    path('api/tarefas', api_leitura.tarefas, name='api_tarefas'),
+    path('api/tarefas/lote', api.tarefas_lote, name='api_tarefas_lote'),
+    path('api/busca', api.buscar, name='api_busca'),
+    path('api/calendario', api.calendario, name='api_calendario'),
+    path('api/estatisticas', api.estatisticas, name='api_estatisticas'),
+    path('api/tarefas/<int:pk>', api_leitura.tarefa, name='api_tarefa'),
+    path('api/tarefas/<int:pk>/posicao', api.posicao_tarefa, name='api_tarefa_posicao'),
 ]
\ No newline at end of file
@@ -1,21 +1,61 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.core.exceptions import ValidationError
 from todo.models import *
 from django.contrib.auth.models import User
 from django.utils import timezone
 from .forms import *
 from .forms_models import *
-from .user import auto_logout_after_one_hour
 from .sql import delete, error
+from .importar import ler_linhas, importar_tarefas
+from . import busca, calendario as calendario_app, estatisticas as estatisticas_app, lote
+from .trabalhos import boas_vindas, senha_alterada
+from .exportar import FORMATOS as FORMATOS_EXPORTACAO, exportar, tarefas_para_exportar
+from .paginacao import paginar
+from .cache import invalidar, obter, segredo_csrf, versao
+from .condicional import condicional_index, condicional_lista
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import require_POST
+from django.http import Http404, HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from . import metricas as metricas_app, perfil as perfil_requisicoes
+from django.conf import settings
+from django.utils.crypto import constant_time_compare
+import codecs
+import csv
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+import datetime
 #Os usuario não podem acessar as funções set_list, set_task, aditar_tarefa, editar_tarefa e user_info, se naõ estiver logado
 
 #Os usuario não podem acessar lista/tarefas que não foram eles que criaram
 
 # Depois de uma hora o usuario é deslogado automaticamente
 
-@auto_logout_after_one_hour
+def listas_com_progresso(usuario):
+    """
+    Retorna as listas do usuario com o total de tarefas, as atrasadas, as concluidas e o
+    percentual de conclusão. O total e as concluidas vêm dos contadores da lista, só as
+    atrasadas (que mudam com o dia) são contadas, numa subconsulta por lista
+    """
+    hoje = datetime.date.today()
+    atrasadas = Tarefa.objects.atrasadas(hoje).filter(lista=OuterRef('pk')).order_by().values('lista').annotate(n=Count('id')).values('n')
+    return Lista.objects.filter(usuario=usuario).annotate(
+        total=F('total_tarefas'),
+        atrasadas=Coalesce(Subquery(atrasadas), 0),
+        percentual=Case(
+            When(total_tarefas=0, then=Value(0)),
+            default=100 * F('concluidas') / F('total_tarefas'),
+            output_field=IntegerField(),
+        ),
+    ).order_by('-data_atualizacao').values(
+        'id', 'titulo', 'descricao', 'total', 'atrasadas', 'concluidas', 'pendentes', 'em_andamento', 'percentual'
+    )
+
+@cache_control(private=True, no_cache=True)
+@condicional_index
 def index(request):
     """ 
     Renderiza o index do site, renderizando o index_login se tiver usuario logado, caso contrario 
@@ -24,12 +64,16 @@ def index(request):
     if request.method == 'GET':
         
         if request.user.is_authenticated:
-            user = get_object_or_404(User, pk=request.user.pk)
-            listas = Lista.objects.filter(usuario = user).values()
+            # Os agregados ficam no cache até a proxima alteração nas listas ou tarefas do usuario
+            versao_usuario = versao('usuario', request.user.pk)
+            listas = obter(f'index:{request.user.pk}:{versao_usuario}:{datetime.date.today()}',
+                           lambda: list(listas_com_progresso(request.user)))
             context = {
                 'listas':listas,
                 'user_in':True,
-                'usuario':user.username
+                'usuario':request.user.username,
+                'versao':versao_usuario,
+                'csrf':segredo_csrf(request)
             }
             
             return render(request,'todo/index_login.html', context)
@@ -38,7 +82,6 @@ def index(request):
     else:
         return redirect('set_list')
 
-@auto_logout_after_one_hour
 def custom_login(request):
     """ 
     Faz o login do usuario
@@ -54,12 +97,13 @@ def custom_login(request):
             user = authenticate(request,username=usuario, password=senha)
             if user is not None:
                 login(request,user)
+                metricas_app.logins.inc('sucesso')
                 return redirect('index')
             else:
+                metricas_app.logins.inc('falha')
                 messages.error(request, 'Usuario ou senha estão incorretos')
                 return render(request, 'user/login.html',{'form':form})
 
-@auto_logout_after_one_hour
 def register(request):
     """ Faz o cadastro do usuario """
     if request.method == 'GET':
@@ -69,13 +113,15 @@ def register(request):
     else:
         form = RegisterForm(request.POST)
         if form.is_valid():
-            form.saveh(request.POST.get('username'),request.POST.get('password'),request.POST.get('email'))
+            user = form.saveh(request.POST.get('username'),request.POST.get('password'),request.POST.get('email'))
+            # O email sai pelo worker, o cadastro não espera o servidor SMTP
+            if user.email:
+                boas_vindas.enfileirar(user.pk)
             return redirect('login')
         else:
             messages.error(request,f'{form.errors}')
             return render(request, 'user/register.html',{'form':form})
         
-@auto_logout_after_one_hour
 def mudarSenha(request):
     """ Altera a senha do usuario """
     if request.method == 'GET':
@@ -89,6 +135,8 @@ def mudarSenha(request):
             user = get_object_or_404(User, username = usuario)
             user.set_password(form.cleaned_data.get('password'))
             user.save()
+            if user.email:
+                senha_alterada.enfileirar(user.pk)
             return redirect('login')
         elif not form.ipass():
             messages.error(request,'As senha não batem')
@@ -97,7 +145,6 @@ def mudarSenha(request):
             messages.error(request, 'Usuario não existe')
             return render(request, 'user/mudarSenha.html',{'form':form})
         
-@auto_logout_after_one_hour
 @login_required
 def set_list(request):
     """ Renderiza o formulario para adicionar uma lista """
@@ -108,20 +155,37 @@ def set_list(request):
         form = RegisterListForm(request.POST)
         return error(form, 'set_list',request)
     
-@auto_logout_after_one_hour
 @login_required
+@cache_control(private=True, no_cache=True)
+@condicional_lista
 def getList(request, pk):
         """ Mostra uma lista com mais detalhes """
         if not 'Deletar' in request.POST or request.method == 'GET':
 
-            lista = get_object_or_404(Lista,pk=pk)
-            if lista.usuario.pk == request.user.pk:
-                tarefas = Tarefa.objects.filter(lista = lista)
+            # A lista e as paginas de tarefas ficam no cache até a proxima alteração na lista
+            versao_lista = versao('lista', pk)
+            lista = obter(f'lista:{pk}:{versao_lista}', lambda: get_object_or_404(Lista,pk=pk))
+            if lista.usuario_id == request.user.pk:
+                # As tarefas são mostradas em paginas, na ordem manual da lista: (posicao, id)
+                cursor = request.GET.get('cursor', '')
+                tamanho = request.GET.get('tamanho', '')
+                pagina = obter(f'pagina:{pk}:{versao_lista}:{cursor}:{tamanho}',
+                               lambda: paginar(Tarefa.objects.filter(lista = lista), 'posicao', cursor, tamanho))
                 context={
                     'lista':lista,
-                    'tarefas':tarefas,
-                    'usuario':lista.usuario
+                    'tarefas':pagina.itens,
+                    'proximo':pagina.proximo,
+                    'cursor':cursor,
+                    'tamanho':tamanho,
+                    'usuario':request.user,
+                    'versao':versao_lista,
+                    'csrf':segredo_csrf(request)
                 }
+                if request.GET.get('fragmento'):
+                    # Somente os cards da pagina, usados pelo botão "Carregar mais"
+                    response = render(request,'todo/tarefas.html',context)
+                    response['X-Proximo-Cursor'] = pagina.proximo or ''
+                    return response
                 return render(request,'todo/get_list.html',context)
             else:
                 
@@ -131,49 +195,94 @@ def getList(request, pk):
             delete(request, Lista)
             return redirect('index')
         
-@auto_logout_after_one_hour
 @login_required
 def set_task(request):
     """ Renderiza o formulario para adiconar uma tarefa """
     if request.method == 'GET':
 
             form = RegisterTaskForm()
-            try:    
-                user = get_object_or_404(User, pk=request.user.pk)
-            except:
-                return redirect('login')
-            else:
-                return render(request,'todo/set_task.html',{'form':form,'usuario':user.username})
+            return render(request,'todo/set_task.html',{'form':form,'usuario':request.user.username})
     else:
         
         if not 'Deletar' in request.POST:
             lista = get_object_or_404(Lista, pk=request.GET.get('Enviar'))
-            if lista.usuario.pk == request.user.pk:
+            if lista.usuario_id == request.user.pk:
                 form = RegisterTaskForm(request.POST)
-                Lista.objects.filter(pk=request.GET.get('Enviar')).update(data_atualizacao = timezone.now())
-                return error(form, 'set_task',request, f'get_list/{lista.pk}')
+                # data_atualizacao da lista e o cache são atualizados pelos signals do save da tarefa
+                return error(form, 'set_task',request, f'get_list/{lista.pk}', lista=lista)
             else:
-               user = get_object_or_404(User, pk=request.user.pk)
                form = RegisterTaskForm()
                messages.error(request,' A tarefa que você tentou acessar não pertence a você')
                context={
                    'form':form,
-                   'usuario':user.username
+                   'usuario':request.user.username
                }
                return render(request, 'todo/set_task.html',context)
         else:   
 
-                tarefa = get_object_or_404(Tarefa,pk=request.POST.get('Deletar'))
-                delete(request,Tarefa)
-                return redirect('get_list', pk=tarefa.lista.pk)
+                tarefa = delete(request,Tarefa)
+                return redirect('get_list', pk=tarefa.lista_id)
    
-@auto_logout_after_one_hour       
+@login_required
+def importar(request, pk):
+    """ Importa varias tarefas de um arquivo csv ou jsonl para uma lista de uma só vez """
+    lista = get_object_or_404(Lista, pk=pk)
+    if lista.usuario_id != request.user.pk:
+        messages.error(request,'A lista que você está tentando acessar não pertence a você')
+        return redirect('index')
+    if request.method == 'GET':
+        form = ImportTaskForm()
+    else:
+        form = ImportTaskForm(request.POST, request.FILES)
+        if form.is_valid():
+            arquivo = codecs.iterdecode(form.cleaned_data['arquivo'], 'utf-8-sig')
+            try:
+                total = importar_tarefas(lista, ler_linhas(arquivo, form.cleaned_data['formato']))
+            except ValidationError as e:
+                for mensagem in e.messages[:20]:
+                    messages.error(request, mensagem)
+            except (UnicodeDecodeError, csv.Error):
+                messages.error(request, 'Não foi possivel ler o arquivo, envie um csv ou jsonl em UTF-8')
+            else:
+                messages.info(request, f'{total} tarefas importadas com sucesso')
+                return redirect('get_list', pk=lista.pk)
+    context = {
+        'form':form,
+        'lista':lista,
+        'usuario':request.user.username
+    }
+    return render(request, 'todo/import_task.html', context)
+
+def _resposta_exportacao(request, tarefas, formato, nome):
+    """ Resposta em streaming com o arquivo exportado """
+    if formato not in FORMATOS_EXPORTACAO:
+        raise Http404('Formato não suportado')
+    content_type, extensao = FORMATOS_EXPORTACAO[formato]
+    response = StreamingHttpResponse(exportar(tarefas, formato, nome, request.get_host().split(':')[0]),
+                                     content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="tarefas.{extensao}"'
+    return response
+
+@login_required
+def exportar_tarefas(request, formato):
+    """ Exporta todas as tarefas do usuario em csv ou ics """
+    return _resposta_exportacao(request, tarefas_para_exportar(request.user.pk), formato, 'Tarefas')
+
+@login_required
+def exportar_lista(request, pk, formato):
+    """ Exporta as tarefas de uma lista em csv ou ics """
+    lista = get_object_or_404(Lista, pk=pk)
+    if lista.usuario_id != request.user.pk:
+        messages.error(request,'A lista que você está tentando acessar não pertence a você')
+        return redirect('index')
+    return _resposta_exportacao(request, tarefas_para_exportar(request.user.pk, lista.pk), formato, lista.titulo)
+
 @login_required
 def editar_lista(request,pk):
     """ Renderiza o formulario para editar uma lista """
     lista = get_object_or_404(Lista,pk=pk)
     if request.method == "GET":
-        if lista.usuario.pk == request.user.pk:
+        if lista.usuario_id == request.user.pk:
             form = UpdateListForm(instance=lista)
             context = {
                 'form':form,
@@ -195,31 +304,35 @@ def editar_lista(request,pk):
         if form.is_valid():
             form.save()
             Lista.objects.filter(pk=pk).update(data_atualizacao = timezone.now())
+            invalidar(request.user.pk, [pk])
             return redirect('index')
         else:
             return error(form,'update_list',request, 'editar_lista')
        
-@auto_logout_after_one_hour            
 @login_required
 def editar_tarefa(request, pk):
     """ Renderiza o formulario para editar uma tarefa"""
     tarefa = get_object_or_404(Tarefa,pk=pk)
     if request.method == "GET":
         form = UpdateTaskForm(instance=tarefa)
-        return render(request,'todo/update_task.html',{'form':form,'usuario':tarefa.user})
+        return render(request,'todo/update_task.html',{'form':form,'usuario':request.user})
     else:
         
         form = UpdateTaskForm(request.POST, instance=tarefa)
-        if tarefa.user.pk == request.user.pk:
+        if tarefa.user_id == request.user.pk:
             if form.is_valid():
-                form.save()
-                Lista.objects.filter(pk=tarefa.lista.pk).update(data_atualizacao = timezone.now())
-                if form.cleaned_data.get('status') == 'concluido':
-                    Tarefa.objects.filter(pk=pk).update(concluido=True, dataConclusao = timezone.now())
+                # concluido e dataConclusao vão no mesmo save, assim os signals (contadores, cache,
+                # estatisticas) veem a tarefa como ficou; quem já estava concluida mantem a data
+                tarefa = form.instance
+                tarefa.concluido = form.cleaned_data.get('status') == 'concluido'
+                if tarefa.concluido:
+                    tarefa.dataConclusao = tarefa._conclusao_original or datetime.date.today()
                 else:
-                    Tarefa.objects.filter(pk=pk).update(concluido=False, dataConclusao = None)
+                    tarefa.dataConclusao = None
+                form.save()
+                Lista.objects.filter(pk=tarefa.lista_id).update(data_atualizacao = timezone.now())
 
-                return redirect('get_list', pk=tarefa.lista.pk)
+                return redirect('get_list', pk=tarefa.lista_id)
             else:
                return error(form,'update_task',request)
         else:
@@ -232,16 +345,130 @@ def editar_tarefa(request, pk):
             }
             return render(request, 'todo/update_task.html',context)
         
-@auto_logout_after_one_hour  
+@login_required
+def buscar(request):
+    """ Busca nos titulos e descrições das tarefas e listas do usuario """
+    termos = request.GET.get('q', '').strip()
+    context = {
+        'termos':termos,
+        'resultados':busca.buscar(request.user.pk, termos) if termos else [],
+        'usuario':request.user
+    }
+    return render(request, 'todo/busca.html', context)
+
+@login_required
+def calendario(request, visao='mes'):
+    """ Calendario das tarefas do usuario por vencimento: mês (com o mapa de calor), semana ou agenda """
+    if visao not in calendario_app.VISOES:
+        raise Http404
+    hoje = datetime.date.today()
+    try:
+        data = calendario_app.limitar(datetime.date.fromisoformat(request.GET.get('data', '')))
+    except ValueError:
+        data = hoje
+    context = {'visao':visao, 'data':data, 'hoje':hoje, 'usuario':request.user}
+    if visao == 'agenda':
+        grupos, proximo = calendario_app.agenda(request.user.pk, data, request.GET.get('cursor'),
+                                                request.GET.get('tamanho'))
+        context.update({'grupos':grupos, 'proximo':proximo})
+    else:
+        # Os dias ficam no cache até a proxima alteração nas tarefas do usuario (e até o fim do dia)
+        inicio, _ = calendario_app.janela(visao, data)
+        chave = visao if visao == 'semana' else f'{visao}:{data:%Y-%m}'
+        dias = obter(f'calendario:{request.user.pk}:{versao("usuario", request.user.pk)}:{chave}:{inicio}:{hoje}',
+                     lambda: calendario_app.dias(request.user.pk, visao, data, hoje))
+        anterior, proxima = calendario_app.navegacao(visao, data)
+        context.update({'semanas':[dias[i:i + 7] for i in range(0, len(dias), 7)], 'anterior':anterior,
+                        'proxima':proxima})
+    return render(request, 'todo/calendario.html', context)
+
+# Periodos da pagina de estatisticas: dias para trás (None = desde a primeira conclusão) e o agrupamento padrão
+PERIODOS_ESTATISTICAS = {'30': (30, 'dia'), '90': (90, 'semana'), '365': (365, 'semana'), 'tudo': (None, 'mes')}
+
+@login_required
+def estatisticas(request):
+    """ Estatisticas de produtividade do usuario, lidas das estatisticas diarias (sem varrer as tarefas) """
+    periodo = request.GET.get('periodo', '30')
+    if periodo not in PERIODOS_ESTATISTICAS:
+        periodo = '30'
+    dias, agrupamento = PERIODOS_ESTATISTICAS[periodo]
+    if request.GET.get('agrupamento') in estatisticas_app.AGRUPAMENTOS:
+        agrupamento = request.GET['agrupamento']
+    # Uma barra por dia só até um ano; anos de historico dia a dia não cabem no grafico
+    if agrupamento == 'dia' and (dias is None or dias > 366):
+        agrupamento = 'semana'
+    hoje = datetime.date.today()
+    de = hoje - datetime.timedelta(days=dias - 1) if dias else None
+    periodos, totais = estatisticas_app.serie(request.user.pk, de, hoje, agrupamento)
+    context = {
+        'periodo':periodo,
+        'periodos_disponiveis':PERIODOS_ESTATISTICAS,
+        'agrupamento':agrupamento,
+        'agrupamentos':estatisticas_app.AGRUPAMENTOS,
+        'periodos':periodos,
+        'maximo':max((linha['concluidas'] for linha in periodos), default=0),
+        'totais':totais,
+        'situacao':estatisticas_app.situacao(request.user.pk, hoje),
+        'usuario':request.user
+    }
+    return render(request, 'todo/estatisticas.html', context)
+
+@login_required
+@require_POST
+def tarefas_lote(request):
+    """ Aplica uma ação (concluir, mudar status ou prioridade, mover, deletar) nas tarefas selecionadas no get_list """
+    form = AcaoLoteForm(request.POST)
+    if form.is_valid():
+        try:
+            alteradas = lote.aplicar(request.user.pk, request.POST.getlist('ids'),
+                                     form.cleaned_data['operacao'], form.cleaned_data['valor'] or None)
+        except ValidationError as e:
+            for mensagem in e.messages:
+                messages.error(request, mensagem)
+        else:
+            messages.info(request, f'{alteradas} tarefas alteradas')
+    else:
+        messages.error(request, f'{form.errors}')
+    lista = form.cleaned_data.get('lista') if form.is_valid() else None
+    if lista:
+        return redirect('get_list', pk=lista)
+    return redirect('index')
+
 @login_required
 def custom_logout(request):
     """ Faz o logout do usuario """
     logout(request)
     return redirect('index')
 
-@auto_logout_after_one_hour
 @login_required
 def user_info(request):
     """ Mostra as informações de username e email do usuario logado """
-    user = get_object_or_404(User, pk=request.user.pk)
-    return render(request,'user/user_info.html',{'user':user})
\ No newline at end of file
+    return render(request,'user/user_info.html',{'user':request.user})
+
+@staff_member_required
+def perfil(request):
+    """ Resumo por rota das requisições amostradas pelo PerfilMiddleware neste processo """
+    if request.method == 'POST':
+        perfil_requisicoes.resumo.limpar()
+        messages.info(request, 'Resumo do perfil limpo')
+        return redirect('perfil')
+    relatorio = perfil_requisicoes.resumo.relatorio()
+    if request.GET.get('formato') == 'json':
+        return JsonResponse(relatorio)
+    context = {
+        'relatorio':relatorio,
+        'desde':datetime.datetime.fromtimestamp(relatorio['desde']),
+        'usuario':request.user.username
+    }
+    return render(request, 'todo/perfil.html', context)
+
+def metricas(request):
+    """
+    Metricas no formato texto do Prometheus. Acessivel para staff ou com o token de
+    settings.TODO_METRICAS_TOKEN no cabeçalho Authorization: Bearer
+    """
+    token = getattr(settings, 'TODO_METRICAS_TOKEN', None)
+    autorizacao = request.headers.get('Authorization', '')
+    if not (token and constant_time_compare(autorizacao, f'Bearer {token}')) and not request.user.is_staff:
+        return HttpResponseForbidden()
+    return HttpResponse(metricas_app.texto(), content_type='text/plain; version=0.0.4; charset=utf-8')